@@ -1,227 +1,731 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Request, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
-from youtube_transcript_api import YouTubeTranscriptApi
-from openai import OpenAI
-from dotenv import load_dotenv
 import traceback
+import gzip
+import hashlib
+import math
 import re
+import tempfile
 import os
 import json
-from pathlib import Path
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import environment  # loads .env; must come before the modules below read their settings
 import cache_manager
+import chunking
+import job_queue
+import rate_limiter
+import single_flight
+import transcript_format
+import upstream
+import warmup
 
-# Load environment variables from parent directory (.env in project root)
-env_path = Path(__file__).parent.parent / '.env'
-load_dotenv(dotenv_path=env_path)
-# Also try local .env if exists
-load_dotenv()
+try:
+    import brotli
+except ImportError:
+    brotli = None  # responses fall back to gzip
 
 app = Flask(__name__)
-CORS(app, origins=['http://localhost:5173', 'http://localhost:3000', 'http://127.0.0.1:5173'])
-
-# Create YouTube API instance
-ytt_api = YouTubeTranscriptApi()
+# Uploads above this size are rejected with 413 before their body is read
+MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', 100 * 1024 * 1024))
+app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+CORS_ORIGINS = ['http://localhost:5173', 'http://localhost:3000', 'http://127.0.0.1:5173']
+CORS(app, origins=CORS_ORIGINS)
 
 # DeepSeek API setup (OpenAI compatible)
 DEEPSEEK_API_KEY = os.getenv('DEEPSEEK_API_KEY')
-deepseek_client = None
+DEEPSEEK_MODEL = os.getenv('DEEPSEEK_MODEL', 'deepseek-chat')
+DEEPSEEK_BASE_URL = "https://api.deepseek.com"
+DEEPSEEK_CONFIGURED = bool(DEEPSEEK_API_KEY and DEEPSEEK_API_KEY != 'your_deepseek_api_key_here')
 
-if DEEPSEEK_API_KEY and DEEPSEEK_API_KEY != 'your_deepseek_api_key_here':
-    deepseek_client = OpenAI(
-        api_key=DEEPSEEK_API_KEY,
-        base_url="https://api.deepseek.com"
-    )
+if DEEPSEEK_CONFIGURED:
     print("✅ DeepSeek AI API configured")
 else:
     print("⚠️ DeepSeek API key not configured. Question generation will be unavailable.")
 
-def format_transcript_readable(transcript_list, pause_threshold=2.0):
-    """Format transcript into readable paragraphs based on pauses."""
-    if not transcript_list:
-        return ""
+# The OpenAI SDK and youtube-transcript-api are slow to import, so their
+# clients are created on first use (or up front by warmup.warm_up)
+_deepseek_client = None
+_ytt_api = None
+_clients_lock = threading.Lock()
+
+
+def get_deepseek_client():
+    """The DeepSeek client, created on first use. None if no API key is configured."""
+    global _deepseek_client
+    if _deepseek_client is None and DEEPSEEK_CONFIGURED:
+        with _clients_lock:
+            if _deepseek_client is None:
+                from openai import OpenAI
+                # Retries and per-call timeouts are upstream.call's job
+                _deepseek_client = OpenAI(api_key=DEEPSEEK_API_KEY, base_url=DEEPSEEK_BASE_URL, max_retries=0)
+    return _deepseek_client
+
+
+def get_ytt_api():
+    """The YouTube transcript API instance, created on first use."""
+    global _ytt_api
+    if _ytt_api is None:
+        with _clients_lock:
+            if _ytt_api is None:
+                from youtube_transcript_api import YouTubeTranscriptApi
+                _ytt_api = YouTubeTranscriptApi()
+    return _ytt_api
+
+# Max parallel DeepSeek calls per request when a long text is split into chunks
+LLM_CHUNK_CONCURRENCY = int(os.getenv('LLM_CHUNK_CONCURRENCY', 4))
+
+
+def cached_llm_call(cache_key, compute):
+    """
+    Return the cached result for a key, or compute it once (single-flight) and cache it.
+    If the upstream is unavailable, an expired entry is returned instead when there is one.
+    """
+    cached = cache_manager.get_cached(cache_key)
+    if cached is not None:
+        return cached
+    try:
+        return single_flight.run(cache_key, compute)[0]
+    except upstream.UpstreamError:
+        stale = cache_manager.get_stale(cache_key)
+        if stale is None:
+            raise
+        return stale
+
+
+def _retry_later(message, retry_after):
+    """Error body and Retry-After header; message has a {seconds} placeholder."""
+    retry_after = max(1, math.ceil(retry_after))
+    return {
+        'success': False,
+        'error': message.format(seconds=retry_after),
+        'retryAfter': retry_after
+    }, {'Retry-After': str(retry_after)}
+
+
+def upstream_unavailable(error):
+    """
+    503 body and headers for an upstream failure with no stale cache to fall back on.
     
-    paragraphs = []
-    current_paragraph = []
+    Returns:
+        Tuple of (body, headers)
+    """
+    return _retry_later('AI 서비스가 일시적으로 응답하지 않습니다. {seconds}초 후 다시 시도해주세요.', error.retry_after)
+
+
+def rate_limited(error):
+    """
+    429 body and headers for a call shed by rate_limiter.
     
-    for i, item in enumerate(transcript_list):
-        text = item['text'].strip()
-        if not text:
-            continue
-        current_paragraph.append(text)
-        
-        if i < len(transcript_list) - 1:
-            current_end = item['start'] + item['duration']
-            next_start = transcript_list[i + 1]['start']
-            pause = next_start - current_end
-            
-            if pause >= pause_threshold:
-                paragraph_text = ' '.join(current_paragraph)
-                paragraphs.append(paragraph_text)
-                current_paragraph = []
+    Returns:
+        Tuple of (body, headers)
+    """
+    return _retry_later('요청이 많아 지금은 처리할 수 없습니다. {seconds}초 후 다시 시도해주세요.', error.retry_after)
+
+
+def map_chunks(func, items):
+    """Run func over items with bounded parallelism, preserving order."""
+    if len(items) <= 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(LLM_CHUNK_CONCURRENCY, len(items))) as pool:
+        return list(pool.map(func, items))
+
+
+def wants_stream():
+    """True if the client asked for a server-sent-events response (?stream=1)."""
+    return request.args.get('stream', '').lower() in ('1', 'true', 'yes')
+
+
+def sse_event(event, data):
+    """Serialize one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(events):
+    """Wrap an event generator in an unbuffered text/event-stream response."""
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+COMPRESS_MIN_BYTES = 2048  # smaller responses are sent uncompressed
+COMPRESS_MIMETYPES = ('application/json', 'text/plain', 'text/markdown')
+
+
+def negotiate_encoding(accept_encodings):
+    """Pick 'br' or 'gzip' from a parsed Accept-Encoding header, or None."""
+    return accept_encodings.best_match(['br', 'gzip'] if brotli else ['gzip'])
+
+
+def compress_body(body, encoding):
+    """Compress a response body with the negotiated encoding."""
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+@app.after_request
+def compress_response(response):
+    """gzip/brotli-compress large buffered responses when the client accepts it."""
+    if (response.direct_passthrough or response.is_streamed or
+            response.status_code < 200 or response.status_code == 204 or
+            'Content-Encoding' in response.headers or
+            response.mimetype not in COMPRESS_MIMETYPES):
+        return response
     
-    if current_paragraph:
-        paragraphs.append(' '.join(current_paragraph))
+    encoding = negotiate_encoding(request.accept_encodings)
+    if not encoding:
+        return response
     
-    result = '\n\n'.join(paragraphs)
-    result = re.sub(r' +', ' ', result)
-    result = re.sub(r'\n{3,}', '\n\n', result)
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
     
-    return result
+    response.set_data(compress_body(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def _deepseek_request(messages, temperature, max_tokens, stream=False):
+    """upstream.call request function for one DeepSeek chat completion."""
+    # Streams report their usage in a final chunk only when asked to
+    extra = {'stream_options': {'include_usage': True}} if stream else {}
+    return lambda timeout: get_deepseek_client().chat.completions.create(
+        model=DEEPSEEK_MODEL,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        stream=stream,
+        timeout=timeout,
+        **extra
+    )
+
+
+def call_deepseek(endpoint, messages, temperature, max_tokens):
+    """
+    Run one DeepSeek chat completion: admitted by rate_limiter (raises
+    RateLimited when shed), then sent through upstream.call for the deadline,
+    retries and circuit breaker.
+    """
+    ticket = rate_limiter.acquire(endpoint, rate_limiter.estimate_messages(messages, max_tokens))
+    response = upstream.call(endpoint, _deepseek_request(messages, temperature, max_tokens))
+    rate_limiter.settle(ticket, getattr(getattr(response, 'usage', None), 'total_tokens', None))
+    return response
+
+
+def stream_deepseek(endpoint, messages, temperature, max_tokens):
+    """
+    Yield content deltas from a streaming DeepSeek chat completion.
+    Admission and opening the stream work as in call_deepseek; once deltas
+    flow, a failure ends the stream without a retry. The rate_limiter ticket
+    is settled with the usage from the stream's final chunk when the stream
+    closes, or keeps its estimate if the stream ends before that chunk.
+    """
+    ticket = rate_limiter.acquire(endpoint, rate_limiter.estimate_messages(messages, max_tokens))
+    used_tokens = None
+    try:
+        stream = upstream.call(endpoint, _deepseek_request(messages, temperature, max_tokens, stream=True))
+        for chunk in stream:
+            usage = getattr(chunk, 'usage', None)
+            if usage is not None:
+                used_tokens = usage.total_tokens
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+    finally:
+        rate_limiter.settle(ticket, used_tokens)
+
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    return jsonify({
+        'success': False,
+        'error': f'File too large (max {MAX_CONTENT_LENGTH // (1024 * 1024)} MB)'
+    }), 413
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({
         'status': 'ok',
         'message': 'GenGen Python API Server is running',
-        'deepseekConfigured': deepseek_client is not None
+        'deepseekConfigured': DEEPSEEK_CONFIGURED,
+        'singleFlight': single_flight.get_stats(),
+        'upstreams': upstream.get_stats(),
+        'rateLimits': rate_limiter.get_stats()
     })
 
-@app.route('/api/transcript/<video_id>', methods=['GET'])
-def get_transcript(video_id):
-    preferred_lang = request.args.get('lang', 'ko')
-    format_type = request.args.get('format', 'readable')
+# ============ YouTube Transcripts ============
+
+# Captions rarely change, so fetched transcripts are cached per (video, language).
+# "Disabled"/"unavailable" answers are cached too, for a shorter time.
+TRANSCRIPT_CACHE_TTL = int(os.getenv('TRANSCRIPT_CACHE_TTL', 3 * 24 * 60 * 60))
+TRANSCRIPT_NEGATIVE_TTL = int(os.getenv('TRANSCRIPT_NEGATIVE_TTL', 60 * 60))
+TRANSCRIPT_BATCH_CONCURRENCY = int(os.getenv('TRANSCRIPT_BATCH_CONCURRENCY', 4))
+TRANSCRIPT_BATCH_MAX = 200  # video IDs per /api/transcripts request
+
+
+def _transcript_cache_key(video_id, preferred_lang):
+    return cache_manager.generate_cache_key('transcript', video_id, preferred_lang)
+
+
+def _fetch_transcript(video_id, preferred_lang):
+    """
+    Fetch a transcript from YouTube.
     
-    if not video_id:
-        return jsonify({'success': False, 'error': '영상 ID가 필요합니다.'}), 400
+    Returns:
+        Dictionary with 'success', and either 'language' plus the segment
+        columns 'texts', 'starts', 'durations', or 'status' and 'error'
+    """
+    languages_to_try = [preferred_lang, 'ko', 'en']
     
     try:
-        print(f"\n=== Fetching transcript: {video_id} ===")
-        
-        languages_to_try = [preferred_lang, 'ko', 'en']
-        
         try:
-            transcript_data = ytt_api.fetch(video_id, languages=languages_to_try)
+            transcript_data = get_ytt_api().fetch(video_id, languages=languages_to_try)
             language_used = preferred_lang
         except Exception:
-            try:
-                transcript_data = ytt_api.fetch(video_id)
-                language_used = 'auto'
-            except Exception as e2:
-                raise e2
-        
-        transcript_list = []
-        for snippet in transcript_data:
-            transcript_list.append({
-                'text': snippet.text,
-                'start': snippet.start,
-                'duration': snippet.duration
-            })
-        
-        if not transcript_list:
-            return jsonify({'success': False, 'error': '자막 데이터가 비어있습니다.'}), 404
-        
-        raw_text = ' '.join([item['text'] for item in transcript_list])
-        raw_text = ' '.join(raw_text.split())
-        
-        if format_type == 'readable':
-            formatted_text = format_transcript_readable(transcript_list)
-        else:
-            formatted_text = raw_text
-        
-        text_with_timestamps = '\n'.join([
-            f"[{int(item['start'] // 60)}:{int(item['start'] % 60):02d}] {item['text']}"
-            for item in transcript_list
-        ])
-        
-        print(f"✅ Success: {len(transcript_list)} segments")
-        
-        return jsonify({
-            'success': True,
-            'videoId': video_id,
-            'language': language_used,
-            'text': formatted_text,
-            'rawText': raw_text,
-            'textWithTimestamps': text_with_timestamps,
-            'segments': len(transcript_list)
-        })
-        
+            transcript_data = get_ytt_api().fetch(video_id)
+            language_used = 'auto'
     except Exception as e:
         error_str = str(e)
         print(f"Error: {error_str}")
         
         if 'disabled' in error_str.lower():
-            return jsonify({'success': False, 'error': '자막이 비활성화된 영상입니다.'}), 404
+            return {'success': False, 'status': 404, 'error': '자막이 비활성화된 영상입니다.'}
         elif 'unavailable' in error_str.lower():
-            return jsonify({'success': False, 'error': '영상을 찾을 수 없습니다.'}), 404
+            return {'success': False, 'status': 404, 'error': '영상을 찾을 수 없습니다.'}
         else:
-            return jsonify({'success': False, 'error': f'오류: {error_str}'}), 500
+            return {'success': False, 'status': 500, 'error': f'오류: {error_str}'}
+    
+    segments = transcript_format.Segments.from_snippets(transcript_data)
+    
+    if not len(segments):
+        return {'success': False, 'status': 404, 'error': '자막 데이터가 비어있습니다.'}
+    
+    return {
+        'success': True,
+        'language': language_used,
+        'texts': segments.texts,
+        'starts': segments.starts,
+        'durations': segments.durations
+    }
 
 
-# ============ Subtitle Formatting with DeepSeek ============
+def _get_transcript_data(video_id, preferred_lang):
+    """
+    Cached _fetch_transcript. Successful results are kept for
+    TRANSCRIPT_CACHE_TTL, 404 results for TRANSCRIPT_NEGATIVE_TTL; transient
+    errors are not cached.
+    
+    Returns:
+        Tuple of (transcript data, cached)
+    """
+    cache_key = _transcript_cache_key(video_id, preferred_lang)
+    cached = cache_manager.get_cached(cache_key)
+    if cached is not None:
+        return cached, True
+    
+    print(f"\n=== Fetching transcript: {video_id} ===")
+    data = _fetch_transcript(video_id, preferred_lang)
+    
+    if data['success']:
+        cache_manager.set_cache(cache_key, data, ttl=TRANSCRIPT_CACHE_TTL)
+    elif data['status'] == 404:
+        cache_manager.set_cache(cache_key, data, ttl=TRANSCRIPT_NEGATIVE_TTL)
+    
+    return data, False
 
-@app.route('/api/format-subtitle', methods=['POST'])
-def format_subtitle():
-    """Format raw subtitle text into readable markdown using DeepSeek."""
-    if not deepseek_client:
-        return jsonify({
+
+# Selectable transcript fields (?fields= or ?views=), with view-name aliases
+TRANSCRIPT_FIELDS = {
+    'text': 'text',
+    'readable': 'text',
+    'rawText': 'rawText',
+    'raw': 'rawText',
+    'textWithTimestamps': 'textWithTimestamps',
+    'timestamps': 'textWithTimestamps',
+    'segmentData': 'segmentData',
+}
+DEFAULT_TRANSCRIPT_FIELDS = ('text', 'rawText', 'textWithTimestamps')
+
+
+def _parse_transcript_fields(value):
+    """
+    Parse a comma-separated fields/views list.
+    
+    Returns:
+        Tuple of (field names, error message or None); all text views if value is empty
+    """
+    if isinstance(value, list):
+        value = ','.join(value)
+    tokens = [token.strip() for token in (value or '').split(',') if token.strip()]
+    if not tokens:
+        return DEFAULT_TRANSCRIPT_FIELDS, None
+    
+    unknown = [token for token in tokens if token not in TRANSCRIPT_FIELDS]
+    if unknown:
+        return None, f"알 수 없는 필드: {', '.join(unknown)} (가능: {', '.join(TRANSCRIPT_FIELDS)})"
+    return tuple(dict.fromkeys(TRANSCRIPT_FIELDS[token] for token in tokens)), None
+
+
+def _build_transcript_response(video_id, data, format_type, fields=DEFAULT_TRANSCRIPT_FIELDS):
+    """
+    Build the /api/transcript JSON body from transcript data.
+    Only the requested fields are computed and included.
+    
+    Args:
+        fields: Any of 'text', 'rawText', 'textWithTimestamps' and
+            'segmentData' (columnar {text, start, duration} arrays)
+    
+    Returns:
+        Tuple of (response dict, HTTP status)
+    """
+    if not data['success']:
+        return {'success': False, 'error': data['error']}, data['status']
+    
+    segments = transcript_format.Segments(data['texts'], data['starts'], data['durations'])
+    text_view = 'readable' if format_type == 'readable' else 'raw'
+    
+    needed = set()
+    if 'text' in fields:
+        needed.add(text_view)
+    if 'rawText' in fields:
+        needed.add('raw')
+    if 'textWithTimestamps' in fields:
+        needed.add('timestamps')
+    views = transcript_format.format_views(segments, needed) if needed else {}
+    
+    response = {
+        'success': True,
+        'videoId': video_id,
+        'language': data['language'],
+        'segments': len(segments)
+    }
+    if 'text' in fields:
+        response['text'] = views[text_view]
+    if 'rawText' in fields:
+        response['rawText'] = views['raw']
+    if 'textWithTimestamps' in fields:
+        response['textWithTimestamps'] = views['timestamps']
+    if 'segmentData' in fields:
+        response['segmentData'] = {
+            'text': segments.texts,
+            'start': segments.starts,
+            'duration': segments.durations
+        }
+    return response, 200
+
+
+def _transcript_response(video_id, preferred_lang, format_type, fields):
+    """
+    Fetch (or reuse) a transcript and build its response body.
+    
+    Returns:
+        Tuple of (response dict, HTTP status); unexpected errors become a 500 body
+    """
+    try:
+        data, cached = _get_transcript_data(video_id, preferred_lang)
+        response, status = _build_transcript_response(video_id, data, format_type, fields)
+        if cached:
+            response['cached'] = True
+        return response, status
+    except Exception as e:
+        print(f"Error: {e}")
+        traceback.print_exc()
+        return {'success': False, 'error': f'오류: {str(e)}'}, 500
+
+
+def _transcript_batch_request(data):
+    """
+    Validate a /api/transcripts body.
+    
+    Returns:
+        Tuple of (video IDs, lang, format, fields, error); error is (body, status) or None
+    """
+    if not isinstance(data, dict):
+        return None, None, None, None, ({'success': False, 'error': '요청 본문은 JSON 객체여야 합니다.'}, 400)
+    
+    video_ids = data.get('videoIds') or []
+    preferred_lang = data.get('lang', 'ko')
+    format_type = data.get('format', 'readable')
+    fields, fields_error = _parse_transcript_fields(data.get('fields') or data.get('views'))
+    
+    if not isinstance(video_ids, list) or not video_ids:
+        return None, None, None, None, ({'success': False, 'error': '영상 ID 목록이 필요합니다.'}, 400)
+    if not all(isinstance(video_id, str) for video_id in video_ids):
+        return None, None, None, None, ({'success': False, 'error': '영상 ID는 문자열이어야 합니다.'}, 400)
+    if fields_error:
+        return None, None, None, None, ({'success': False, 'error': fields_error}, 400)
+    if len(video_ids) > TRANSCRIPT_BATCH_MAX:
+        return None, None, None, None, ({
             'success': False,
-            'error': 'DeepSeek API key not configured'
-        }), 500
+            'error': f'한 번에 최대 {TRANSCRIPT_BATCH_MAX}개의 영상만 요청할 수 있습니다.'
+        }, 400)
+    return video_ids, preferred_lang, format_type, fields, None
+
+
+def _transcript_batch_result(video_id, response, status):
+    """One entry of the /api/transcripts 'results' list."""
+    response.setdefault('videoId', video_id)
+    response['status'] = status
+    return response
+
+
+def _transcript_batch_response(video_ids, by_id):
+    """Assemble the /api/transcripts body in request order from per-ID results."""
+    results = [by_id[video_id] for video_id in video_ids]
+    return {
+        'success': True,
+        'results': results,
+        'succeeded': sum(1 for result in results if result['success']),
+        'failed': sum(1 for result in results if not result['success'])
+    }
+
+
+@app.route('/api/transcript/<video_id>', methods=['GET'])
+def get_transcript(video_id):
+    """
+    Fetch a video's transcript.
+    ?fields= (or ?views=) limits the response to some of text, rawText,
+    textWithTimestamps and segmentData; by default all three text views are sent.
+    """
+    preferred_lang = request.args.get('lang', 'ko')
+    format_type = request.args.get('format', 'readable')
+    fields, fields_error = _parse_transcript_fields(request.args.get('fields') or request.args.get('views'))
     
-    data = request.get_json()
+    if not video_id:
+        return jsonify({'success': False, 'error': '영상 ID가 필요합니다.'}), 400
+    if fields_error:
+        return jsonify({'success': False, 'error': fields_error}), 400
+    
+    response, status = _transcript_response(video_id, preferred_lang, format_type, fields)
+    if status == 200:
+        print(f"✅ Success: {response['segments']} segments")
+    return jsonify(response), status
+
+
+@app.route('/api/transcripts', methods=['POST'])
+def get_transcripts():
+    """
+    Fetch transcripts for a list of videos (e.g. a playlist) concurrently.
+    
+    Body: {"videoIds": [...], "lang": "ko", "format": "readable", "fields": "text"}
+    Each entry of 'results' has the same shape as /api/transcript plus 'status'.
+    """
+    video_ids, preferred_lang, format_type, fields, error = _transcript_batch_request(
+        request.get_json(silent=True) or {}
+    )
+    if error:
+        return jsonify(error[0]), error[1]
+    
+    def fetch_one(video_id):
+        return _transcript_batch_result(
+            video_id, *_transcript_response(video_id, preferred_lang, format_type, fields)
+        )
+    
+    # Duplicate IDs in a playlist are fetched once
+    unique_ids = list(dict.fromkeys(video_ids))
+    print(f"\n=== Fetching {len(unique_ids)} transcripts ({TRANSCRIPT_BATCH_CONCURRENCY} concurrent) ===")
+    with ThreadPoolExecutor(max_workers=min(TRANSCRIPT_BATCH_CONCURRENCY, len(unique_ids))) as pool:
+        by_id = dict(zip(unique_ids, pool.map(fetch_one, unique_ids)))
+    
+    return jsonify(_transcript_batch_response(video_ids, by_id))
+
+
+# ============ Subtitle Formatting with DeepSeek ============
+
+SUBTITLE_SYSTEM_PROMPT = "당신은 텍스트 정리 전문가입니다. 주어진 자막을 읽기 좋게 정리합니다."
+SUBTITLE_TEMPERATURE = 0.3
+SUBTITLE_MAX_TOKENS = 4000
+
+SUBTITLE_PROMPT = """다음은 유튜브 영상의 자막입니다. 이 자막을 읽기 쉽게 정리해주세요.
+
+규칙:
+1. 문장을 자연스럽게 이어붙여서 읽기 좋게 만들어주세요.
+2. 주제별로 단락을 나눠주세요.
+3. 중요한 핵심 내용은 **굵은 글씨**로 강조해주세요.
+4. 마크다운 형식으로 출력해주세요.
+5. 불필요한 반복이나 말더듬은 제거해주세요.
+6. 내용을 요약하지 말고, 원래 내용을 최대한 유지하면서 정리해주세요.
+
+자막:
+{text}
+
+위 자막을 읽기 좋게 정리한 마크다운:"""
+
+
+def _subtitle_messages(raw_text):
+    return [
+        {"role": "system", "content": SUBTITLE_SYSTEM_PROMPT},
+        {"role": "user", "content": SUBTITLE_PROMPT.format(text=raw_text)}
+    ]
+
+
+SUBTITLE_UNCONFIGURED_ERROR = {
+    'success': False,
+    'error': 'DeepSeek API key not configured'
+}
+
+
+def _subtitle_cache_key(raw_text):
+    return cache_manager.generate_llm_cache_key(
+        'subtitle', raw_text, DEEPSEEK_MODEL,
+        SUBTITLE_SYSTEM_PROMPT + SUBTITLE_PROMPT,
+        SUBTITLE_TEMPERATURE, SUBTITLE_MAX_TOKENS
+    )
+
+
+def _subtitle_request(data):
+    """
+    Validate a /api/format-subtitle body.
+    
+    Returns:
+        Tuple of (raw text, error); error is (body, status) or None
+    """
     if not data or 'text' not in data:
-        return jsonify({
+        return None, ({
             'success': False,
             'error': 'No text provided'
-        }), 400
+        }, 400)
     
     raw_text = data['text']
     
     if not raw_text.strip():
-        return jsonify({
+        return None, ({
             'success': False,
             'error': 'Empty text'
-        }), 400
+        }, 400)
+    
+    return raw_text, None
+
+
+def _format_subtitle_with_deepseek(raw_text):
+    """Call DeepSeek to format subtitle text. Returns the markdown string."""
+    response = call_deepseek(
+        'deepseek.subtitle', _subtitle_messages(raw_text), SUBTITLE_TEMPERATURE, SUBTITLE_MAX_TOKENS
+    )
+    
+    formatted_text = response.choices[0].message.content.strip()
+    
+    print(f"✅ Formatted subtitle ({len(raw_text)} -> {len(formatted_text)} chars)")
+    return formatted_text
+
+
+def _stale_subtitle_result(formatted_text):
+    return {
+        'success': True,
+        'formattedText': formatted_text,
+        'cached': True,
+        'stale': True
+    }
+
+
+def _stream_format_subtitle(raw_text, cache_key):
+    """SSE variant of format_subtitle: forwards DeepSeek deltas as they arrive."""
+    def generate():
+        parts = []
+        try:
+            for delta in stream_deepseek(
+                'deepseek.subtitle', _subtitle_messages(raw_text),
+                SUBTITLE_TEMPERATURE, SUBTITLE_MAX_TOKENS
+            ):
+                parts.append(delta)
+                yield sse_event('delta', {'text': delta})
+            
+            formatted_text = ''.join(parts).strip()
+            print(f"✅ Formatted subtitle ({len(raw_text)} -> {len(formatted_text)} chars)")
+            cache_manager.set_cache(cache_key, formatted_text)
+            
+            yield sse_event('done', {
+                'success': True,
+                'formattedText': formatted_text
+            })
+            
+        except rate_limiter.RateLimited as e:
+            print(f"❌ Subtitle formatting error: {e}")
+            yield sse_event('error', rate_limited(e)[0])
+            
+        except upstream.UpstreamError as e:
+            print(f"❌ Subtitle formatting error: {e}")
+            stale = None if parts else cache_manager.get_stale(cache_key)
+            if stale:
+                yield sse_event('done', _stale_subtitle_result(stale))
+            else:
+                yield sse_event('error', upstream_unavailable(e)[0])
+            
+        except Exception as e:
+            print(f"❌ Subtitle formatting error: {e}")
+            traceback.print_exc()
+            yield sse_event('error', {
+                'success': False,
+                'error': f'자막 정리 중 오류가 발생했습니다: {str(e)}'
+            })
+    
+    return sse_response(generate())
+
+
+@app.route('/api/format-subtitle', methods=['POST'])
+def format_subtitle():
+    """
+    Format raw subtitle text into readable markdown using DeepSeek.
+    With ?stream=1 the response is a text/event-stream of 'delta' events
+    followed by a 'done' event; a cache hit is a single 'done' event.
+    """
+    if not DEEPSEEK_CONFIGURED:
+        return jsonify(SUBTITLE_UNCONFIGURED_ERROR), 500
+    
+    raw_text, error = _subtitle_request(request.get_json())
+    if error:
+        return jsonify(error[0]), error[1]
     
     # Check cache first
-    cache_key = cache_manager.generate_cache_key('subtitle', raw_text[:500])
+    cache_key = _subtitle_cache_key(raw_text)
     cached_result = cache_manager.get_cached(cache_key)
     
     if cached_result:
         print(f"📦 Returning cached formatted subtitle")
-        return jsonify({
+        result = {
             'success': True,
             'formattedText': cached_result,
             'cached': True
-        })
+        }
+        if wants_stream():
+            return sse_response(iter([sse_event('done', result)]))
+        return jsonify(result)
+    
+    if wants_stream():
+        return _stream_format_subtitle(raw_text, cache_key)
     
     try:
-        prompt = f"""다음은 유튜브 영상의 자막입니다. 이 자막을 읽기 쉽게 정리해주세요.
-
-규칙:
-1. 문장을 자연스럽게 이어붙여서 읽기 좋게 만들어주세요.
-2. 주제별로 단락을 나눠주세요.
-3. 중요한 핵심 내용은 **굵은 글씨**로 강조해주세요.
-4. 마크다운 형식으로 출력해주세요.
-5. 불필요한 반복이나 말더듬은 제거해주세요.
-6. 내용을 요약하지 말고, 원래 내용을 최대한 유지하면서 정리해주세요.
-
-자막:
-{raw_text}
-
-위 자막을 읽기 좋게 정리한 마크다운:"""
-
-        response = deepseek_client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {"role": "system", "content": "당신은 텍스트 정리 전문가입니다. 주어진 자막을 읽기 좋게 정리합니다."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.3,
-            max_tokens=4000
+        # Identical concurrent requests share one upstream call; the result is cached
+        formatted_text, coalesced = single_flight.run(
+            cache_key, lambda: _format_subtitle_with_deepseek(raw_text)
         )
         
-        formatted_text = response.choices[0].message.content.strip()
-        
-        print(f"✅ Formatted subtitle ({len(raw_text)} -> {len(formatted_text)} chars)")
-        
-        # Cache the result
-        cache_manager.set_cache(cache_key, formatted_text)
-        
-        return jsonify({
+        result = {
             'success': True,
             'formattedText': formatted_text
-        })
+        }
+        if coalesced:
+            result['coalesced'] = True
+        return jsonify(result)
+        
+    except rate_limiter.RateLimited as e:
+        print(f"❌ Subtitle formatting error: {e}")
+        body, headers = rate_limited(e)
+        return jsonify(body), 429, headers
+        
+    except upstream.UpstreamError as e:
+        print(f"❌ Subtitle formatting error: {e}")
+        stale = cache_manager.get_stale(cache_key)
+        if stale:
+            return jsonify(_stale_subtitle_result(stale))
+        body, headers = upstream_unavailable(e)
+        return jsonify(body), 503, headers
         
     except Exception as e:
         print(f"❌ Subtitle formatting error: {e}")
@@ -233,6 +737,12 @@ def format_subtitle():
 
 
 # Question generation prompts
+QUESTION_SYSTEM_PROMPT = "당신은 교육 전문가입니다. 주어진 텍스트를 분석하여 학습에 도움이 되는 문제를 만듭니다. 항상 순수한 JSON 형식으로만 응답합니다."
+QUESTION_TEMPERATURE = 0.7
+QUESTION_MAX_TOKENS = 4000
+QUESTION_CHUNK_CHARS = 15000  # roughly 8000 tokens per DeepSeek call
+QUESTION_COUNT_MAX = 50  # questions per request
+
 QUESTION_PROMPTS = {
     'multiple_choice': '''다음 텍스트를 기반으로 **실제 시험에 나올 법한** 객관식 문제를 {count}개 만들어주세요.
 
@@ -347,107 +857,209 @@ QUESTION_PROMPTS = {
 '''
 }
 
-@app.route('/api/generate-questions', methods=['POST'])
-def generate_questions():
-    """Generate questions using DeepSeek AI"""
+def _question_messages(text, question_type, count):
+    return [
+        {"role": "system", "content": QUESTION_SYSTEM_PROMPT},
+        {"role": "user", "content": QUESTION_PROMPTS[question_type].format(text=text, count=count)}
+    ]
+
+
+def _generate_questions_with_deepseek(text, question_type, count):
+    """Call DeepSeek to generate questions. Returns the cacheable result dict."""
+    response = call_deepseek(
+        'deepseek.questions', _question_messages(text, question_type, count),
+        QUESTION_TEMPERATURE, QUESTION_MAX_TOKENS
+    )
     
-    if not deepseek_client:
-        return jsonify({
-            'success': False,
-            'error': 'DeepSeek API가 설정되지 않았습니다. .env 파일에 DEEPSEEK_API_KEY를 설정해주세요.'
-        }), 503
+    return _parse_questions(response.choices[0].message.content, question_type)
+
+
+def _parse_questions(result_text, question_type):
+    """
+    Parse a DeepSeek question-generation reply into the cacheable result dict.
+    Raises json.JSONDecodeError if no JSON array can be recovered.
+    """
+    result_text = result_text.strip()
+    print(f"AI Response length: {len(result_text)} chars")
+    
+    # Parse JSON from response
+    # Try to extract JSON array from the response
+    json_match = re.search(r'\[[\s\S]*\]', result_text)
+    if json_match:
+        result_text = json_match.group()
+    
+    try:
+        questions = json.loads(result_text)
+    except json.JSONDecodeError:
+        # Try to fix common JSON issues
+        result_text = result_text.replace("'", '"')
+        result_text = re.sub(r',\s*]', ']', result_text)
+        result_text = re.sub(r',\s*}', '}', result_text)
+        try:
+            questions = json.loads(result_text)
+        except json.JSONDecodeError as e:
+            print(f"JSON Parse Error: {e}")
+            print(f"Response was: {result_text[:500]}...")
+            raise
     
-    data = request.get_json()
+    print(f"✅ Generated {len(questions)} questions")
     
+    return {
+        'questions': questions,
+        'type': question_type,
+        'count': len(questions)
+    }
+
+
+def _questions_cache_key(text, question_type, count):
+    return cache_manager.generate_llm_cache_key(
+        'questions', text, DEEPSEEK_MODEL,
+        QUESTION_SYSTEM_PROMPT + QUESTION_PROMPTS[question_type],
+        QUESTION_TEMPERATURE, QUESTION_MAX_TOKENS,
+        question_type, count
+    )
+
+
+def _generate_questions_chunked(chunks, question_type, count):
+    """
+    Map-reduce question generation for texts longer than one DeepSeek call.
+    Questions are spread evenly across the chunks; each chunk is cached on its own.
+    """
+    jobs = _question_jobs(chunks, count)
+    
+    def generate_chunk(job):
+        chunk, n = job
+        return cached_llm_call(
+            _questions_cache_key(chunk, question_type, n),
+            lambda: _generate_questions_with_deepseek(chunk, question_type, n)
+        )
+    
+    return _merge_questions(map_chunks(generate_chunk, jobs), question_type)
+
+
+def _question_jobs(chunks, count):
+    """Pair chunks with their share of the question count, dropping chunks that get none."""
+    jobs = [(chunk, n) for chunk, n in zip(chunks, chunking.distribute_count(count, len(chunks))) if n > 0]
+    print(f"🧩 Generating over {len(jobs)} of {len(chunks)} chunks")
+    return jobs
+
+
+def _merge_questions(results, question_type):
+    questions = [q for result in results for q in result['questions']]
+    return {
+        'questions': questions,
+        'type': question_type,
+        'count': len(questions)
+    }
+
+
+def _questions_request(data):
+    """
+    Validate a /api/generate-questions body.
+    
+    Returns:
+        Tuple of (text, question type, count, error); error is (body, status) or None
+    """
     if not data:
-        return jsonify({'success': False, 'error': '요청 데이터가 없습니다.'}), 400
+        return None, None, None, ({'success': False, 'error': '요청 데이터가 없습니다.'}, 400)
     
     text = data.get('text', '')
     question_type = data.get('type', 'multiple_choice')
     count = data.get('count', 5)
     
     if not text:
-        return jsonify({'success': False, 'error': '텍스트가 필요합니다.'}), 400
+        return None, None, None, ({'success': False, 'error': '텍스트가 필요합니다.'}, 400)
     
     if question_type not in QUESTION_PROMPTS:
-        return jsonify({'success': False, 'error': f'지원하지 않는 문제 유형입니다: {question_type}'}), 400
+        return None, None, None, ({'success': False, 'error': f'지원하지 않는 문제 유형입니다: {question_type}'}, 400)
+    
+    # JSON numbers or numeric strings ("10"); booleans and fractions are rejected
+    if isinstance(count, str) and count.strip().isdigit():
+        count = int(count)
+    if isinstance(count, bool) or not isinstance(count, int) or not 1 <= count <= QUESTION_COUNT_MAX:
+        return None, None, None, ({
+            'success': False,
+            'error': f'문제 수(count)는 1~{QUESTION_COUNT_MAX} 사이의 정수여야 합니다.'
+        }, 400)
+    
+    return text, question_type, count, None
+
+
+def _questions_response(result, cached=False, coalesced=False, stale=False):
+    response = {
+        'success': True,
+        'questions': result['questions'],
+        'type': result['type'],
+        'count': result['count']
+    }
+    if cached:
+        response['cached'] = True
+    if coalesced:
+        response['coalesced'] = True
+    if stale:
+        response['stale'] = True
+    return response
+
+
+QUESTIONS_UNCONFIGURED_ERROR = {
+    'success': False,
+    'error': 'DeepSeek API가 설정되지 않았습니다. .env 파일에 DEEPSEEK_API_KEY를 설정해주세요.'
+}
+QUESTIONS_PARSE_ERROR = {
+    'success': False,
+    'error': 'AI 응답을 파싱할 수 없습니다. 다시 시도해주세요.'
+}
+
+
+@app.route('/api/generate-questions', methods=['POST'])
+def generate_questions():
+    """Generate questions using DeepSeek AI"""
     
-    # Limit text length to avoid API limits (roughly 8000 tokens)
-    max_chars = 15000
-    if len(text) > max_chars:
-        text = text[:max_chars] + "..."
+    if not DEEPSEEK_CONFIGURED:
+        return jsonify(QUESTIONS_UNCONFIGURED_ERROR), 503
+    
+    text, question_type, count, error = _questions_request(request.get_json())
+    if error:
+        return jsonify(error[0]), error[1]
     
     # Check cache first
-    cache_key = cache_manager.generate_cache_key('questions', text[:500], question_type, count)
+    cache_key = _questions_cache_key(text, question_type, count)
     cached_result = cache_manager.get_cached(cache_key)
     
     if cached_result:
         print(f"📦 Returning cached questions")
-        return jsonify({
-            'success': True,
-            'questions': cached_result['questions'],
-            'type': cached_result['type'],
-            'count': cached_result['count'],
-            'cached': True
-        })
+        return jsonify(_questions_response(cached_result, cached=True))
     
     try:
         print(f"\n=== Generating {count} {question_type} questions ===")
         print(f"Text length: {len(text)} chars")
         
-        prompt = QUESTION_PROMPTS[question_type].format(text=text, count=count)
-        
-        response = deepseek_client.chat.completions.create(
-            model="deepseek-chat",
-            messages=[
-                {"role": "system", "content": "당신은 교육 전문가입니다. 주어진 텍스트를 분석하여 학습에 도움이 되는 문제를 만듭니다. 항상 순수한 JSON 형식으로만 응답합니다."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            max_tokens=4000
-        )
-        
-        result_text = response.choices[0].message.content.strip()
-        print(f"AI Response length: {len(result_text)} chars")
-        
-        # Parse JSON from response
-        # Try to extract JSON array from the response
-        json_match = re.search(r'\[[\s\S]*\]', result_text)
-        if json_match:
-            result_text = json_match.group()
-        
-        try:
-            questions = json.loads(result_text)
-        except json.JSONDecodeError:
-            # Try to fix common JSON issues
-            result_text = result_text.replace("'", '"')
-            result_text = re.sub(r',\s*]', ']', result_text)
-            result_text = re.sub(r',\s*}', '}', result_text)
-            questions = json.loads(result_text)
+        # Long texts are split to stay within API limits instead of being truncated
+        chunks = chunking.split_into_chunks(text, QUESTION_CHUNK_CHARS)
+        if len(chunks) > 1:
+            compute = lambda: _generate_questions_chunked(chunks, question_type, count)
+        else:
+            compute = lambda: _generate_questions_with_deepseek(text, question_type, count)
         
-        print(f"✅ Generated {len(questions)} questions")
+        # Identical concurrent requests share one upstream call; the result is cached
+        result, coalesced = single_flight.run(cache_key, compute)
+        return jsonify(_questions_response(result, coalesced=coalesced))
         
-        # Cache the result
-        cache_manager.set_cache(cache_key, {
-            'questions': questions,
-            'type': question_type,
-            'count': len(questions)
-        })
+    except json.JSONDecodeError:
+        return jsonify(QUESTIONS_PARSE_ERROR), 500
         
-        return jsonify({
-            'success': True,
-            'questions': questions,
-            'type': question_type,
-            'count': len(questions)
-        })
+    except rate_limiter.RateLimited as e:
+        print(f"Error: {e}")
+        body, headers = rate_limited(e)
+        return jsonify(body), 429, headers
         
-    except json.JSONDecodeError as e:
-        print(f"JSON Parse Error: {e}")
-        print(f"Response was: {result_text[:500]}...")
-        return jsonify({
-            'success': False,
-            'error': 'AI 응답을 파싱할 수 없습니다. 다시 시도해주세요.'
-        }), 500
+    except upstream.UpstreamError as e:
+        print(f"Error: {e}")
+        stale = cache_manager.get_stale(cache_key)
+        if stale:
+            return jsonify(_questions_response(stale, cached=True, stale=True))
+        body, headers = upstream_unavailable(e)
+        return jsonify(body), 503, headers
         
     except Exception as e:
         print(f"Error: {e}")
@@ -472,7 +1084,7 @@ else:
 @app.route('/api/pdf/check', methods=['GET'])
 def check_pdf_service():
     """Check if PDF OCR service is available."""
-    from pdf_processor import check_dependencies
+    from pdf_processor import check_dependencies, GEMINI_MODEL
     
     issues = check_dependencies()
     has_api_key = bool(GEMINI_API_KEY and GEMINI_API_KEY != 'your_gemini_api_key_here')
@@ -483,77 +1095,18 @@ def check_pdf_service():
     return jsonify({
         'available': len(issues) == 0 and has_api_key,
         'hasApiKey': has_api_key,
+        'model': GEMINI_MODEL,
         'issues': issues
     })
 
 
-@app.route('/api/pdf/extract', methods=['POST'])
-def extract_pdf():
-    """Extract text from PDF, PPTX, or DOCX files."""
-    if not GEMINI_API_KEY or GEMINI_API_KEY == 'your_gemini_api_key_here':
-        return jsonify({
-            'success': False,
-            'error': 'Gemini API key not configured'
-        }), 500
-    
-    # Check if file was uploaded
-    if 'file' not in request.files:
-        return jsonify({
-            'success': False,
-            'error': 'No file uploaded'
-        }), 400
-    
-    file = request.files['file']
-    
-    if file.filename == '':
-        return jsonify({
-            'success': False,
-            'error': 'No file selected'
-        }), 400
-    
-    filename_lower = file.filename.lower()
-    
-    # Check file extension
-    if not (filename_lower.endswith('.pdf') or 
-            filename_lower.endswith('.pptx') or 
-            filename_lower.endswith('.docx')):
-        return jsonify({
-            'success': False,
-            'error': 'Supported formats: PDF, PPTX, DOCX'
-        }), 400
-    
-    try:
-        file_bytes = file.read()
-        print(f"📄 Processing file: {file.filename} ({len(file_bytes)} bytes)")
-        
-        # Route to appropriate processor based on file type
-        if filename_lower.endswith('.pdf'):
-            from pdf_processor import process_pdf
-            result = process_pdf(file_bytes, GEMINI_API_KEY)
-            count_key = 'page_count'
-            count_name = 'pageCount'
-            
-        elif filename_lower.endswith('.pptx'):
-            from pdf_processor import process_pptx
-            result = process_pptx(file_bytes, GEMINI_API_KEY)
-            count_key = 'slide_count'
-            count_name = 'slideCount'
-            
-        elif filename_lower.endswith('.docx'):
-            from pdf_processor import extract_docx_text
-            result = extract_docx_text(file_bytes)
-            count_key = 'paragraph_count'
-            count_name = 'paragraphCount'
-        
-        if result['success']:
-            raw_text = result['text']
-            print(f"✅ File extracted ({result.get(count_key, 0)} {count_key})")
-            
-            # Step 2: Organize with DeepSeek AI
-            if deepseek_client and len(raw_text) > 100:
-                print(f"🧠 Organizing with DeepSeek AI...")
-                try:
-                    organize_prompt = """다음은 문서에서 OCR로 추출된 텍스트입니다. 학습에 적합한 형태로 정리해주세요.
+# Document organization prompt (DeepSeek)
+ORGANIZE_SYSTEM_PROMPT = "당신은 학습 자료를 정리하는 전문가입니다. 주어진 텍스트를 깔끔하게 정리하고 중요한 부분을 강조해주세요."
+ORGANIZE_TEMPERATURE = 0.3
+ORGANIZE_MAX_TOKENS = 8000
+ORGANIZE_CHUNK_CHARS = 20000
+
+ORGANIZE_PROMPT = """다음은 문서에서 OCR로 추출된 텍스트입니다. 학습에 적합한 형태로 정리해주세요.
 
 규칙:
 1. 제목과 소제목은 ## 마크다운 형식으로 표시
@@ -566,43 +1119,443 @@ def extract_pdf():
 
 추출된 텍스트:
 """
-                    response = deepseek_client.chat.completions.create(
-                        model="deepseek-chat",
-                        messages=[
-                            {"role": "system", "content": "당신은 학습 자료를 정리하는 전문가입니다. 주어진 텍스트를 깔끔하게 정리하고 중요한 부분을 강조해주세요."},
-                            {"role": "user", "content": organize_prompt + raw_text[:20000]}
-                        ],
-                        max_tokens=8000,
-                        temperature=0.3
-                    )
+
+
+def _organize_messages(raw_text):
+    return [
+        {"role": "system", "content": ORGANIZE_SYSTEM_PROMPT},
+        {"role": "user", "content": ORGANIZE_PROMPT + raw_text}
+    ]
+
+
+def _organize_cache_key(raw_text):
+    return cache_manager.generate_llm_cache_key(
+        'organize', raw_text, DEEPSEEK_MODEL,
+        ORGANIZE_SYSTEM_PROMPT + ORGANIZE_PROMPT,
+        ORGANIZE_TEMPERATURE, ORGANIZE_MAX_TOKENS
+    )
+
+
+def _organize_with_deepseek(raw_text):
+    """Call DeepSeek to organize extracted document text. Returns the markdown string."""
+    response = call_deepseek(
+        'deepseek.organize', _organize_messages(raw_text), ORGANIZE_TEMPERATURE, ORGANIZE_MAX_TOKENS
+    )
+    
+    organized_text = response.choices[0].message.content
+    print(f"✅ Organized: {len(raw_text)} → {len(organized_text)} chars")
+    return organized_text
+
+
+def _organize_text(raw_text):
+    """
+    Organize extracted text with DeepSeek, chunk by chunk in parallel.
+    Chunks follow heading/paragraph boundaries and are cached individually,
+    so re-uploading an edited document only re-organizes the changed chunks.
+    """
+    chunks = chunking.split_into_chunks(raw_text, ORGANIZE_CHUNK_CHARS)
+    if len(chunks) > 1:
+        print(f"🧩 Organizing in {len(chunks)} chunks")
+    
+    def organize_chunk(chunk):
+        return cached_llm_call(_organize_cache_key(chunk), lambda: _organize_with_deepseek(chunk))
+    
+    return '\n\n'.join(map_chunks(organize_chunk, chunks))
+
+
+UPLOAD_READ_CHUNK = 1024 * 1024  # bytes
+
+
+class _HashingSpool:
+    """
+    Named temporary file that werkzeug spools a file upload into, hashing and
+    counting the bytes as they are written.
+    """
+
+    def __init__(self, suffix):
+        self.file = tempfile.NamedTemporaryFile(suffix=suffix, prefix='upload_', delete=False)
+        self.path = self.file.name
+        self.hasher = hashlib.blake2b(digest_size=16)
+        self.size = 0
+        self.claimed = False
+
+    def write(self, data):
+        self.hasher.update(data)
+        self.size += len(data)
+        return self.file.write(data)
+
+    def __iter__(self):
+        return iter(self.file)
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+class UploadRequest(Request):
+    """
+    Request whose file uploads are spooled by werkzeug straight into
+    _HashingSpool files, so _spool_upload can hand the file and its hash to
+    the processors without copying it again. Spools not claimed by
+    _spool_upload are removed when the request closes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._upload_spools = []
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        spool = _HashingSpool(os.path.splitext(filename or '')[1].lower())
+        self._upload_spools.append(spool)
+        return spool
+
+    def close(self):
+        super().close()
+        for spool in self._upload_spools:
+            if not spool.claimed:
+                _remove_upload(spool.path)
+
+
+app.request_class = UploadRequest
+
+
+def _spool_upload(file, extension):
+    """
+    Take over the temporary file an upload was spooled into, with its size
+    and hash computed while werkzeug wrote it (see UploadRequest). Uploads
+    spooled elsewhere are streamed to a temporary file chunk by chunk, so the
+    upload is never held in memory as a whole. The caller owns the temporary
+    file and must remove it.
+    
+    Returns:
+        Tuple of (temp file path, size in bytes, BLAKE2b hex digest of the bytes)
+    """
+    spool = file.stream
+    if isinstance(spool, _HashingSpool) and spool.path.endswith(extension):
+        spool.file.close()
+        spool.claimed = True
+        return spool.path, spool.size, spool.hasher.hexdigest()
+    
+    hasher = hashlib.blake2b(digest_size=16)
+    size = 0
+    fd, path = tempfile.mkstemp(suffix=extension, prefix='upload_')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = file.stream.read(UPLOAD_READ_CHUNK)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path, size, hasher.hexdigest()
+
+
+def _remove_upload(path):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def _document_cache_key(file_hash, filename_lower):
+    """Cache key for a processor's raw result, tied to the uploaded bytes."""
+    from pdf_processor import PROCESSOR_VERSION, GEMINI_MODEL
+    extension = os.path.splitext(filename_lower)[1]
+    return cache_manager.generate_cache_key('document', file_hash, extension, PROCESSOR_VERSION, GEMINI_MODEL)
+
+
+def _organized_document_key(file_hash, filename_lower):
+    """Cache key for the organized text of an uploaded document."""
+    return cache_manager.generate_llm_cache_key(
+        'organized-document', _document_cache_key(file_hash, filename_lower), DEEPSEEK_MODEL,
+        ORGANIZE_SYSTEM_PROMPT + ORGANIZE_PROMPT,
+        ORGANIZE_TEMPERATURE, ORGANIZE_MAX_TOKENS
+    )
+
+
+def _extract_document(file_path, file_hash, filename_lower, progress=None):
+    """
+    Route an uploaded document to its processor.
+    Complete results are cached under the upload's content hash, so repeat
+    uploads of the same file skip OCR entirely.
+    
+    Args:
+        file_path: Path of the spooled upload
+        progress: Optional callback(done, total, partial_text) for PDF/PPTX
+    
+    Returns:
+        Tuple of (result dict, count_key, count_name)
+    """
+    if filename_lower.endswith('.pdf'):
+        count_key, count_name = 'page_count', 'pageCount'
+    elif filename_lower.endswith('.pptx'):
+        count_key, count_name = 'slide_count', 'slideCount'
+    else:
+        count_key, count_name = 'paragraph_count', 'paragraphCount'
+    
+    cache_key = _document_cache_key(file_hash, filename_lower)
+    cached_result = cache_manager.get_cached(cache_key)
+    if cached_result:
+        print(f"📦 Returning cached extraction for {file_hash[:8]}...")
+        result = dict(cached_result)
+        result['cached'] = True
+        return result, count_key, count_name
+    
+    if filename_lower.endswith('.pdf'):
+        from pdf_processor import process_pdf
+        result = process_pdf(file_path, GEMINI_API_KEY, progress=progress)
+    elif filename_lower.endswith('.pptx'):
+        from pdf_processor import process_pptx
+        result = process_pptx(file_path, GEMINI_API_KEY, progress=progress)
+    else:
+        from pdf_processor import extract_docx_text
+        result = extract_docx_text(file_path)
+    
+    # Results with failed pages/slides are not cached so a retry can fill them in
+    if result['success'] and not result.get('partial'):
+        cache_manager.set_cache(cache_key, result)
+    
+    return result, count_key, count_name
+
+
+def _document_info(result, count_key, count_name):
+    """Response fields describing the extracted document (count, per-page/slide method)."""
+    info = {count_name: result.get(count_key, 0)}
+    if 'pages' in result:
+        info['pages'] = result['pages']
+    if 'slides' in result:
+        info['slides'] = result['slides']
+    return info
+
+
+def _build_extract_response(result, count_key, count_name, file_hash, filename_lower):
+    """
+    Organize a processor result with DeepSeek and build the extract response.
+    
+    Returns:
+        Tuple of (response dict, HTTP status)
+    """
+    if result['success']:
+        raw_text = result['text']
+        print(f"✅ File extracted ({result.get(count_key, 0)} {count_key})")
+        
+        # Step 2: Organize with DeepSeek AI
+        if DEEPSEEK_CONFIGURED and len(raw_text) > 100:
+            print(f"🧠 Organizing with DeepSeek AI...")
+            try:
+                organized_key = _organized_document_key(file_hash, filename_lower)
+                organized_text = cache_manager.get_cached(organized_key)
+                from_cache = bool(organized_text)
+                
+                if not from_cache:
+                    organized_text = _organize_text(raw_text)
+                    if not result.get('partial'):
+                        cache_manager.set_cache(organized_key, organized_text)
+                
+                response = {
+                    'success': True,
+                    'text': organized_text,
+                    **_document_info(result, count_key, count_name),
+                    'organized': True
+                }
+                if from_cache:
+                    response['cached'] = True
+                return response, 200
+                
+            except Exception as e:
+                print(f"⚠️ DeepSeek organization failed: {e}, returning raw text")
+        
+        # Fallback: Return raw OCR text
+        return {
+            'success': True,
+            'text': raw_text,
+            **_document_info(result, count_key, count_name),
+            'organized': False
+        }, 200
+    else:
+        print(f"❌ PDF processing failed: {result.get('error')}")
+        return {
+            'success': False,
+            'error': result.get('error', 'Unknown error')
+        }, 500
+
+
+def _stream_extract_pdf(file_path, file_hash, filename_lower):
+    """SSE variant of extract_pdf: status events, then organized text deltas."""
+    def generate():
+        try:
+            yield sse_event('status', {'stage': 'extracting'})
+            result, count_key, count_name = _extract_document(file_path, file_hash, filename_lower)
+            _remove_upload(file_path)
+            
+            if not result['success']:
+                print(f"❌ PDF processing failed: {result.get('error')}")
+                yield sse_event('error', {'success': False, 'error': result.get('error', 'Unknown error')})
+                return
+            
+            raw_text = result['text']
+            count = result.get(count_key, 0)
+            info = _document_info(result, count_key, count_name)
+            print(f"✅ File extracted ({count} {count_key})")
+            
+            if DEEPSEEK_CONFIGURED and len(raw_text) > 100:
+                yield sse_event('status', {'stage': 'organizing', count_name: count})
+                organized_key = _organized_document_key(file_hash, filename_lower)
+                organized_text = cache_manager.get_cached(organized_key)
+                
+                if organized_text:
+                    yield sse_event('done', {
+                        'success': True,
+                        'text': organized_text,
+                        **info,
+                        'organized': True,
+                        'cached': True
+                    })
+                    return
+                
+                chunks = chunking.split_into_chunks(raw_text, ORGANIZE_CHUNK_CHARS)
+                cached_parts = [cache_manager.get_cached(_organize_cache_key(chunk)) for chunk in chunks]
+                
+                if all(cached_parts):
+                    yield sse_event('done', {
+                        'success': True,
+                        'text': '\n\n'.join(cached_parts),
+                        **info,
+                        'organized': True,
+                        'cached': True
+                    })
+                    return
+                
+                try:
+                    # Chunks are streamed in order; cached chunks are replayed as one delta
+                    parts = []
+                    for i, (chunk, cached_part) in enumerate(zip(chunks, cached_parts)):
+                        if i > 0:
+                            parts.append('\n\n')
+                            yield sse_event('delta', {'text': '\n\n'})
+                        
+                        if cached_part:
+                            parts.append(cached_part)
+                            yield sse_event('delta', {'text': cached_part})
+                            continue
+                        
+                        chunk_parts = []
+                        for delta in stream_deepseek(
+                            'deepseek.organize', _organize_messages(chunk),
+                            ORGANIZE_TEMPERATURE, ORGANIZE_MAX_TOKENS
+                        ):
+                            chunk_parts.append(delta)
+                            yield sse_event('delta', {'text': delta})
+                        
+                        chunk_text = ''.join(chunk_parts)
+                        cache_manager.set_cache(_organize_cache_key(chunk), chunk_text)
+                        parts.append(chunk_text)
                     
-                    organized_text = response.choices[0].message.content
+                    organized_text = ''.join(parts)
                     print(f"✅ Organized: {len(raw_text)} → {len(organized_text)} chars")
+                    if not result.get('partial'):
+                        cache_manager.set_cache(organized_key, organized_text)
                     
-                    return jsonify({
+                    yield sse_event('done', {
                         'success': True,
                         'text': organized_text,
-                        count_name: result.get(count_key, 0),
+                        **info,
                         'organized': True
                     })
+                    return
                     
                 except Exception as e:
                     print(f"⚠️ DeepSeek organization failed: {e}, returning raw text")
             
             # Fallback: Return raw OCR text
-            return jsonify({
+            yield sse_event('done', {
                 'success': True,
                 'text': raw_text,
-                count_name: result.get(count_key, 0),
+                **info,
                 'organized': False
             })
-        else:
-            print(f"❌ PDF processing failed: {result.get('error')}")
-            return jsonify({
-                'success': False,
-                'error': result.get('error', 'Unknown error')
-            }), 500
             
+        except Exception as e:
+            print(f"❌ PDF extraction error: {e}")
+            traceback.print_exc()
+            yield sse_event('error', {
+                'success': False,
+                'error': f'PDF 처리 중 오류가 발생했습니다: {str(e)}'
+            })
+    
+    response = sse_response(generate())
+    response.call_on_close(lambda: _remove_upload(file_path))
+    return response
+
+
+def _get_document_upload():
+    """
+    Validate the uploaded document in the current request.
+    
+    Returns:
+        Tuple of (file, filename_lower, error_response); error_response is None if valid
+    """
+    if not GEMINI_API_KEY or GEMINI_API_KEY == 'your_gemini_api_key_here':
+        return None, None, (jsonify({
+            'success': False,
+            'error': 'Gemini API key not configured'
+        }), 500)
+    
+    # Check if file was uploaded
+    if 'file' not in request.files:
+        return None, None, (jsonify({
+            'success': False,
+            'error': 'No file uploaded'
+        }), 400)
+    
+    file = request.files['file']
+    
+    if file.filename == '':
+        return None, None, (jsonify({
+            'success': False,
+            'error': 'No file selected'
+        }), 400)
+    
+    filename_lower = file.filename.lower()
+    
+    # Check file extension
+    if not (filename_lower.endswith('.pdf') or 
+            filename_lower.endswith('.pptx') or 
+            filename_lower.endswith('.docx')):
+        return None, None, (jsonify({
+            'success': False,
+            'error': 'Supported formats: PDF, PPTX, DOCX'
+        }), 400)
+    
+    return file, filename_lower, None
+
+
+@app.route('/api/pdf/extract', methods=['POST'])
+def extract_pdf():
+    """
+    Extract text from PDF, PPTX, or DOCX files.
+    With ?stream=1 the response is a text/event-stream of the organize step.
+    """
+    file, filename_lower, error = _get_document_upload()
+    if error:
+        return error
+    
+    file_path = None
+    streaming = False
+    try:
+        file_path, file_size, file_hash = _spool_upload(file, os.path.splitext(filename_lower)[1])
+        print(f"📄 Processing file: {file.filename} ({file_size} bytes, {file_hash[:8]})")
+        
+        if wants_stream():
+            streaming = True  # the SSE response removes the upload when it closes
+            return _stream_extract_pdf(file_path, file_hash, filename_lower)
+        
+        # Route to appropriate processor based on file type
+        result, count_key, count_name = _extract_document(file_path, file_hash, filename_lower)
+        response, status = _build_extract_response(result, count_key, count_name, file_hash, filename_lower)
+        return jsonify(response), status
+        
     except Exception as e:
         print(f"❌ PDF extraction error: {e}")
         traceback.print_exc()
@@ -610,6 +1563,99 @@ def extract_pdf():
             'success': False,
             'error': f'PDF 처리 중 오류가 발생했습니다: {str(e)}'
         }), 500
+    finally:
+        if not streaming:
+            _remove_upload(file_path)
+
+
+# ============ Background Extraction Jobs ============
+
+def _run_extract_job(job):
+    """Job runner: the /api/pdf/extract pipeline with progress reported to the job row."""
+    job_id = job['id']
+    params = job['params']
+    
+    def progress(done, total, partial_text):
+        job_queue.update_job(job_id, progress_done=done, progress_total=total, partial_text=partial_text)
+    
+    job_queue.update_job(job_id, stage='extracting')
+    result, count_key, count_name = _extract_document(
+        params['input_path'], params['file_hash'], params['filename'], progress=progress
+    )
+    
+    if result['success'] and DEEPSEEK_CONFIGURED and len(result['text']) > 100:
+        job_queue.update_job(job_id, stage='organizing', partial_text=result['text'])
+    
+    response, status = _build_extract_response(
+        result, count_key, count_name, params['file_hash'], params['filename']
+    )
+    if status != 200:
+        raise RuntimeError(response.get('error', 'Unknown error'))
+    return response
+
+
+@app.route('/api/jobs/extract', methods=['POST'])
+def submit_extract_job():
+    """Queue a document extraction and return its job id immediately."""
+    file, filename_lower, error = _get_document_upload()
+    if error:
+        return error
+    
+    start_job_queue()
+    extension = os.path.splitext(filename_lower)[1]
+    file_path, _, file_hash = _spool_upload(file, extension)
+    try:
+        job_id = job_queue.create_job(
+            'extract',
+            {'file_hash': file_hash, 'filename': filename_lower},
+            file_path,
+            extension
+        )
+    finally:
+        _remove_upload(file_path)  # no-op once moved into the job directory
+    job_queue.submit(job_id)
+    print(f"📥 Queued extraction job {job_id[:8]} for {file.filename}")
+    
+    return jsonify({
+        'success': True,
+        'jobId': job_id,
+        'statusUrl': f'/api/jobs/{job_id}'
+    }), 202
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Report a job's stage, progress, partial text and (when done) its result."""
+    job = job_queue.get_job(job_id)
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    response = {
+        'success': True,
+        'jobId': job_id,
+        'status': job['status'],
+        'stage': job['stage'],
+        'progress': {
+            'done': job['progress_done'],
+            'total': job['progress_total']
+        }
+    }
+    if job['status'] == 'done':
+        response['result'] = job['result']
+    elif job['status'] == 'failed':
+        response['error'] = job['error']
+    else:
+        response['partialText'] = job['partial_text'] or ''
+    return jsonify(response)
+
+
+def start_job_queue():
+    """
+    Start this process's job workers. Called by the entry points and, under
+    any other WSGI host (e.g. flask run), by the first job submission; never
+    on import.
+    """
+    job_queue.start({'extract': _run_extract_job})
 
 
 if __name__ == '__main__':
@@ -617,4 +1663,10 @@ if __name__ == '__main__':
     print("📝 Transcript API: GET /api/transcript/<video_id>")
     print("🧠 Question Generation API: POST /api/generate-questions")
     print("📄 PDF OCR API: POST /api/pdf/extract")
+    print("⏳ Extraction Jobs API: POST /api/jobs/extract, GET /api/jobs/<job_id>")
+    if warmup.WARMUP_ENABLED:
+        warmup.warm_up()
+    # The debug reloader re-runs this file in a child process that serves requests
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_job_queue()
     app.run(host='0.0.0.0', port=3001, debug=True)
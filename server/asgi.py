@@ -0,0 +1,498 @@
+"""
+ASGI Server Module
+Async production mode: `uvicorn asgi:app --port 3001`.
+
+The routes that mostly wait on upstream services are served natively on the
+event loop, so a slow DeepSeek or YouTube response holds a coroutine rather
+than a worker thread:
+- GET  /api/transcript/<video_id> and POST /api/transcripts
+- POST /api/format-subtitle (JSON or ?stream=1 server-sent events)
+- POST /api/generate-questions
+
+DeepSeek is called through AsyncOpenAI, admitted by rate_limiter and wrapped
+in upstream.call_async for deadlines, retries and the circuit breaker. youtube-transcript-api and the
+SQLite cache are synchronous, so those calls run in worker threads.
+
+With WARMUP=1 the application startup runs warmup.warm_up() before the
+server accepts connections.
+
+Every other route (document extraction, jobs, health) is served by the Flask
+app from app.py, mounted behind a2wsgi with its own thread pool. Validation,
+cache keys, prompts and response bodies are app.py's helpers, so both modes
+expose the same routes and JSON contracts.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import traceback
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Match, Route
+from werkzeug.http import parse_accept_header
+
+import app as flask_server
+import cache_manager
+import chunking
+import rate_limiter
+import single_flight
+import upstream
+import warmup
+
+FLASK_THREADS = int(os.getenv('FLASK_THREADS', 16))  # threads serving the mounted Flask routes
+
+_deepseek_client = None
+
+
+def get_deepseek_client():
+    """The async DeepSeek client, created on first use. None if no API key is configured."""
+    global _deepseek_client
+    if _deepseek_client is None and flask_server.DEEPSEEK_CONFIGURED:
+        from openai import AsyncOpenAI
+        _deepseek_client = AsyncOpenAI(
+            api_key=flask_server.DEEPSEEK_API_KEY,
+            base_url=flask_server.DEEPSEEK_BASE_URL,
+            max_retries=0
+        )
+    return _deepseek_client
+
+
+async def read_json(request):
+    """Parsed JSON body of a request, or None if it is missing or malformed."""
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+def wants_stream(request):
+    """True if the client asked for a server-sent-events response (?stream=1)."""
+    return request.query_params.get('stream', '').lower() in ('1', 'true', 'yes')
+
+
+def json_response(request, data, status=200, headers=None):
+    """JSON response, compressed like app.compress_response when large enough."""
+    body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    headers = dict(headers or {})
+
+    if len(body) >= flask_server.COMPRESS_MIN_BYTES:
+        encoding = flask_server.negotiate_encoding(
+            parse_accept_header(request.headers.get('accept-encoding'))
+        )
+        if encoding:
+            body = flask_server.compress_body(body, encoding)
+            headers['Content-Encoding'] = encoding
+            headers['Vary'] = 'Accept-Encoding'
+
+    return Response(body, status_code=status, media_type='application/json', headers=headers)
+
+
+def sse_response(events):
+    """Wrap an async event generator in an unbuffered text/event-stream response."""
+    return StreamingResponse(
+        events,
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def _deepseek_request(messages, temperature, max_tokens, stream=False):
+    """Async app._deepseek_request: the request function passed to upstream.call_async."""
+    extra = {'stream_options': {'include_usage': True}} if stream else {}
+    return lambda timeout: get_deepseek_client().chat.completions.create(
+        model=flask_server.DEEPSEEK_MODEL,
+        messages=messages,
+        temperature=temperature,
+        max_tokens=max_tokens,
+        stream=stream,
+        timeout=timeout,
+        **extra
+    )
+
+
+async def call_deepseek(endpoint, messages, temperature, max_tokens):
+    """Async app.call_deepseek: rate_limiter admission, then upstream.call_async."""
+    ticket = await rate_limiter.acquire_async(endpoint, rate_limiter.estimate_messages(messages, max_tokens))
+    response = await upstream.call_async(endpoint, _deepseek_request(messages, temperature, max_tokens))
+    rate_limiter.settle(ticket, getattr(getattr(response, 'usage', None), 'total_tokens', None))
+    return response
+
+
+async def stream_deepseek(endpoint, messages, temperature, max_tokens):
+    """Yield content deltas from a streaming DeepSeek chat completion; see app.stream_deepseek."""
+    ticket = await rate_limiter.acquire_async(endpoint, rate_limiter.estimate_messages(messages, max_tokens))
+    used_tokens = None
+    try:
+        stream = await upstream.call_async(
+            endpoint, _deepseek_request(messages, temperature, max_tokens, stream=True)
+        )
+        async for chunk in stream:
+            usage = getattr(chunk, 'usage', None)
+            if usage is not None:
+                used_tokens = usage.total_tokens
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                yield delta
+    finally:
+        rate_limiter.settle(ticket, used_tokens)
+
+
+async def cached_llm_call(cache_key, compute):
+    """Async app.cached_llm_call, including its stale fallback."""
+    cached = await asyncio.to_thread(cache_manager.get_cached, cache_key)
+    if cached is not None:
+        return cached
+    try:
+        return (await single_flight.run_async(cache_key, compute))[0]
+    except upstream.UpstreamError:
+        stale = await asyncio.to_thread(cache_manager.get_stale, cache_key)
+        if stale is None:
+            raise
+        return stale
+
+
+def upstream_unavailable_response(request, error):
+    """503 with Retry-After; see app.upstream_unavailable."""
+    body, headers = flask_server.upstream_unavailable(error)
+    return json_response(request, body, 503, headers)
+
+
+def rate_limited_response(request, error):
+    """429 with Retry-After; see app.rate_limited."""
+    body, headers = flask_server.rate_limited(error)
+    return json_response(request, body, 429, headers)
+
+
+# ============ YouTube Transcripts ============
+
+async def get_transcript(request):
+    """Async /api/transcript/<video_id>; see app.get_transcript."""
+    video_id = request.path_params['video_id']
+    preferred_lang = request.query_params.get('lang', 'ko')
+    format_type = request.query_params.get('format', 'readable')
+    fields, fields_error = flask_server._parse_transcript_fields(
+        request.query_params.get('fields') or request.query_params.get('views')
+    )
+
+    if fields_error:
+        return json_response(request, {'success': False, 'error': fields_error}, 400)
+
+    response, status = await asyncio.to_thread(
+        flask_server._transcript_response, video_id, preferred_lang, format_type, fields
+    )
+    if status == 200:
+        print(f"✅ Success: {response['segments']} segments")
+    return json_response(request, response, status)
+
+
+async def get_transcripts(request):
+    """Async /api/transcripts; see app.get_transcripts."""
+    video_ids, preferred_lang, format_type, fields, error = flask_server._transcript_batch_request(
+        await read_json(request) or {}
+    )
+    if error:
+        return json_response(request, *error)
+
+    semaphore = asyncio.Semaphore(flask_server.TRANSCRIPT_BATCH_CONCURRENCY)
+
+    async def fetch_one(video_id):
+        async with semaphore:
+            response, status = await asyncio.to_thread(
+                flask_server._transcript_response, video_id, preferred_lang, format_type, fields
+            )
+        return flask_server._transcript_batch_result(video_id, response, status)
+
+    # Duplicate IDs in a playlist are fetched once
+    unique_ids = list(dict.fromkeys(video_ids))
+    print(f"\n=== Fetching {len(unique_ids)} transcripts "
+          f"({flask_server.TRANSCRIPT_BATCH_CONCURRENCY} concurrent) ===")
+    results = await asyncio.gather(*(fetch_one(video_id) for video_id in unique_ids))
+
+    by_id = dict(zip(unique_ids, results))
+    return json_response(request, flask_server._transcript_batch_response(video_ids, by_id))
+
+
+# ============ Subtitle Formatting with DeepSeek ============
+
+async def _format_subtitle_with_deepseek(raw_text):
+    """Call DeepSeek to format subtitle text. Returns the markdown string."""
+    response = await call_deepseek(
+        'deepseek.subtitle', flask_server._subtitle_messages(raw_text),
+        flask_server.SUBTITLE_TEMPERATURE, flask_server.SUBTITLE_MAX_TOKENS
+    )
+
+    formatted_text = response.choices[0].message.content.strip()
+
+    print(f"✅ Formatted subtitle ({len(raw_text)} -> {len(formatted_text)} chars)")
+    return formatted_text
+
+
+def _stream_format_subtitle(raw_text, cache_key):
+    """SSE variant of format_subtitle: forwards DeepSeek deltas as they arrive."""
+    async def generate():
+        parts = []
+        try:
+            async for delta in stream_deepseek(
+                'deepseek.subtitle', flask_server._subtitle_messages(raw_text),
+                flask_server.SUBTITLE_TEMPERATURE, flask_server.SUBTITLE_MAX_TOKENS
+            ):
+                parts.append(delta)
+                yield flask_server.sse_event('delta', {'text': delta})
+
+            formatted_text = ''.join(parts).strip()
+            print(f"✅ Formatted subtitle ({len(raw_text)} -> {len(formatted_text)} chars)")
+            await asyncio.to_thread(cache_manager.set_cache, cache_key, formatted_text)
+
+            yield flask_server.sse_event('done', {
+                'success': True,
+                'formattedText': formatted_text
+            })
+
+        except rate_limiter.RateLimited as e:
+            print(f"❌ Subtitle formatting error: {e}")
+            yield flask_server.sse_event('error', flask_server.rate_limited(e)[0])
+
+        except upstream.UpstreamError as e:
+            print(f"❌ Subtitle formatting error: {e}")
+            stale = None if parts else await asyncio.to_thread(cache_manager.get_stale, cache_key)
+            if stale:
+                yield flask_server.sse_event('done', flask_server._stale_subtitle_result(stale))
+            else:
+                yield flask_server.sse_event('error', flask_server.upstream_unavailable(e)[0])
+
+        except Exception as e:
+            print(f"❌ Subtitle formatting error: {e}")
+            traceback.print_exc()
+            yield flask_server.sse_event('error', {
+                'success': False,
+                'error': f'자막 정리 중 오류가 발생했습니다: {str(e)}'
+            })
+
+    return sse_response(generate())
+
+
+async def format_subtitle(request):
+    """Async /api/format-subtitle; see app.format_subtitle."""
+    if not flask_server.DEEPSEEK_CONFIGURED:
+        return json_response(request, flask_server.SUBTITLE_UNCONFIGURED_ERROR, 500)
+
+    raw_text, error = flask_server._subtitle_request(await read_json(request))
+    if error:
+        return json_response(request, *error)
+
+    # Check cache first
+    cache_key = flask_server._subtitle_cache_key(raw_text)
+    cached_result = await asyncio.to_thread(cache_manager.get_cached, cache_key)
+
+    if cached_result:
+        print(f"📦 Returning cached formatted subtitle")
+        result = {
+            'success': True,
+            'formattedText': cached_result,
+            'cached': True
+        }
+        if wants_stream(request):
+            async def replay():
+                yield flask_server.sse_event('done', result)
+            return sse_response(replay())
+        return json_response(request, result)
+
+    if wants_stream(request):
+        return _stream_format_subtitle(raw_text, cache_key)
+
+    try:
+        # Identical concurrent requests share one upstream call; the result is cached
+        formatted_text, coalesced = await single_flight.run_async(
+            cache_key, lambda: _format_subtitle_with_deepseek(raw_text)
+        )
+
+        result = {
+            'success': True,
+            'formattedText': formatted_text
+        }
+        if coalesced:
+            result['coalesced'] = True
+        return json_response(request, result)
+
+    except rate_limiter.RateLimited as e:
+        print(f"❌ Subtitle formatting error: {e}")
+        return rate_limited_response(request, e)
+
+    except upstream.UpstreamError as e:
+        print(f"❌ Subtitle formatting error: {e}")
+        stale = await asyncio.to_thread(cache_manager.get_stale, cache_key)
+        if stale:
+            return json_response(request, flask_server._stale_subtitle_result(stale))
+        return upstream_unavailable_response(request, e)
+
+    except Exception as e:
+        print(f"❌ Subtitle formatting error: {e}")
+        traceback.print_exc()
+        return json_response(request, {
+            'success': False,
+            'error': f'자막 정리 중 오류가 발생했습니다: {str(e)}'
+        }, 500)
+
+
+# ============ Question Generation with DeepSeek ============
+
+async def _generate_questions_with_deepseek(text, question_type, count):
+    """Call DeepSeek to generate questions. Returns the cacheable result dict."""
+    response = await call_deepseek(
+        'deepseek.questions', flask_server._question_messages(text, question_type, count),
+        flask_server.QUESTION_TEMPERATURE, flask_server.QUESTION_MAX_TOKENS
+    )
+
+    return flask_server._parse_questions(response.choices[0].message.content, question_type)
+
+
+async def _generate_questions_chunked(chunks, question_type, count):
+    """Map-reduce question generation, at most LLM_CHUNK_CONCURRENCY chunks at a time."""
+    jobs = flask_server._question_jobs(chunks, count)
+    semaphore = asyncio.Semaphore(flask_server.LLM_CHUNK_CONCURRENCY)
+
+    async def generate_chunk(chunk, n):
+        async with semaphore:
+            return await cached_llm_call(
+                flask_server._questions_cache_key(chunk, question_type, n),
+                lambda: _generate_questions_with_deepseek(chunk, question_type, n)
+            )
+
+    results = await asyncio.gather(*(generate_chunk(chunk, n) for chunk, n in jobs))
+    return flask_server._merge_questions(results, question_type)
+
+
+async def generate_questions(request):
+    """Async /api/generate-questions; see app.generate_questions."""
+    if not flask_server.DEEPSEEK_CONFIGURED:
+        return json_response(request, flask_server.QUESTIONS_UNCONFIGURED_ERROR, 503)
+
+    text, question_type, count, error = flask_server._questions_request(await read_json(request))
+    if error:
+        return json_response(request, *error)
+
+    # Check cache first
+    cache_key = flask_server._questions_cache_key(text, question_type, count)
+    cached_result = await asyncio.to_thread(cache_manager.get_cached, cache_key)
+
+    if cached_result:
+        print(f"📦 Returning cached questions")
+        return json_response(request, flask_server._questions_response(cached_result, cached=True))
+
+    try:
+        print(f"\n=== Generating {count} {question_type} questions ===")
+        print(f"Text length: {len(text)} chars")
+
+        # Long texts are split to stay within API limits instead of being truncated
+        chunks = chunking.split_into_chunks(text, flask_server.QUESTION_CHUNK_CHARS)
+        if len(chunks) > 1:
+            compute = lambda: _generate_questions_chunked(chunks, question_type, count)
+        else:
+            compute = lambda: _generate_questions_with_deepseek(text, question_type, count)
+
+        # Identical concurrent requests share one upstream call; the result is cached
+        result, coalesced = await single_flight.run_async(cache_key, compute)
+        return json_response(request, flask_server._questions_response(result, coalesced=coalesced))
+
+    except json.JSONDecodeError:
+        return json_response(request, flask_server.QUESTIONS_PARSE_ERROR, 500)
+
+    except rate_limiter.RateLimited as e:
+        print(f"Error: {e}")
+        return rate_limited_response(request, e)
+
+    except upstream.UpstreamError as e:
+        print(f"Error: {e}")
+        stale = await asyncio.to_thread(cache_manager.get_stale, cache_key)
+        if stale:
+            return json_response(request, flask_server._questions_response(stale, cached=True, stale=True))
+        return upstream_unavailable_response(request, e)
+
+    except Exception as e:
+        print(f"Error: {e}")
+        traceback.print_exc()
+        return json_response(request, {
+            'success': False,
+            'error': f'문제 생성 중 오류가 발생했습니다: {str(e)}'
+        }, 500)
+
+
+# ============ Application ============
+
+routes = [
+    Route('/api/transcript/{video_id}', get_transcript, methods=['GET']),
+    Route('/api/transcripts', get_transcripts, methods=['POST']),
+    Route('/api/format-subtitle', format_subtitle, methods=['POST']),
+    Route('/api/generate-questions', generate_questions, methods=['POST']),
+]
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    flask_server.start_job_queue()
+    if warmup.WARMUP_ENABLED:
+        await asyncio.to_thread(warmup.warm_up)
+        get_deepseek_client()
+    yield
+
+
+native_app = Starlette(
+    routes=routes,
+    lifespan=lifespan,
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=flask_server.CORS_ORIGINS,
+                   allow_methods=['*'], allow_headers=['*'])
+    ]
+)
+flask_wsgi = WSGIMiddleware(flask_server.app, workers=FLASK_THREADS)
+
+
+def _end_with_last_chunk(send):
+    """
+    Wrap send so a fixed-length Flask response ends on its last data chunk.
+
+    a2wsgi sends the final chunk and the empty end-of-body message
+    separately. A client that stops reading at Content-Length may disconnect
+    in between, and uvicorn then never counts the request toward
+    limit_max_requests, which would stall max-requests recycling.
+    """
+    held = None
+    sized = False
+
+    async def wrapped(message):
+        nonlocal held, sized
+        if message['type'] == 'http.response.start':
+            sized = any(name.lower() == b'content-length' for name, _ in message.get('headers', []))
+        elif message['type'] == 'http.response.body' and sized:
+            if held is not None:
+                if not message.get('more_body', False) and not message.get('body'):
+                    message = {**held, 'more_body': False}
+                else:
+                    await send(held)
+                held = None
+            if message.get('more_body', False):
+                held = message
+                return
+        await send(message)
+
+    return wrapped
+
+
+async def app(scope, receive, send):
+    """Serve native routes on the event loop and everything else through Flask."""
+    if scope['type'] == 'http' and not any(route.matches(scope)[0] != Match.NONE for route in routes):
+        await flask_wsgi(scope, receive, _end_with_last_chunk(send))
+        return
+    await native_app(scope, receive, send)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    print("🚀 GenGen Python API Server (ASGI) starting...")
+    uvicorn.run('asgi:app', host='0.0.0.0', port=3001)
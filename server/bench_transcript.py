@@ -0,0 +1,115 @@
+"""
+Micro-benchmark: single-pass transcript formatter vs. the previous multi-pass code.
+
+Usage:
+    python bench_transcript.py [--segments 20000] [--repeat 20]
+"""
+import argparse
+import random
+import re
+import timeit
+import tracemalloc
+
+import transcript_format
+
+
+# ---- Previous implementation (get_transcript before transcript_format) ----
+
+def legacy_format_transcript_readable(transcript_list, pause_threshold=2.0):
+    if not transcript_list:
+        return ""
+
+    paragraphs = []
+    current_paragraph = []
+
+    for i, item in enumerate(transcript_list):
+        text = item['text'].strip()
+        if not text:
+            continue
+        current_paragraph.append(text)
+
+        if i < len(transcript_list) - 1:
+            current_end = item['start'] + item['duration']
+            next_start = transcript_list[i + 1]['start']
+            pause = next_start - current_end
+
+            if pause >= pause_threshold:
+                paragraph_text = ' '.join(current_paragraph)
+                paragraphs.append(paragraph_text)
+                current_paragraph = []
+
+    if current_paragraph:
+        paragraphs.append(' '.join(current_paragraph))
+
+    result = '\n\n'.join(paragraphs)
+    result = re.sub(r' +', ' ', result)
+    result = re.sub(r'\n{3,}', '\n\n', result)
+
+    return result
+
+
+def legacy_views(segments):
+    transcript_list = []
+    for text, start, duration in zip(segments.texts, segments.starts, segments.durations):
+        transcript_list.append({'text': text, 'start': start, 'duration': duration})
+
+    raw_text = ' '.join([item['text'] for item in transcript_list])
+    raw_text = ' '.join(raw_text.split())
+    readable = legacy_format_transcript_readable(transcript_list)
+    text_with_timestamps = '\n'.join([
+        f"[{int(item['start'] // 60)}:{int(item['start'] % 60):02d}] {item['text']}"
+        for item in transcript_list
+    ])
+    return {'raw': raw_text, 'readable': readable, 'timestamps': text_with_timestamps}
+
+
+# ---- Benchmark ----
+
+WORDS = ['그래서', '이제', 'the', 'function', '미분', 'integral', 'so', '다음', 'value', '예를 들어']
+
+
+def make_segments(count: int, seed: int = 0):
+    """Synthetic lecture transcript: short caption lines with occasional pauses."""
+    rng = random.Random(seed)
+    texts, starts, durations = [], [], []
+    t = 0.0
+    for _ in range(count):
+        texts.append(' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 9))))
+        duration = rng.uniform(1.0, 4.0)
+        starts.append(round(t, 3))
+        durations.append(round(duration, 3))
+        t += duration + (rng.uniform(2.0, 4.0) if rng.random() < 0.1 else rng.uniform(0.0, 0.3))
+    return transcript_format.Segments(texts, starts, durations)
+
+
+def peak_memory(func, *args):
+    tracemalloc.start()
+    func(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark transcript formatting')
+    parser.add_argument('--segments', type=int, default=20000,
+                        help='Number of caption segments (20000 ≈ a 12-hour lecture)')
+    parser.add_argument('--repeat', type=int, default=20, help='Timed runs per implementation')
+    args = parser.parse_args()
+
+    segments = make_segments(args.segments)
+    assert legacy_views(segments) == transcript_format.format_views(segments), 'outputs differ'
+
+    implementations = [
+        ('legacy (multi-pass)', legacy_views),
+        ('single-pass', transcript_format.format_views),
+    ]
+    print(f"📊 {args.segments} segments, best of {args.repeat} runs")
+    for name, func in implementations:
+        best = min(timeit.repeat(lambda: func(segments), number=1, repeat=args.repeat))
+        peak = peak_memory(func, segments)
+        print(f"  {name:<20} {best * 1000:8.2f} ms   peak {peak / (1024 * 1024):6.2f} MB")
+
+
+if __name__ == '__main__':
+    main()
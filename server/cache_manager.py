@@ -1,16 +1,64 @@
 """
-File-based Cache Module
-Stores API responses as JSON files for reuse.
+Cache Module
+Stores API responses for reuse.
+
+Reads go through a bounded in-process LRU tier first, so hot entries are not
+re-read and re-parsed from disk on every hit. Writes go to both tiers.
+
+The persistent tier is pluggable:
+- 'sqlite' (default): a single WAL-mode SQLite file indexed on key and expiry
+- 'json': one <key>.json file per entry in CACHE_DIR
+
+Select it with the CACHE_BACKEND environment variable.
+
+Entries expire CACHE_TTL after they are written unless set_cache is given
+its own ttl. Expired entries stay in the persistent tier for another
+CACHE_STALE_GRACE, readable only through get_stale(), so a response can still
+be served while the upstream that would refresh it is down.
+
+Both persistent backends are safe to share between worker processes: the
+SQLite file is opened per thread (and per process after a fork), and JSON
+files are written to a temporary file and renamed into place.
 """
 import os
+import re
 import json
 import hashlib
+import sqlite3
+import tempfile
+import threading
 import time
+from collections import OrderedDict
 from pathlib import Path
 
+import environment  # settings below are read at import time
+
 # Cache directory
 CACHE_DIR = Path(__file__).parent / "cache"
 CACHE_TTL = 7 * 24 * 60 * 60  # 7 days in seconds
+CACHE_STALE_GRACE = int(os.getenv('CACHE_STALE_GRACE', 7 * 24 * 60 * 60))  # seconds expired entries are kept for get_stale
+
+# Persistent tier selection
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'sqlite').lower()
+CACHE_DB_PATH = Path(os.getenv('CACHE_DB_PATH', str(CACHE_DIR / "cache.sqlite3")))
+
+# In-memory tier limits
+MEMORY_CACHE_MAX_ENTRIES = int(os.getenv('MEMORY_CACHE_MAX_ENTRIES', 512))
+MEMORY_CACHE_MAX_BYTES = int(os.getenv('MEMORY_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+
+JSON_TEMP_MAX_AGE = 60 * 60  # seconds; leftover temp files of crashed writers are removed after this
+
+# key -> (expires_at, data, size_bytes), least recently used first
+_memory_cache = OrderedDict()
+_memory_bytes = 0
+_memory_lock = threading.Lock()
+
+_stats = {
+    'memory_hits': 0,
+    'memory_misses': 0,
+    'store_hits': 0,
+    'store_misses': 0,
+}
 
 
 def ensure_cache_dir():
@@ -28,100 +76,489 @@ def generate_cache_key(*args):
     return hashlib.md5(combined.encode('utf-8')).hexdigest()
 
 
+_INLINE_WHITESPACE = re.compile(r'[ \t\f\v\u00a0\u3000]+')
+
+
+def content_hash(text: str) -> str:
+    r"""
+    Hash the full text after whitespace normalization (BLAKE2b, 128-bit).
+
+    Normalization rules, so cosmetic differences do not split the cache:
+    1. Every line boundary recognized by str.splitlines() is treated as \n:
+       \r\n and \r, but also \v, \f, \x1c-\x1e, \x85, \u2028 and \u2029.
+    2. Runs of spaces, tabs, NBSP and full-width spaces become one space.
+    3. Leading and trailing whitespace on each line is removed.
+    4. Blank lines collapse into a single paragraph break; leading and
+       trailing blank lines are dropped.
+
+    The normalized lines are fed to the hasher one by one rather than joined
+    into a normalized string (splitlines() still holds the text's lines in a
+    list while hashing).
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    pending_break = False
+    started = False
+
+    for line in text.splitlines():
+        line = _INLINE_WHITESPACE.sub(' ', line).strip()
+        if not line:
+            pending_break = started
+            continue
+        if started:
+            hasher.update(b'\n\n' if pending_break else b'\n')
+        hasher.update(line.encode('utf-8'))
+        started = True
+        pending_break = False
+
+    return hasher.hexdigest()
+
+
+def generate_llm_cache_key(kind: str, text: str, model: str, prompt: str,
+                           temperature: float, max_tokens: int, *extra):
+    """
+    Generate a cache key for an LLM response.
+
+    Covers the full normalized input plus every parameter that changes the
+    output, so prompt edits or model/sampling changes never reuse stale entries.
+
+    Args:
+        kind: Response type ('subtitle', 'questions', ...)
+        text: The complete input text sent to the model
+        model: Model name
+        prompt: Prompt template(s); only its fingerprint goes into the key
+        temperature: Sampling temperature
+        max_tokens: Output token limit
+        extra: Any other request parameters (question type, count, ...)
+    """
+    prompt_version = hashlib.blake2b(prompt.encode('utf-8'), digest_size=8).hexdigest()
+    return generate_cache_key(kind, content_hash(text), model, prompt_version,
+                              temperature, max_tokens, *extra)
+
+
 def get_cache_path(cache_key: str) -> Path:
-    """Get file path for a cache key."""
+    """Get file path for a cache key (JSON backend)."""
     return CACHE_DIR / f"{cache_key}.json"
 
 
+# ============ Persistent Backends ============
+
+def _json_expires_at(cached: dict) -> float:
+    """Expiry of a JSON cache file; files written before per-entry TTLs use CACHE_TTL."""
+    return cached.get('expires_at', cached.get('timestamp', 0) + CACHE_TTL)
+
+
+class JsonDirBackend:
+    """One pretty-printed JSON file per cache key."""
+
+    name = 'json'
+
+    def get(self, cache_key: str):
+        """Return (expires_at, data, size_bytes) or None."""
+        ensure_cache_dir()
+        cache_path = get_cache_path(cache_key)
+
+        if not cache_path.exists():
+            return None
+
+        try:
+            with open(cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            return _json_expires_at(cached), cached.get('data'), cache_path.stat().st_size
+        except (json.JSONDecodeError, IOError):
+            return None
+
+    def set(self, cache_key: str, timestamp: float, data, ttl: float = CACHE_TTL) -> int:
+        """Store an entry and return its serialized size in bytes."""
+        ensure_cache_dir()
+        payload = json.dumps({
+            'timestamp': timestamp,
+            'expires_at': timestamp + ttl,
+            'data': data
+        }, ensure_ascii=False, indent=2)
+
+        # Readers in other workers see either the old file or the new one, never a partial write
+        fd, temp_path = tempfile.mkstemp(dir=CACHE_DIR, prefix=f".{cache_key}.", suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(temp_path, get_cache_path(cache_key))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return len(payload.encode('utf-8'))
+
+    def delete(self, cache_key: str):
+        get_cache_path(cache_key).unlink(missing_ok=True)
+
+    def purge_expired(self, now: float) -> int:
+        """Delete entries expired as of now. Returns number removed."""
+        ensure_cache_dir()
+        temp_cutoff = time.time() - JSON_TEMP_MAX_AGE
+        cleared = 0
+
+        for cache_file in CACHE_DIR.glob("*.json"):
+            try:
+                with open(cache_file, 'r', encoding='utf-8') as f:
+                    cached = json.load(f)
+
+                if _json_expires_at(cached) < now:
+                    cache_file.unlink()
+                    cleared += 1
+            except (json.JSONDecodeError, IOError):
+                # Delete corrupted cache files
+                cache_file.unlink(missing_ok=True)
+                cleared += 1
+
+        for temp_file in CACHE_DIR.glob(".*.tmp"):
+            try:
+                if temp_file.stat().st_mtime < temp_cutoff:
+                    temp_file.unlink()
+            except FileNotFoundError:
+                pass
+
+        return cleared
+
+    def stats(self) -> dict:
+        ensure_cache_dir()
+        entries = 0
+        size = 0
+
+        for cache_file in CACHE_DIR.glob("*.json"):
+            entries += 1
+            size += cache_file.stat().st_size
+
+        return {'entries': entries, 'size_bytes': size}
+
+
+class SqliteBackend:
+    """Single-file SQLite store in WAL mode, indexed on key and expiry."""
+
+    name = 'sqlite'
+
+    def __init__(self, db_path: Path):
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+
+    def reset_connections(self):
+        """Forget open connections (a forked child must not reuse its parent's)."""
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, creating the schema on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    timestamp REAL NOT NULL,
+                    expires_at REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    data TEXT NOT NULL
+                )
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_expires_at ON cache (expires_at)')
+            self._local.conn = conn
+        return conn
+
+    def get(self, cache_key: str):
+        """Return (expires_at, data, size_bytes) or None."""
+        try:
+            row = self._connect().execute(
+                'SELECT expires_at, data, size FROM cache WHERE key = ?', (cache_key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f"❌ Cache read error: {e}")
+            return None
+
+        if row is None:
+            return None
+
+        try:
+            return row[0], json.loads(row[1]), row[2]
+        except json.JSONDecodeError:
+            self.delete(cache_key)
+            return None
+
+    def set(self, cache_key: str, timestamp: float, data, ttl: float = CACHE_TTL) -> int:
+        """Store an entry and return its serialized size in bytes."""
+        payload = json.dumps(data, ensure_ascii=False)
+        size = len(payload.encode('utf-8'))
+        try:
+            self._connect().execute(
+                'INSERT OR REPLACE INTO cache (key, timestamp, expires_at, size, data) VALUES (?, ?, ?, ?, ?)',
+                (cache_key, timestamp, timestamp + ttl, size, payload)
+            )
+        except sqlite3.Error as e:
+            raise IOError(e)
+        return size
+
+    def delete(self, cache_key: str):
+        try:
+            self._connect().execute('DELETE FROM cache WHERE key = ?', (cache_key,))
+        except sqlite3.Error as e:
+            print(f"❌ Cache delete error: {e}")
+
+    def purge_expired(self, now: float) -> int:
+        """Delete entries expired as of now. Returns number removed."""
+        cursor = self._connect().execute(
+            'DELETE FROM cache WHERE expires_at < ?', (now,)
+        )
+        return cursor.rowcount
+
+    def stats(self) -> dict:
+        entries, size = self._connect().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache'
+        ).fetchone()
+        return {'entries': entries, 'size_bytes': size}
+
+
+def _create_backend(name: str):
+    if name == 'json':
+        return JsonDirBackend()
+    if name == 'sqlite':
+        return SqliteBackend(CACHE_DB_PATH)
+    raise ValueError(f"Unknown CACHE_BACKEND: {name}")
+
+
+_backend = _create_backend(CACHE_BACKEND)
+
+
+def get_backend():
+    """Return the active persistent backend."""
+    return _backend
+
+
+def set_backend(backend):
+    """Swap the persistent backend (also drops the memory tier)."""
+    global _backend
+    _backend = backend
+    clear_memory_cache()
+
+
+def _after_fork_in_child():
+    """Give a forked worker fresh locks and connections; the memory tier is kept warm."""
+    global _memory_lock
+    _memory_lock = threading.Lock()
+    if hasattr(_backend, 'reset_connections'):
+        _backend.reset_connections()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+# ============ Memory Tier ============
+
+def _count(stat: str):
+    with _memory_lock:
+        _stats[stat] += 1
+
+
+def _memory_discard(cache_key: str):
+    """Remove an entry from the memory tier. Caller must hold _memory_lock."""
+    global _memory_bytes
+    entry = _memory_cache.pop(cache_key, None)
+    if entry is not None:
+        _memory_bytes -= entry[2]
+
+
+def _memory_get(cache_key: str):
+    """Look up a key in the memory tier. Returns the entry tuple or None."""
+    with _memory_lock:
+        entry = _memory_cache.get(cache_key)
+        if entry is None:
+            _stats['memory_misses'] += 1
+            return None
+
+        if time.time() > entry[0]:
+            _memory_discard(cache_key)
+            _stats['memory_misses'] += 1
+            return None
+
+        _memory_cache.move_to_end(cache_key)
+        _stats['memory_hits'] += 1
+        return entry
+
+
+def _memory_put(cache_key: str, expires_at: float, data, size: int):
+    """Insert an entry into the memory tier, evicting LRU entries over the limits."""
+    global _memory_bytes
+    if MEMORY_CACHE_MAX_ENTRIES <= 0 or size > MEMORY_CACHE_MAX_BYTES:
+        return
+
+    with _memory_lock:
+        _memory_discard(cache_key)
+        _memory_cache[cache_key] = (expires_at, data, size)
+        _memory_bytes += size
+
+        while (len(_memory_cache) > MEMORY_CACHE_MAX_ENTRIES or
+               _memory_bytes > MEMORY_CACHE_MAX_BYTES):
+            oldest_key = next(iter(_memory_cache))
+            _memory_discard(oldest_key)
+
+
+def clear_memory_cache():
+    """Drop every entry from the memory tier."""
+    global _memory_bytes
+    with _memory_lock:
+        _memory_cache.clear()
+        _memory_bytes = 0
+
+
+# ============ Public API ============
+
 def get_cached(cache_key: str):
     """
     Get cached result if it exists and is not expired.
-    
+    Checks the memory tier first, then falls back to the persistent tier.
+
     Returns:
         Cached data or None if not found/expired
     """
-    ensure_cache_dir()
-    cache_path = get_cache_path(cache_key)
-    
-    if not cache_path.exists():
+    entry = _memory_get(cache_key)
+    if entry is not None:
+        print(f"✅ Cache hit (memory): {cache_key[:8]}...")
+        return entry[1]
+
+    stored = _backend.get(cache_key)
+    if stored is None:
+        _count('store_misses')
         return None
-    
-    try:
-        with open(cache_path, 'r', encoding='utf-8') as f:
-            cached = json.load(f)
-        
-        # Check if expired
-        if time.time() - cached.get('timestamp', 0) > CACHE_TTL:
-            # Delete expired cache
-            cache_path.unlink()
-            return None
-        
-        print(f"✅ Cache hit: {cache_key[:8]}...")
-        return cached.get('data')
-    except (json.JSONDecodeError, IOError):
+
+    expires_at, data, size = stored
+
+    # Check if expired
+    now = time.time()
+    if now > expires_at:
+        # Delete expired cache once it is too old to be served stale
+        if now > expires_at + CACHE_STALE_GRACE:
+            _backend.delete(cache_key)
+        _count('store_misses')
+        return None
+
+    _count('store_hits')
+    _memory_put(cache_key, expires_at, data, size)
+
+    print(f"✅ Cache hit: {cache_key[:8]}...")
+    return data
+
+
+def get_stale(cache_key: str):
+    """
+    Get a cached result even if it has expired, as long as it is within
+    CACHE_STALE_GRACE of its expiry. For use when the upstream is unavailable.
+
+    Returns:
+        Cached data or None if not found/past the grace period
+    """
+    stored = _backend.get(cache_key)
+    if stored is None:
+        return None
+
+    expires_at, data, _ = stored
+    if time.time() > expires_at + CACHE_STALE_GRACE:
         return None
 
+    print(f"🕰️ Serving stale cache: {cache_key[:8]}...")
+    return data
 
-def set_cache(cache_key: str, data):
+
+def set_cache(cache_key: str, data, ttl: float = None):
     """
     Store data in cache.
-    
+
     Args:
         cache_key: Unique identifier
         data: Data to cache (must be JSON serializable)
+        ttl: Seconds until the entry expires (default CACHE_TTL)
     """
-    ensure_cache_dir()
-    cache_path = get_cache_path(cache_key)
-    
+    timestamp = time.time()
+    ttl = CACHE_TTL if ttl is None else ttl
+
     try:
-        cached = {
-            'timestamp': time.time(),
-            'data': data
-        }
-        with open(cache_path, 'w', encoding='utf-8') as f:
-            json.dump(cached, f, ensure_ascii=False, indent=2)
+        size = _backend.set(cache_key, timestamp, data, ttl)
+        _memory_put(cache_key, timestamp + ttl, data, size)
         print(f"💾 Cached: {cache_key[:8]}...")
     except IOError as e:
         print(f"❌ Cache write error: {e}")
 
 
 def clear_expired_cache():
-    """Remove all expired cache files."""
-    ensure_cache_dir()
+    """Remove all cache entries expired for longer than CACHE_STALE_GRACE."""
     current_time = time.time()
-    cleared = 0
-    
-    for cache_file in CACHE_DIR.glob("*.json"):
-        try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cached = json.load(f)
-            
-            if current_time - cached.get('timestamp', 0) > CACHE_TTL:
-                cache_file.unlink()
-                cleared += 1
-        except (json.JSONDecodeError, IOError):
-            # Delete corrupted cache files
-            cache_file.unlink()
-            cleared += 1
-    
+    cleared = _backend.purge_expired(current_time - CACHE_STALE_GRACE)
+
+    with _memory_lock:
+        expired = [key for key, entry in _memory_cache.items()
+                   if current_time > entry[0]]
+        for key in expired:
+            _memory_discard(key)
+
     if cleared > 0:
-        print(f"🧹 Cleared {cleared} expired cache files")
+        print(f"🧹 Cleared {cleared} expired cache entries")
     return cleared
 
 
 def get_cache_stats():
     """Get cache statistics."""
-    ensure_cache_dir()
-    
-    total_files = 0
-    total_size = 0
-    
-    for cache_file in CACHE_DIR.glob("*.json"):
-        total_files += 1
-        total_size += cache_file.stat().st_size
-    
+    store = _backend.stats()
+    total_size = store['size_bytes']
+
+    with _memory_lock:
+        memory = {
+            'entries': len(_memory_cache),
+            'size_kb': round(_memory_bytes / 1024, 2),
+            'hits': _stats['memory_hits'],
+            'misses': _stats['memory_misses'],
+        }
+        store_tier = {
+            'hits': _stats['store_hits'],
+            'misses': _stats['store_misses'],
+        }
+
     return {
-        'total_files': total_files,
+        'backend': _backend.name,
+        'total_files': store['entries'],
         'total_size_kb': round(total_size / 1024, 2),
-        'total_size_mb': round(total_size / (1024 * 1024), 2)
+        'total_size_mb': round(total_size / (1024 * 1024), 2),
+        'memory': memory,
+        'store': store_tier
     }
+
+
+def migrate_json_cache(source_dir: Path = None, backend=None) -> dict:
+    """
+    Import every <key>.json file from a JSON cache directory into a backend.
+    Expired and corrupted files are skipped. Source files are left in place.
+
+    Returns:
+        Dictionary with imported/skipped counts
+    """
+    source_dir = Path(source_dir or CACHE_DIR)
+    backend = backend or _backend
+    now = time.time()
+    imported = 0
+    skipped = 0
+
+    for cache_file in source_dir.glob("*.json"):
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (json.JSONDecodeError, IOError):
+            skipped += 1
+            continue
+
+        timestamp = cached.get('timestamp', 0)
+        expires_at = _json_expires_at(cached)
+        if expires_at < now:
+            skipped += 1
+            continue
+
+        backend.set(cache_file.stem, timestamp, cached.get('data'), expires_at - timestamp)
+        imported += 1
+
+    return {'imported': imported, 'skipped': skipped}
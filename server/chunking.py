@@ -0,0 +1,119 @@
+"""
+Text Chunking Module
+Splits long texts into ordered chunks for map-reduce LLM calls.
+
+Boundaries are chosen in this order of preference:
+1. Markdown headings (lines starting with '#')
+2. Paragraph breaks (blank lines, as produced by format_transcript_readable)
+3. Sentence ends
+4. Whitespace (or a hard cut as a last resort)
+"""
+import re
+
+_HEADING = re.compile(r'^#{1,6}\s', re.MULTILINE)
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+_SENTENCE_END = re.compile(r'(?<=[.!?。])\s+')
+
+
+def _split_sections(text: str) -> list:
+    """Split text before every markdown heading, keeping each heading with its body."""
+    starts = [m.start() for m in _HEADING.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    starts.append(len(text))
+    return [text[a:b].strip() for a, b in zip(starts, starts[1:]) if text[a:b].strip()]
+
+
+def _hard_split(text: str, max_chars: int) -> list:
+    """Split an oversized block at sentence ends, then whitespace, then anywhere."""
+    pieces = []
+    while len(text) > max_chars:
+        window = text[:max_chars]
+        cut = 0
+        for match in _SENTENCE_END.finditer(window):
+            cut = match.end()
+        if cut < max_chars // 2:
+            cut = window.rfind(' ') + 1 or window.rfind('\n') + 1
+        if cut < max_chars // 2:
+            cut = max_chars
+        pieces.append(text[:cut].strip())
+        text = text[cut:].lstrip()
+    if text.strip():
+        pieces.append(text.strip())
+    return pieces
+
+
+def _units(text: str, max_chars: int) -> list:
+    """Break text into units no longer than max_chars along the preferred boundaries."""
+    units = []
+    for section in _split_sections(text):
+        if len(section) <= max_chars:
+            units.append(section)
+            continue
+        paragraphs = [p.strip() for p in _PARAGRAPH_BREAK.split(section) if p.strip()]
+        # Keep a bare heading line attached to the paragraph it introduces
+        if len(paragraphs) > 1 and '\n' not in paragraphs[0] and _HEADING.match(paragraphs[0]):
+            paragraphs[:2] = [paragraphs[0] + '\n\n' + paragraphs[1]]
+        for paragraph in paragraphs:
+            if len(paragraph) <= max_chars:
+                units.append(paragraph)
+            else:
+                units.extend(_hard_split(paragraph, max_chars))
+    return units
+
+
+def split_into_chunks(text: str, max_chars: int) -> list:
+    """
+    Split text into ordered chunks of at most max_chars characters.
+
+    Units are packed greedily, and a heading starts a new chunk once the
+    current one is at least half full, so chunk boundaries tend to line up
+    with document sections and an edit stays local to its chunk.
+
+    Args:
+        text: The full text
+        max_chars: Maximum characters per chunk
+
+    Returns:
+        List of chunk strings (a single chunk if text already fits)
+    """
+    if len(text) <= max_chars:
+        return [text]
+
+    chunks = []
+    current = []
+    current_len = 0
+
+    for unit in _units(text, max_chars):
+        starts_section = _HEADING.match(unit) is not None
+        needed = len(unit) + (2 if current else 0)
+
+        if current and (current_len + needed > max_chars or
+                        (starts_section and current_len >= max_chars // 2)):
+            chunks.append('\n\n'.join(current))
+            current = []
+            current_len = 0
+            needed = len(unit)
+
+        current.append(unit)
+        current_len += needed
+
+    if current:
+        chunks.append('\n\n'.join(current))
+
+    return chunks
+
+
+def distribute_count(total: int, num_chunks: int) -> list:
+    """
+    Spread `total` items (e.g. questions) evenly across chunk positions.
+
+    Returns:
+        List of per-chunk counts summing to total
+    """
+    counts = [0] * num_chunks
+    if num_chunks == 0:
+        return counts
+    for i in range(total):
+        counts[int((i + 0.5) * num_chunks / total)] += 1
+    return counts
@@ -0,0 +1,17 @@
+"""
+Environment Module
+Loads .env files into os.environ.
+
+Modules that read their settings at import time import this module first,
+so values from .env take effect whichever entry point (app.py, asgi.py,
+gunicorn, warmup.py) or module is imported first. Variables already set in
+the process environment take precedence over .env.
+"""
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Load environment variables from parent directory (.env in project root)
+load_dotenv(dotenv_path=Path(__file__).parent.parent / '.env')
+# Also try local .env if exists
+load_dotenv()
@@ -0,0 +1,60 @@
+"""
+Gunicorn Configuration
+Production launcher for the ASGI app: `gunicorn -c gunicorn.conf.py` (run from server/).
+
+- preload_app: app.py and its modules are imported once in the master and
+  shared copy-on-write by the workers. Per-process state (SQLite connections,
+  job queue threads, the LibreOffice pool) is recreated in each worker after
+  the fork by the modules' own at-fork hooks. The job queue is started in
+  each worker (post_fork), never in the master.
+- workers: one uvicorn worker per available CPU core (WEB_CONCURRENCY overrides).
+  Each worker gets an equal share of the DeepSeek/Gemini rate limits.
+- Graceful restarts: SIGHUP starts fresh workers and lets the old ones finish
+  their requests for up to GRACEFUL_TIMEOUT seconds; SIGTERM does the same
+  on shutdown.
+- Warm-up (WARMUP=1): heavy modules are imported once in the master before
+  forking; each worker then creates its clients and connections in its ASGI
+  startup, before accepting requests (see warmup.py).
+- Recycling: each worker is replaced after MAX_REQUESTS requests (plus
+  jitter, so workers do not all restart at once), bounding slow leaks from
+  long-running OCR and PDF libraries. Jobs of a worker that exits are
+  resumed by another worker once their heartbeat goes stale.
+"""
+import os
+
+
+def _available_cpus() -> int:
+    """CPU cores this process may run on (respects container/affinity limits)."""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+wsgi_app = 'asgi:app'
+worker_class = 'uvicorn_worker.UvicornWorker'
+bind = os.getenv('BIND', f"0.0.0.0:{os.getenv('PORT', 3001)}")
+workers = int(os.getenv('WEB_CONCURRENCY', _available_cpus()))
+os.environ['WEB_CONCURRENCY'] = str(workers)  # rate_limiter splits the LLM quotas between workers
+preload_app = True
+
+timeout = int(os.getenv('WORKER_TIMEOUT', 120))  # seconds without a heartbeat before a worker is killed
+graceful_timeout = int(os.getenv('GRACEFUL_TIMEOUT', 120))  # seconds to finish in-flight requests on restart
+keepalive = 5  # seconds
+
+max_requests = int(os.getenv('MAX_REQUESTS', 1000))  # 0 disables recycling
+max_requests_jitter = int(os.getenv('MAX_REQUESTS_JITTER', max_requests // 10))
+
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    import warmup
+    if warmup.WARMUP_ENABLED:
+        timings = warmup.import_modules()
+        server.log.info(f"Preloaded heavy modules in {sum(timings.values()):.2f}s")
+
+
+def post_fork(server, worker):
+    import app
+    app.start_job_queue()
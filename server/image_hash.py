@@ -0,0 +1,73 @@
+"""
+Image Hash Module
+Perceptual hashing used to skip OCR of repeated pages, slides and pictures.
+
+A page fingerprint combines a difference hash (dHash) of the rendered image
+with a hash of the text already known for it (PDF text layer or native slide
+text). Two units are duplicates only if their text hashes match and their
+dHashes differ in at most DUPLICATE_MAX_DISTANCE bits, so animation build
+steps that add a line of text are not merged.
+"""
+import hashlib
+import os
+import threading
+
+from PIL import Image
+
+HASH_SIZE = 16  # dHash grid: 16x16 gradients → 256 bits
+DUPLICATE_MAX_DISTANCE = int(os.getenv('DUPLICATE_MAX_DISTANCE', 2))  # bits
+
+
+def dhash(image: Image.Image, hash_size: int = HASH_SIZE) -> str:
+    """Difference hash of an image as a hex string (hash_size * hash_size bits)."""
+    small = image.convert('L').resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return f"{bits:0{hash_size * hash_size // 4}x}"
+
+
+def hamming(a: str, b: str) -> int:
+    """Number of differing bits between two hex hashes."""
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+
+def text_hash(text: str) -> str:
+    """Short hash of a unit's known text ('' for scanned pages and pure images)."""
+    return hashlib.blake2b(' '.join((text or '').split()).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def bytes_hash(data: bytes) -> str:
+    """Exact hash of embedded image bytes."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class DuplicateIndex:
+    """
+    Thread-safe index of fingerprints seen within one document.
+
+    canonical() maps each (text hash, image hash) to the first near-identical
+    fingerprint registered, so duplicates share one OCR cache key.
+    """
+
+    def __init__(self, max_distance: int = DUPLICATE_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self._seen = {}  # text hash -> list of image hashes
+        self._lock = threading.Lock()
+
+    def canonical(self, text_digest: str, image_digest: str) -> tuple:
+        """
+        Returns:
+            Tuple of (canonical fingerprint string, is_duplicate)
+        """
+        with self._lock:
+            candidates = self._seen.setdefault(text_digest, [])
+            for seen in candidates:
+                if seen == image_digest or (
+                        self.max_distance > 0 and hamming(seen, image_digest) <= self.max_distance):
+                    return f"{text_digest}:{seen}", True
+            candidates.append(image_digest)
+            return f"{text_digest}:{image_digest}", False
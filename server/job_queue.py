@@ -0,0 +1,244 @@
+"""
+Job Queue Module
+Runs long document extractions in a local worker pool instead of holding
+the request thread, and persists job state in SQLite so it survives a
+worker restart.
+
+Each process heartbeats the jobs it owns. Jobs whose heartbeat goes stale
+(their process died) are claimed and re-run by any live process.
+
+Importing the module starts nothing. Each serving process calls start()
+from its entry point (app.py's __main__, the ASGI startup in asgi.py, gunicorn's
+post_fork, or the first job submission under any other WSGI host), so a
+preloading master, the import-time report or a script that imports app never
+runs or claims jobs. A process only claims jobs of kinds it has a runner for.
+"""
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import cache_manager
+
+JOBS_DB_PATH = Path(os.getenv('JOBS_DB_PATH', str(cache_manager.CACHE_DIR / "jobs.sqlite3")))
+JOBS_DIR = Path(os.getenv('JOBS_DIR', str(cache_manager.CACHE_DIR / "jobs")))  # uploaded inputs awaiting processing
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+JOB_HEARTBEAT_INTERVAL = 15  # seconds
+JOB_STALE_AFTER = 60  # seconds without a heartbeat before another process takes over
+JOB_RETENTION = 24 * 60 * 60  # finished jobs are kept this long
+
+_local = threading.local()
+_owned = set()  # job ids this process is queued on or running
+_owned_lock = threading.Lock()
+_runners = {}
+_executor = None
+_maintenance_thread = None
+
+
+def _connect() -> sqlite3.Connection:
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        JOBS_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(JOBS_DB_PATH), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stage TEXT,
+                progress_done INTEGER NOT NULL DEFAULT 0,
+                progress_total INTEGER NOT NULL DEFAULT 0,
+                partial_text TEXT,
+                params TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                heartbeat_at REAL NOT NULL
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status_heartbeat ON jobs (status, heartbeat_at)')
+        _local.conn = conn
+    return conn
+
+
+def _row_to_job(row) -> dict:
+    job = dict(row)
+    job['params'] = json.loads(job['params'])
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+
+def input_path(job_id: str, extension: str) -> Path:
+    """Where a job's uploaded input is stored."""
+    return JOBS_DIR / f"{job_id}{extension}"
+
+
+def create_job(kind: str, params: dict, input_file: str = None, extension: str = '') -> str:
+    """
+    Persist a new queued job and its input file.
+
+    Args:
+        kind: Runner name registered with start()
+        params: JSON-serializable parameters for the runner
+        input_file: Optional path of the uploaded file; it is moved into JOBS_DIR
+        extension: File extension for the stored input (e.g. '.pdf')
+
+    Returns:
+        The new job id
+    """
+    job_id = uuid.uuid4().hex
+    params = dict(params)
+
+    if input_file is not None:
+        JOBS_DIR.mkdir(parents=True, exist_ok=True)
+        path = input_path(job_id, extension)
+        shutil.move(input_file, path)
+        params['input_path'] = str(path)
+
+    now = time.time()
+    _connect().execute('''
+        INSERT INTO jobs (id, kind, status, stage, params, created_at, updated_at, heartbeat_at)
+        VALUES (?, ?, 'queued', 'queued', ?, ?, ?, ?)
+    ''', (job_id, kind, json.dumps(params, ensure_ascii=False), now, now, now))
+    return job_id
+
+
+def update_job(job_id: str, **fields):
+    """Update job columns (stage, progress_done, progress_total, partial_text, ...)."""
+    if 'result' in fields and fields['result'] is not None:
+        fields['result'] = json.dumps(fields['result'], ensure_ascii=False)
+    fields['updated_at'] = fields['heartbeat_at'] = time.time()
+    assignments = ', '.join(f"{column} = ?" for column in fields)
+    _connect().execute(
+        f'UPDATE jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id)
+    )
+
+
+def get_job(job_id: str):
+    """Return the job as a dict, or None if it does not exist."""
+    row = _connect().execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+    return _row_to_job(row) if row else None
+
+
+def _run(job_id: str):
+    job = get_job(job_id)
+    if job is None:
+        return
+
+    runner = _runners.get(job['kind'])
+    try:
+        if runner is None:
+            raise ValueError(f"No runner registered for job kind: {job['kind']}")
+
+        update_job(job_id, status='running')
+        result = runner(job)
+        update_job(job_id, status='done', stage='done', result=result)
+        print(f"✅ Job {job_id[:8]} done")
+    except Exception as e:
+        print(f"❌ Job {job_id[:8]} failed: {e}")
+        update_job(job_id, status='failed', stage='failed', error=str(e))
+    finally:
+        path = job['params'].get('input_path')
+        if path and os.path.exists(path):
+            os.remove(path)
+        with _owned_lock:
+            _owned.discard(job_id)
+
+
+def submit(job_id: str):
+    """Queue a job on this process's worker pool (see start())."""
+    if _executor is None:
+        raise RuntimeError("job_queue.start() has not been called in this process")
+    with _owned_lock:
+        _owned.add(job_id)
+    _executor.submit(_run, job_id)
+
+
+def _claim_stale_jobs():
+    """Take over unfinished jobs, of kinds this process can run, whose owning process stopped heartbeating."""
+    kinds = list(_runners)
+    if not kinds:
+        return
+    now = time.time()
+    conn = _connect()
+    placeholders = ','.join('?' * len(kinds))
+    stale = conn.execute(f'''
+        SELECT id FROM jobs
+        WHERE status IN ('queued', 'running') AND heartbeat_at < ? AND kind IN ({placeholders})
+    ''', (now - JOB_STALE_AFTER, *kinds)).fetchall()
+
+    for row in stale:
+        claimed = conn.execute('''
+            UPDATE jobs SET status = 'queued', heartbeat_at = ?, updated_at = ?
+            WHERE id = ? AND heartbeat_at < ?
+        ''', (now, now, row['id'], now - JOB_STALE_AFTER)).rowcount
+        if claimed:
+            print(f"🔁 Resuming job {row['id'][:8]}")
+            submit(row['id'])
+
+
+def _maintenance_loop():
+    while True:
+        try:
+            with _owned_lock:
+                owned = list(_owned)
+            if owned:
+                placeholders = ','.join('?' * len(owned))
+                _connect().execute(
+                    f'UPDATE jobs SET heartbeat_at = ? WHERE id IN ({placeholders})',
+                    (time.time(), *owned)
+                )
+            _claim_stale_jobs()
+            _connect().execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (time.time() - JOB_RETENTION,)
+            )
+        except sqlite3.Error as e:
+            print(f"⚠️ Job maintenance error: {e}")
+        time.sleep(JOB_HEARTBEAT_INTERVAL)
+
+
+def start(runners: dict):
+    """
+    Register runners and start this process's worker pool and heartbeat
+    thread. Calling it again only adds runners.
+
+    Args:
+        runners: Mapping of job kind -> callable(job) returning the JSON result
+    """
+    _runners.update(runners)
+    _start_threads()
+
+
+def _start_threads():
+    global _executor, _maintenance_thread
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+    if _maintenance_thread is None:
+        _maintenance_thread = threading.Thread(target=_maintenance_loop, name='job-maintenance', daemon=True)
+        _maintenance_thread.start()
+
+
+def _after_fork_in_child():
+    """Threads and connections do not survive a fork; start this process's own."""
+    global _local, _owned_lock, _executor, _maintenance_thread
+    _local = threading.local()
+    _owned_lock = threading.Lock()
+    _owned.clear()
+    started = _executor is not None
+    _executor = None
+    _maintenance_thread = None
+    if started:
+        _start_threads()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,28 @@
+"""
+One-shot migration of the legacy JSON cache directory into the SQLite cache.
+
+Usage:
+    python migrate_cache.py [source_dir] [--db path/to/cache.sqlite3]
+"""
+import argparse
+from pathlib import Path
+
+import cache_manager
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import <key>.json cache files into SQLite')
+    parser.add_argument('source_dir', nargs='?', default=str(cache_manager.CACHE_DIR),
+                        help='Directory containing <key>.json cache files')
+    parser.add_argument('--db', default=str(cache_manager.CACHE_DB_PATH),
+                        help='SQLite database to import into')
+    args = parser.parse_args()
+
+    backend = cache_manager.SqliteBackend(Path(args.db))
+    print(f"🔄 Migrating {args.source_dir} → {args.db}")
+    result = cache_manager.migrate_json_cache(Path(args.source_dir), backend)
+    print(f"✅ Imported {result['imported']} entries ({result['skipped']} expired/corrupted skipped)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,318 @@
+"""
+Office Converter Module
+Converts office documents (PPTX) to PDF with LibreOffice.
+
+A warm pool of long-lived headless LibreOffice instances is kept running
+behind unoserver (https://github.com/unoconv/unoserver), and conversions are
+sent to them over a local XML-RPC socket, so small decks do not pay the
+LibreOffice cold start. Each instance has a concurrency limit, is health
+checked in the background and is restarted when it dies or stops answering.
+An instance that fails is taken out of rotation at once; until the background
+health check has it answering again, conversions skip it, and when no
+instance is available they go straight to the cold path below.
+
+When unoserver is not installed, conversions fall back to a one-shot
+`soffice --headless --convert-to pdf` process.
+"""
+import atexit
+import glob
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+import xmlrpc.client
+from pathlib import Path
+
+OFFICE_POOL_SIZE = int(os.getenv('OFFICE_POOL_SIZE', 2))
+OFFICE_INSTANCE_CONCURRENCY = int(os.getenv('OFFICE_INSTANCE_CONCURRENCY', 1))
+OFFICE_BASE_PORT = int(os.getenv('OFFICE_BASE_PORT', 0))  # 0: any free ports (one pool per worker process)
+OFFICE_CONVERT_TIMEOUT = 120  # seconds per conversion
+OFFICE_STARTUP_TIMEOUT = 60  # seconds for a new instance to accept connections
+OFFICE_HEALTH_INTERVAL = 30  # seconds between background health checks
+
+SOFFICE_CANDIDATES = [
+    # Windows
+    r'C:\Program Files\LibreOffice\program\soffice.exe',
+    r'C:\Program Files (x86)\LibreOffice\program\soffice.exe',
+    # Linux
+    '/usr/bin/soffice',
+    '/usr/lib/libreoffice/program/soffice',
+    '/usr/lib64/libreoffice/program/soffice',
+    '/opt/libreoffice*/program/soffice',
+    '/snap/bin/libreoffice',
+    # macOS
+    '/Applications/LibreOffice.app/Contents/MacOS/soffice',
+]
+
+
+def _free_port() -> int:
+    """A TCP port on 127.0.0.1 that is free right now."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def find_soffice():
+    """Locate the LibreOffice executable (LIBREOFFICE_PATH, known install paths, then PATH)."""
+    configured = os.getenv('LIBREOFFICE_PATH')
+    if configured and os.path.exists(configured):
+        return configured
+
+    for pattern in SOFFICE_CANDIDATES:
+        for path in sorted(glob.glob(pattern), reverse=True):
+            if os.path.exists(path):
+                return path
+
+    return shutil.which('soffice') or shutil.which('libreoffice')
+
+
+class _TimeoutTransport(xmlrpc.client.Transport):
+    """XML-RPC transport with a socket timeout."""
+
+    def __init__(self, timeout: float):
+        super().__init__()
+        self.timeout = timeout
+
+    def make_connection(self, host):
+        connection = super().make_connection(host)
+        connection.timeout = self.timeout
+        return connection
+
+
+class OfficeInstance:
+    """One unoserver process wrapping a headless LibreOffice."""
+
+    def __init__(self, index: int, soffice: str):
+        self.index = index
+        self.soffice = soffice
+        self.port = None
+        self.uno_port = None
+        if OFFICE_BASE_PORT:
+            self.port = OFFICE_BASE_PORT + index * 2
+            self.uno_port = self.port + 1
+        # Profiles are per process: LibreOffice locks its user installation
+        self.profile_dir = os.path.join(tempfile.gettempdir(), f"gengen_lo_profile_{os.getpid()}_{index}")
+        self.slots = threading.Semaphore(OFFICE_INSTANCE_CONCURRENCY)
+        self.process = None
+        self.lock = threading.Lock()
+        self.available = False  # in rotation; set by start/health checks, cleared on failure
+
+    def _proxy(self, timeout: float):
+        return xmlrpc.client.ServerProxy(
+            f"http://127.0.0.1:{self.port}",
+            transport=_TimeoutTransport(timeout),
+            allow_none=True
+        )
+
+    def start(self):
+        """Launch the instance and wait until it accepts connections."""
+        self.stop()
+        if not OFFICE_BASE_PORT:
+            self.port = _free_port()
+            self.uno_port = _free_port()
+        self.process = subprocess.Popen([
+            shutil.which('unoserver'),
+            '--interface', '127.0.0.1',
+            '--port', str(self.port),
+            '--uno-port', str(self.uno_port),
+            '--executable', self.soffice,
+            '--user-installation', Path(self.profile_dir).as_uri(),
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        deadline = time.time() + OFFICE_STARTUP_TIMEOUT
+        while time.time() < deadline:
+            if self.healthy():
+                print(f"✅ LibreOffice instance {self.index} ready on port {self.port}")
+                self.available = True
+                return True
+            time.sleep(0.5)
+
+        print(f"❌ LibreOffice instance {self.index} did not start")
+        self.stop()
+        return False
+
+    def stop(self):
+        self.available = False
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+        self.process = None
+
+    def healthy(self) -> bool:
+        """True if the process is alive and its XML-RPC socket answers."""
+        if self.process is None or self.process.poll() is not None:
+            return False
+        try:
+            with socket.create_connection(('127.0.0.1', self.port), timeout=2):
+                pass
+            self._proxy(5).system.listMethods()
+            return True
+        except (OSError, xmlrpc.client.Error):
+            return False
+
+    def ensure_running(self) -> bool:
+        with self.lock:
+            if self.healthy():
+                self.available = True
+                return True
+            self.available = False
+            print(f"🔄 (Re)starting LibreOffice instance {self.index}...")
+            return self.start()
+
+    def mark_failed(self, error):
+        """Take the instance out of rotation until a health check passes."""
+        self.available = False
+        print(f"⚠️ LibreOffice instance {self.index} failed ({error}); "
+              f"skipping it until the health check restarts it")
+
+    def convert(self, input_path: str, output_path: str):
+        """Convert input_path to PDF at output_path through this instance."""
+        self._proxy(OFFICE_CONVERT_TIMEOUT).convert(input_path, None, output_path, 'pdf')
+
+
+class OfficePool:
+    """Warm pool of OfficeInstances with per-instance concurrency limits."""
+
+    def __init__(self, soffice: str, size: int):
+        self.instances = [OfficeInstance(i, soffice) for i in range(size)]
+        self._next = 0
+        self._lock = threading.Lock()
+        self._health_thread = None
+
+    def start(self):
+        for instance in self.instances:
+            instance.ensure_running()
+        if self._health_thread is None:
+            self._health_thread = threading.Thread(target=self._health_loop, name='office-health', daemon=True)
+            self._health_thread.start()
+
+    def stop(self):
+        for instance in self.instances:
+            instance.stop()
+            shutil.rmtree(instance.profile_dir, ignore_errors=True)
+
+    def _health_loop(self):
+        while True:
+            time.sleep(OFFICE_HEALTH_INTERVAL)
+            for instance in self.instances:
+                try:
+                    instance.ensure_running()
+                except Exception as e:
+                    print(f"⚠️ LibreOffice health check error: {e}")
+
+    def _acquire(self, timeout: float):
+        """Wait for a free slot on any available instance, starting round-robin. None if none is available."""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if not any(instance.available for instance in self.instances):
+                return None
+            with self._lock:
+                start = self._next
+                self._next = (self._next + 1) % len(self.instances)
+            for offset in range(len(self.instances)):
+                instance = self.instances[(start + offset) % len(self.instances)]
+                if instance.available and instance.slots.acquire(blocking=False):
+                    return instance
+            time.sleep(0.1)
+        return None
+
+    def convert(self, input_path: str, output_path: str) -> bool:
+        instance = self._acquire(OFFICE_CONVERT_TIMEOUT)
+        if instance is None:
+            print("❌ No LibreOffice instance available")
+            return False
+
+        try:
+            if instance.process is None or instance.process.poll() is not None:
+                instance.mark_failed('process exited')
+                return False
+            try:
+                instance.convert(input_path, output_path)
+            except (OSError, xmlrpc.client.Error) as e:
+                instance.mark_failed(e)
+                return False
+            return os.path.exists(output_path)
+        finally:
+            instance.slots.release()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the warm pool, starting it on first use. None if unoserver is unavailable."""
+    global _pool
+    if _pool is not None:
+        return _pool
+
+    with _pool_lock:
+        if _pool is None:
+            soffice = find_soffice()
+            if not soffice or not shutil.which('unoserver') or OFFICE_POOL_SIZE <= 0:
+                return None
+            pool = OfficePool(soffice, OFFICE_POOL_SIZE)
+            pool.start()
+            atexit.register(pool.stop)
+            _pool = pool
+    return _pool
+
+
+def _after_fork_in_child():
+    """A forked worker cannot manage its parent's LibreOffice processes; it starts its own pool."""
+    global _pool, _pool_lock
+    if _pool is not None:
+        atexit.unregister(_pool.stop)
+    _pool = None
+    _pool_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def _convert_cold(input_path: str, output_dir: str):
+    """One-shot soffice conversion. Returns the PDF path or None."""
+    soffice = find_soffice()
+    if not soffice:
+        print("❌ LibreOffice not found")
+        return None
+
+    print(f"🔄 Converting to PDF with LibreOffice ({soffice})...")
+    subprocess.run([
+        soffice, '--headless', '--convert-to', 'pdf',
+        '--outdir', output_dir, input_path
+    ], check=True, capture_output=True, timeout=OFFICE_CONVERT_TIMEOUT)
+
+    pdf_path = os.path.join(output_dir, os.path.splitext(os.path.basename(input_path))[0] + '.pdf')
+    return pdf_path if os.path.exists(pdf_path) else None
+
+
+def convert_to_pdf(input_path: str, output_dir: str):
+    """
+    Convert an office document to PDF.
+
+    Uses the warm LibreOffice pool when available, otherwise a cold soffice run.
+
+    Returns:
+        Path of the generated PDF, or None if conversion failed
+    """
+    pdf_path = os.path.join(output_dir, os.path.splitext(os.path.basename(input_path))[0] + '.pdf')
+
+    pool = get_pool()
+    if pool is not None:
+        print("🔄 Converting to PDF with warm LibreOffice pool...")
+        if pool.convert(os.path.abspath(input_path), os.path.abspath(pdf_path)):
+            return pdf_path
+
+    try:
+        return _convert_cold(input_path, output_dir)
+    except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired) as e:
+        print(f"❌ LibreOffice conversion failed: {e}")
+        return None
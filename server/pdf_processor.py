@@ -4,12 +4,25 @@ Converts PDF files to images and processes them with Gemini API for OCR.
 """
 import os
 import io
+import math
+import re
 import base64
+import shutil
+import subprocess
 import tempfile
-from pathlib import Path
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack, contextmanager
+
+import cache_manager
+import image_hash
+import office_converter
+import rate_limiter
+import single_flight
+import upstream
 
 try:
-    from pdf2image import convert_from_bytes
+    from pdf2image import convert_from_bytes, convert_from_path, pdfinfo_from_bytes, pdfinfo_from_path
     PDF2IMAGE_AVAILABLE = True
 except ImportError:
     PDF2IMAGE_AVAILABLE = False
@@ -22,9 +35,80 @@ except ImportError:
     GEMINI_AVAILABLE = False
     print("WARNING: google-generativeai not installed. Gemini API will not work.")
 
-from PIL import Image
+try:
+    from pypdf import PdfReader, PdfWriter
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
+    print("WARNING: pypdf not installed. Large PDFs will be OCRed in a single request.")
+
+from PIL import Image, ImageChops, ImageStat
+
+# Bump whenever extraction output changes, so cached document results are not reused
+PROCESSOR_VERSION = 4
+
+# PDF OCR parallelism: pages per Gemini request, concurrent requests
+PDF_PAGES_PER_RANGE = int(os.getenv('PDF_PAGES_PER_RANGE', 10))
+PDF_OCR_CONCURRENCY = int(os.getenv('PDF_OCR_CONCURRENCY', 4))
+
+# Slide OCR parallelism and per-image OCR deadline (seconds, across retries)
+PPTX_OCR_CONCURRENCY = int(os.getenv('PPTX_OCR_CONCURRENCY', 4))
+PPTX_IMAGE_SLIDE_COVERAGE = 0.5  # pictures covering this share of a slide → OCR the rendered slide
+PPTX_MIN_PICTURE_AREA = 0.05  # smaller pictures (logos, icons) are not sent to OCR
+GEMINI_OCR_TIMEOUT = float(os.getenv('GEMINI_OCR_TIMEOUT', 120))
+
+# Native text-layer fast path: pages passing these checks skip Gemini OCR
+PDF_TEXT_LAYER_ENABLED = os.getenv('PDF_TEXT_LAYER', '1') != '0'
+PDF_TEXT_MIN_CHARS = 80  # fewer characters than this → scanned page
+PDF_IMAGE_PAGE_MIN_CHARS = 400  # pages with images need at least this much text
+PDF_MATH_CHAR_RATIO = 0.03  # share of math/unmappable glyphs that forces OCR
+
+# Rasterization for image OCR. Gemini tiles images into 768px crops, so pages
+# are rendered (and downscaled) to at most OCR_IMAGE_MAX_SIDE pixels on the
+# long side rather than at a fixed DPI.
+OCR_IMAGE_MAX_SIDE = int(os.getenv('OCR_IMAGE_MAX_SIDE', 1536))
+OCR_MIN_DPI = 72
+OCR_MAX_DPI = 200
+OCR_GRAYSCALE_MAX_CHROMA = 12  # max mean colour deviation (0-255) treated as grayscale
+OCR_LOSSLESS_MAX_COLORS = 256  # images with few colours (text, diagrams) stay lossless
+OCR_FLAT_GRAY_LEVELS = 16  # grayscale images are flat when their most common levels...
+OCR_FLAT_GRAY_SHARE = 0.9  # ...cover this share of the pixels
+OCR_JPEG_QUALITY = 85
+
+# Duplicate pages/slides/pictures are OCRed once (see image_hash)
+PAGE_DEDUP_ENABLED = os.getenv('PAGE_DEDUP', '1') != '0'
+PAGE_HASH_DPI = 24  # thumbnail resolution for hashing PDF pages
+PAGE_HASH_BATCH = 20  # pages rasterized per pdf2image call while hashing
 
 
+def is_path(source) -> bool:
+    """True if a document source is a filesystem path rather than in-memory bytes."""
+    return isinstance(source, (str, os.PathLike))
+
+
+def open_source(source):
+    """Return something python-pptx/python-docx/pypdf can open: the path itself, or a BytesIO."""
+    return str(source) if is_path(source) else io.BytesIO(source)
+
+
+@contextmanager
+def source_path(source, suffix: str):
+    """
+    Yield a filesystem path for a document source.
+    Paths are used as-is; bytes are written to a temporary file for the duration.
+    """
+    if is_path(source):
+        yield str(source)
+        return
+    
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as temp_file:
+        temp_file.write(source)
+        temp_path = temp_file.name
+    try:
+        yield temp_path
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
 
 
 def check_dependencies():
@@ -37,23 +121,10 @@ def check_dependencies():
     return issues
 
 
-def pdf_to_images(pdf_bytes: bytes, dpi: int = 150) -> list:
-    """
-    Convert PDF bytes to a list of PIL Image objects.
-    
-    Args:
-        pdf_bytes: The PDF file as bytes
-        dpi: Resolution for conversion (default 150 for balance of quality/speed)
-    
-    Returns:
-        List of PIL Image objects, one per page
-    """
-    if not PDF2IMAGE_AVAILABLE:
-        raise ImportError("pdf2image is not installed. Please run: pip install pdf2image")
-    
-    # Try common Poppler installation paths on Windows
-    poppler_path = None
+def find_poppler_path():
+    """Return the Poppler bin directory on Windows, or None to use PATH."""
     if os.name == 'nt':  # Windows
+        # Try common Poppler installation paths on Windows
         possible_paths = [
             r"C:\poppler-25.12.0\Library\bin",
             r"C:\Program Files\poppler\Library\bin",
@@ -62,43 +133,259 @@ def pdf_to_images(pdf_bytes: bytes, dpi: int = 150) -> list:
         ]
         for path in possible_paths:
             if os.path.exists(path):
-                poppler_path = path
-                break
+                return path
+    return None
+
+
+def get_page_sizes(pdf_source) -> list:
+    """Return (width, height) in points for each page, or None if unavailable."""
+    if not PYPDF_AVAILABLE:
+        return None
+    try:
+        return [(float(page.mediabox.width), float(page.mediabox.height))
+                for page in PdfReader(open_source(pdf_source)).pages]
+    except Exception as e:
+        print(f"⚠️ pypdf could not read page sizes: {e}")
+        return None
+
+
+def choose_dpi(width_pt: float, height_pt: float, max_side: int = OCR_IMAGE_MAX_SIDE) -> int:
+    """Pick the DPI that renders a page's long side at max_side pixels, within OCR limits."""
+    long_side_inches = max(width_pt, height_pt) / 72
+    if long_side_inches <= 0:
+        return OCR_MAX_DPI
+    return int(max(OCR_MIN_DPI, min(OCR_MAX_DPI, max_side / long_side_inches)))
+
+
+def iter_pdf_pages(pdf_source, pages: list = None, dpi: int = None):
+    """
+    Rasterize a PDF one page at a time.
     
-    # Convert PDF to images
-    if poppler_path:
-        images = convert_from_bytes(pdf_bytes, dpi=dpi, poppler_path=poppler_path)
-    else:
-        images = convert_from_bytes(pdf_bytes, dpi=dpi)
-    return images
+    Only the page being yielded is held in memory. Without an explicit dpi,
+    each page's DPI is chosen from its size (see choose_dpi).
+    
+    Args:
+        pdf_source: Path to the PDF file, or its bytes
+        pages: Optional 1-based page numbers to render (default: all pages)
+        dpi: Fixed resolution for every page (default: adaptive)
+    
+    Yields:
+        Tuples of (page_number, PIL Image)
+    """
+    if not PDF2IMAGE_AVAILABLE:
+        raise ImportError("pdf2image is not installed. Please run: pip install pdf2image")
+    
+    poppler_path = find_poppler_path()
+    kwargs = {'poppler_path': poppler_path} if poppler_path else {}
+    convert = convert_from_path if is_path(pdf_source) else convert_from_bytes
+    
+    sizes = get_page_sizes(pdf_source) if dpi is None else None
+    if pages is None:
+        pages = range(1, (len(sizes) if sizes else get_pdf_page_count(pdf_source)) + 1)
+    
+    for page in pages:
+        if dpi is not None:
+            page_dpi = dpi
+        elif sizes and page <= len(sizes):
+            page_dpi = choose_dpi(*sizes[page - 1])
+        else:
+            page_dpi = 150
+        
+        images = convert(pdf_source, dpi=page_dpi, first_page=page, last_page=page, **kwargs)
+        if images:
+            yield page, images[0]
 
 
-def image_to_base64(image: Image.Image, format: str = "PNG") -> str:
-    """Convert PIL Image to base64 string."""
+def pdf_to_images(pdf_source, dpi: int = None, pages: list = None) -> list:
+    """
+    Convert a PDF to a list of PIL Image objects.
+    Prefer iter_pdf_pages, which keeps a single page in memory.
+    
+    Args:
+        pdf_source: Path to the PDF file, or its bytes
+        dpi: Resolution for conversion (default: adaptive per page)
+        pages: Optional 1-based page numbers to render (default: all pages)
+    
+    Returns:
+        List of PIL Image objects, one per (requested) page
+    """
+    return [image for _, image in iter_pdf_pages(pdf_source, pages=pages, dpi=dpi)]
+
+
+def _is_grayscale(image: Image.Image) -> bool:
+    """True if an RGB image carries no meaningful colour."""
+    sample = image.convert('RGB')
+    sample.thumbnail((128, 128))
+    r, g, b = sample.split()
+    chroma = ImageChops.lighter(ImageChops.difference(r, g), ImageChops.difference(g, b))
+    return ImageStat.Stat(chroma).mean[0] <= OCR_GRAYSCALE_MAX_CHROMA
+
+
+def _few_colors(image: Image.Image) -> bool:
+    """True for flat images (text, slides, diagrams) where lossy encoding would blur edges."""
+    if image.mode == 'L':
+        # Any grayscale image fits in 256 colours; flat ones are mostly paper
+        # and ink. Measured at full size, as downscaling blurs glyph edges.
+        levels = sorted(image.histogram(), reverse=True)
+        return sum(levels[:OCR_FLAT_GRAY_LEVELS]) >= OCR_FLAT_GRAY_SHARE * sum(levels)
+    sample = image.copy()
+    sample.thumbnail((256, 256))
+    return sample.getcolors(OCR_LOSSLESS_MAX_COLORS) is not None
+
+
+def prepare_ocr_image(image: Image.Image, max_side: int = OCR_IMAGE_MAX_SIDE) -> tuple:
+    """
+    Shrink and encode an image for OCR upload.
+    
+    The image is downscaled to max_side on its long side and converted to
+    grayscale when it has no colour. Flat images (text, diagrams) are
+    encoded as PNG; photographic ones, where JPEG artefacts do not hurt
+    legibility, as JPEG.
+    
+    Returns:
+        Tuple of (encoded bytes, mime type)
+    """
+    if image.mode in ('RGBA', 'LA', 'P'):
+        # Flatten transparency onto white, as it would appear on a slide
+        rgba = image.convert('RGBA')
+        image = Image.new('RGB', image.size, 'white')
+        image.paste(rgba, mask=rgba.getchannel('A'))
+    elif image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    
+    if max(image.size) > max_side:
+        image = image.copy()
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    
+    if image.mode == 'RGB' and _is_grayscale(image):
+        image = image.convert('L')
+    
+    buffer = io.BytesIO()
+    if _few_colors(image):
+        image.save(buffer, format='PNG', optimize=True)
+        return buffer.getvalue(), 'image/png'
+    image.save(buffer, format='JPEG', quality=OCR_JPEG_QUALITY, optimize=True)
+    return buffer.getvalue(), 'image/jpeg'
+
+
+def image_to_base64(image: Image.Image, format: str = None) -> str:
+    """
+    Convert PIL Image to base64 string.
+    Without an explicit format the image is prepared for OCR (see prepare_ocr_image).
+    """
+    if format is None:
+        data, _ = prepare_ocr_image(image)
+        return base64.b64encode(data).decode('utf-8')
     buffer = io.BytesIO()
     image.save(buffer, format=format)
     return base64.b64encode(buffer.getvalue()).decode('utf-8')
 
 
-def extract_text_with_gemini(image: Image.Image, api_key: str) -> dict:
+# ============ Gemini Session ============
+
+# Gemini model and generation settings shared by every OCR path
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.0-flash-lite')
+GEMINI_GENERATION_CONFIG = {}
+if os.getenv('GEMINI_TEMPERATURE'):
+    GEMINI_GENERATION_CONFIG['temperature'] = float(os.getenv('GEMINI_TEMPERATURE'))
+if os.getenv('GEMINI_MAX_OUTPUT_TOKENS'):
+    GEMINI_GENERATION_CONFIG['max_output_tokens'] = int(os.getenv('GEMINI_MAX_OUTPUT_TOKENS'))
+
+# Token estimates for rate_limiter: Gemini bills 258 tokens per 768px image
+# tile and per PDF page; replies are reserved at the output limit
+GEMINI_TILE_TOKENS = 258
+GEMINI_IMAGE_TOKENS = GEMINI_TILE_TOKENS * math.ceil(OCR_IMAGE_MAX_SIDE / 768) ** 2
+GEMINI_PAGE_TOKENS = 258
+GEMINI_OUTPUT_TOKENS = GEMINI_GENERATION_CONFIG.get('max_output_tokens', 8192)
+
+
+def estimate_gemini_tokens(contents: list, pages: int = 1) -> int:
+    """Token cost of a generate_content call: text, inline images, uploaded files (pages each) and the reply."""
+    tokens = GEMINI_OUTPUT_TOKENS
+    for part in contents:
+        if isinstance(part, str):
+            tokens += rate_limiter.estimate_tokens(part)
+        elif isinstance(part, dict):
+            tokens += GEMINI_IMAGE_TOKENS
+        else:
+            tokens += GEMINI_PAGE_TOKENS * pages
+    return tokens
+
+
+class GeminiSession:
     """
-    Extract text from an image using Gemini 1.5 Flash API.
+    Process-wide Gemini client: configured once, one model instance reused by
+    every thread so OCR calls share the underlying connection pool.
+    """
+
+    def __init__(self, api_key: str, model_name: str = GEMINI_MODEL,
+                 generation_config: dict = None):
+        genai.configure(api_key=api_key)
+        self.api_key = api_key
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(
+            model_name,
+            generation_config=generation_config or GEMINI_GENERATION_CONFIG or None
+        )
+
+    def generate(self, contents: list, timeout: float = None, endpoint: str = 'gemini.ocr_image',
+                 pages: int = 1) -> str:
+        """
+        Run generate_content and return the response text. The call is
+        admitted by rate_limiter (raises RateLimited when shed), then sent
+        through upstream.call; timeout overrides the endpoint's total deadline
+        (across retries). pages is the page count of an uploaded PDF.
+        """
+        ticket = rate_limiter.acquire(endpoint, estimate_gemini_tokens(contents, pages))
+        response = upstream.call(endpoint, lambda attempt_timeout: self.model.generate_content(
+            contents, request_options={'timeout': attempt_timeout}
+        ), timeout)
+        usage = getattr(response, 'usage_metadata', None)
+        rate_limiter.settle(ticket, getattr(usage, 'total_token_count', None))
+        return response.text
+
+    def upload_file(self, path: str, mime_type: str):
+        # The upload API takes no timeout; it still gets retries and the breaker
+        return upstream.call('gemini.upload', lambda _: genai.upload_file(path, mime_type=mime_type))
+
+    def delete_file(self, name: str):
+        genai.delete_file(name)
+
+
+_gemini_session = None
+_gemini_session_lock = threading.Lock()
+
+
+def get_gemini_session(api_key: str) -> GeminiSession:
+    """Return the shared Gemini session, creating it on first use (thread-safe)."""
+    global _gemini_session
+    if not GEMINI_AVAILABLE:
+        raise ImportError("google-generativeai is not installed")
+    
+    session = _gemini_session
+    if session is not None and session.api_key == api_key:
+        return session
+    
+    with _gemini_session_lock:
+        if _gemini_session is None or _gemini_session.api_key != api_key:
+            _gemini_session = GeminiSession(api_key)
+            print(f"✅ Gemini session ready ({_gemini_session.model_name})")
+        return _gemini_session
+
+
+def extract_text_with_gemini(image: Image.Image, api_key: str, timeout: float = None) -> dict:
+    """
+    Extract text from an image with the configured Gemini model (GEMINI_MODEL).
     
     Args:
         image: PIL Image object
         api_key: Gemini API key
+        timeout: Optional deadline in seconds, across retries (see upstream)
     
     Returns:
         Dictionary with extracted text and metadata
     """
-    if not GEMINI_AVAILABLE:
-        raise ImportError("google-generativeai is not installed")
-    
-    # Configure Gemini
-    genai.configure(api_key=api_key)
-    
-    # Use Gemini 1.5 Flash model
-    model = genai.GenerativeModel('gemini-2.0-flash-lite')
+    session = get_gemini_session(api_key)
     
     # Prepare the prompt
     prompt = """이 이미지의 내용을 다음 규칙에 따라 추출하고 정리해주세요:
@@ -119,57 +406,50 @@ def extract_text_with_gemini(image: Image.Image, api_key: str) -> dict:
 - 수식은 반드시 LaTeX 형식 사용
 - 핵심 내용은 굵은 글씨로 강조"""
 
-    # Generate content
-    response = model.generate_content([prompt, image])
+    # Downscaled, compactly encoded image instead of a full-size PIL upload
+    data, mime_type = prepare_ocr_image(image)
+    text = session.generate([prompt, {'mime_type': mime_type, 'data': data}], timeout=timeout)
     
     return {
-        'text': response.text,
+        'text': text,
         'success': True
     }
 
 
-def process_pdf(pdf_bytes: bytes, api_key: str) -> dict:
+def ocr_image_cached(image: Image.Image, api_key: str, fingerprint: str) -> tuple:
     """
-    Process a PDF file by uploading directly to Gemini API.
-    No image conversion - much faster!
+    OCR an image once per fingerprint. Results are cached across documents
+    and concurrent identical requests are coalesced.
     
     Args:
-        pdf_bytes: The PDF file as bytes
+        image: PIL Image object
         api_key: Gemini API key
+        fingerprint: Content fingerprint (see image_hash)
     
     Returns:
-        Dictionary with extracted text and metadata
+        Tuple of (text, reused) where reused is True if no Gemini call was made
     """
-    if not GEMINI_AVAILABLE:
-        return {
-            'success': False,
-            'error': 'google-generativeai is not installed',
-            'text': ''
-        }
+    cache_key = cache_manager.generate_cache_key('ocr-image', fingerprint, GEMINI_MODEL, PROCESSOR_VERSION)
+    cached = cache_manager.get_cached(cache_key)
+    if cached is not None:
+        return cached, True
+    
+    def compute():
+        result = extract_text_with_gemini(image, api_key, timeout=GEMINI_OCR_TIMEOUT)
+        if not result['success']:
+            raise RuntimeError("텍스트 추출 실패")
+        return result['text']
     
     try:
-        import tempfile
-        import os
-        
-        # Configure Gemini
-        genai.configure(api_key=api_key)
-        
-        # Save PDF to temporary file (required for upload)
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_file:
-            temp_file.write(pdf_bytes)
-            temp_path = temp_file.name
-        
-        try:
-            # Upload PDF directly to Gemini
-            print("📤 Uploading PDF to Gemini...")
-            uploaded_file = genai.upload_file(temp_path, mime_type="application/pdf")
-            print(f"✅ Uploaded: {uploaded_file.name}")
-            
-            # Use Gemini 2.0 Flash model
-            model = genai.GenerativeModel('gemini-2.0-flash-lite')
-            
-            # Prepare the prompt
-            prompt = """이 PDF 문서의 모든 내용을 다음 규칙에 따라 추출하고 정리해주세요:
+        return single_flight.run(cache_key, compute)
+    except upstream.UpstreamError:
+        stale = cache_manager.get_stale(cache_key)
+        if stale is None:
+            raise
+        return stale, True
+
+
+PDF_OCR_PROMPT = """이 PDF 문서의 모든 내용을 다음 규칙에 따라 추출하고 정리해주세요:
 
 1. 모든 텍스트를 정확하게 추출합니다.
 2. 수학 수식은 LaTeX 문법으로 변환합니다:
@@ -195,28 +475,439 @@ def process_pdf(pdf_bytes: bytes, api_key: str) -> dict:
 - 중요한 내용은 반드시 굵은 글씨로 강조
 - 표 대신 불릿 포인트 사용"""
 
-            # Generate content with PDF
-            print("🧠 Processing PDF with Gemini...")
-            response = model.generate_content([prompt, uploaded_file])
+# Appended for multi-page uploads, so the text can be split (and cached) per page
+PDF_PAGE_MARKER_PROMPT = """
+
+페이지 구분: 각 페이지의 내용 앞에 그 페이지의 번호(이 파일 기준 1부터)를 <<<PAGE 1>>>, <<<PAGE 2>>> 처럼 한 줄로 표시하고, 각 페이지의 내용은 해당 표시 아래에만 적어주세요."""
+PAGE_MARKER = re.compile(r'^[ \t]*<<<PAGE (\d+)>>>[ \t]*$', re.MULTILINE)
+
+
+def get_pdf_page_count(pdf_source) -> int:
+    """Return the number of pages in a PDF (path or bytes), or 0 if it cannot be determined."""
+    if PYPDF_AVAILABLE:
+        try:
+            return len(PdfReader(open_source(pdf_source)).pages)
+        except Exception as e:
+            print(f"⚠️ pypdf could not read page count: {e}")
+    
+    if PDF2IMAGE_AVAILABLE:
+        try:
+            poppler_path = find_poppler_path()
+            pdfinfo = pdfinfo_from_path if is_path(pdf_source) else pdfinfo_from_bytes
+            if poppler_path:
+                info = pdfinfo(pdf_source, poppler_path=poppler_path)
+            else:
+                info = pdfinfo(pdf_source)
+            return int(info.get('Pages', 0))
+        except Exception as e:
+            print(f"⚠️ pdfinfo could not read page count: {e}")
+    
+    return 0
+
+
+def split_pdf_ranges(pdf_source, pages_per_range: int, pages: list = None, single_pages=()) -> list:
+    """
+    Split a PDF into page ranges of at most pages_per_range consecutive pages.
+    
+    Args:
+        pdf_source: Path to the PDF file, or its bytes
+        pages_per_range: Maximum pages per range
+        pages: Optional 1-based page numbers to include (default: all pages)
+        single_pages: Page numbers that get a range of their own, so their
+            OCR text is known page by page
+    
+    Returns:
+        List of (first_page, last_page, range_pdf_bytes), 1-based and inclusive
+    """
+    reader = PdfReader(open_source(pdf_source))
+    if pages is None:
+        pages = range(1, len(reader.pages) + 1)
+    
+    # Group into runs of consecutive pages, capped at pages_per_range
+    groups = []
+    for page_number in pages:
+        if (groups and page_number == groups[-1][-1] + 1 and len(groups[-1]) < pages_per_range
+                and page_number not in single_pages and groups[-1][-1] not in single_pages):
+            groups[-1].append(page_number)
+        else:
+            groups.append([page_number])
+    
+    ranges = []
+    for group in groups:
+        writer = PdfWriter()
+        for page_number in group:
+            writer.add_page(reader.pages[page_number - 1])
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        ranges.append((group[0], group[-1], buffer.getvalue()))
+    
+    return ranges
+
+
+# ============ Native Text Layer ============
+
+_MATH_CHARS = set('∑∫∂√∞≤≥≠≈±×÷∈∉⊂⊆∪∩∀∃∇αβγδεθλμπσφωΔΣΩ^_')
+
+
+def find_pdftotext():
+    """Return the pdftotext executable from Poppler, or None if not installed."""
+    poppler_path = find_poppler_path()
+    if poppler_path:
+        candidate = os.path.join(poppler_path, 'pdftotext.exe')
+        if os.path.exists(candidate):
+            return candidate
+    return shutil.which('pdftotext')
+
+
+def extract_text_layer(pdf_source) -> list:
+    """
+    Extract the embedded text layer of each page without OCR.
+    Uses Poppler's pdftotext, falling back to pypdf.
+    
+    Returns:
+        List of page texts (one per page), or None if no extractor is available
+    """
+    pdftotext = find_pdftotext()
+    if pdftotext:
+        try:
+            with source_path(pdf_source, '.pdf') as path:
+                completed = subprocess.run(
+                    [pdftotext, '-enc', 'UTF-8', path, '-'],
+                    check=True, capture_output=True, timeout=60
+                )
+            # pdftotext ends every page with a form feed
+            pages = completed.stdout.decode('utf-8', errors='replace').split('\f')
+            if pages and not pages[-1].strip():
+                pages.pop()
+            return pages
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError) as e:
+            print(f"⚠️ pdftotext failed: {e}")
+    
+    if PYPDF_AVAILABLE:
+        try:
+            reader = PdfReader(open_source(pdf_source))
+            return [page.extract_text() or '' for page in reader.pages]
+        except Exception as e:
+            print(f"⚠️ pypdf text extraction failed: {e}")
+    
+    return None
+
+
+def get_page_image_counts(pdf_source) -> list:
+    """Count image XObjects per page without decoding them. Returns None if unavailable."""
+    if not PYPDF_AVAILABLE:
+        return None
+    try:
+        counts = []
+        for page in PdfReader(open_source(pdf_source)).pages:
+            resources = page.get('/Resources') or {}
+            xobjects = resources.get_object().get('/XObject') if resources else None
+            xobjects = xobjects.get_object() if xobjects else {}
+            counts.append(sum(
+                1 for ref in xobjects.values()
+                if ref.get_object().get('/Subtype') == '/Image'
+            ))
+        return counts
+    except Exception as e:
+        print(f"⚠️ Could not inspect page images: {e}")
+        return None
+
+
+def _looks_mathematical(text: str) -> bool:
+    """True if the text layer is likely a mangled equation-heavy page."""
+    suspicious = sum(
+        1 for ch in text
+        if ch in _MATH_CHARS or ch == '\ufffd' or '\ue000' <= ch <= '\uf8ff'
+    )
+    return suspicious >= 10 and suspicious / len(text) > PDF_MATH_CHAR_RATIO
+
+
+def classify_page(text: str, image_count: int = 0) -> str:
+    """
+    Decide how a page should be extracted.
+    
+    Returns:
+        'text' to use the embedded text layer, or 'ocr' for Gemini when the
+        page is scanned (little or no text), image-heavy, or full of equations
+    """
+    stripped = text.strip()
+    if len(stripped) < PDF_TEXT_MIN_CHARS:
+        return 'ocr'
+    if image_count and len(stripped) < PDF_IMAGE_PAGE_MIN_CHARS:
+        return 'ocr'
+    if _looks_mathematical(stripped):
+        return 'ocr'
+    return 'text'
+
+
+def ocr_pdf_with_gemini(pdf_source, session: GeminiSession, pages: int = 1) -> str:
+    """Upload a PDF (or a page range of one, `pages` long; path or bytes) to Gemini and return the extracted text."""
+    # Upload needs a file on disk; bytes go to a temporary file
+    with source_path(pdf_source, '.pdf') as path:
+        uploaded_file = session.upload_file(path, mime_type="application/pdf")
+    
+    prompt = PDF_OCR_PROMPT + PDF_PAGE_MARKER_PROMPT if pages > 1 else PDF_OCR_PROMPT
+    try:
+        return session.generate([prompt, uploaded_file], endpoint='gemini.ocr_pdf', pages=pages)
+    finally:
+        # Delete the uploaded file from Gemini
+        try:
+            session.delete_file(uploaded_file.name)
+        except Exception:
+            pass
+
+
+def split_page_text(text: str, pages: int):
+    """
+    Split the OCR text of a `pages` long upload on its page markers.
+    
+    Returns:
+        List of per-page texts, or None if the markers are missing or out of order
+    """
+    if pages == 1:
+        return [PAGE_MARKER.sub('', text).strip()]
+    parts = PAGE_MARKER.split(text)
+    if parts[0].strip() or [int(n) for n in parts[1::2]] != list(range(1, pages + 1)):
+        return None
+    return [part.strip() for part in parts[2::2]]
+
+
+def _page_ocr_cache_key(fingerprint: str) -> str:
+    """Cache key for the OCR text of a PDF page, shared by every document containing it."""
+    return cache_manager.generate_cache_key('ocr-page', fingerprint, GEMINI_MODEL, PROCESSOR_VERSION)
+
+
+def _ocr_pdf_range(page_range: tuple, session: GeminiSession) -> str:
+    """OCR one page range. Transient failures are retried by upstream.call; other errors are raised."""
+    first_page, last_page, range_pdf = page_range
+    text = ocr_pdf_with_gemini(range_pdf, session, last_page - first_page + 1)
+    print(f"✅ Pages {first_page}-{last_page} processed")
+    return text
+
+
+def _report_progress(progress, done: int, total: int, segments: dict):
+    """Send (done, total, text so far in page order) to an optional progress callback."""
+    if progress:
+        progress(done, total, '\n\n'.join(segments[n] for n in sorted(segments) if segments[n]))
+
+
+def hash_pdf_pages(pdf_source, pages: list) -> dict:
+    """
+    Perceptual hashes of PDF pages, rendered as small grayscale thumbnails in batches.
+    
+    Returns:
+        Dictionary of page number -> dHash (empty if rendering is unavailable)
+    """
+    if not PDF2IMAGE_AVAILABLE or not pages:
+        return {}
+    
+    poppler_path = find_poppler_path()
+    kwargs = {'poppler_path': poppler_path} if poppler_path else {}
+    convert = convert_from_path if is_path(pdf_source) else convert_from_bytes
+    wanted = set(pages)
+    hashes = {}
+    
+    try:
+        ordered = sorted(wanted)
+        i = 0
+        while i < len(ordered):
+            first_page = ordered[i]
+            last_page = min(first_page + PAGE_HASH_BATCH - 1, ordered[-1])
+            thumbnails = convert(pdf_source, dpi=PAGE_HASH_DPI, grayscale=True,
+                                 first_page=first_page, last_page=last_page, **kwargs)
+            for page, thumbnail in enumerate(thumbnails, first_page):
+                if page in wanted:
+                    hashes[page] = image_hash.dhash(thumbnail)
+            while i < len(ordered) and ordered[i] <= last_page:
+                i += 1
+    except Exception as e:
+        print(f"⚠️ Page hashing failed, skipping duplicate detection: {e}")
+        return {}
+    
+    return hashes
+
+
+def pdf_page_fingerprints(pdf_source, pages: list, page_texts: list = None) -> dict:
+    """
+    Content fingerprints of PDF pages (text layer hash and dHash, see image_hash).
+    Near-identical pages of the document share the fingerprint of the first one.
+    
+    Returns:
+        Dictionary of page number -> (fingerprint, first page with that
+        fingerprint); pages that could not be rendered are absent
+    """
+    hashes = hash_pdf_pages(pdf_source, pages)
+    index = image_hash.DuplicateIndex()
+    first_pages = {}
+    fingerprints = {}
+    
+    for page in pages:
+        if page not in hashes:
+            continue
+        text = page_texts[page - 1] if page_texts else ''
+        fingerprint, _ = index.canonical(image_hash.text_hash(text), hashes[page])
+        first_pages.setdefault(fingerprint, page)
+        fingerprints[page] = (fingerprint, first_pages[fingerprint])
+    
+    return fingerprints
+
+
+def find_duplicate_pages(pdf_source, pages: list, page_texts: list = None) -> dict:
+    """
+    Find pages that repeat an earlier page (same text layer, near-identical image).
+    
+    Returns:
+        Dictionary of duplicate page number -> first page with that content
+    """
+    return {page: first for page, (_, first) in pdf_page_fingerprints(pdf_source, pages, page_texts).items()
+            if first != page}
+
+
+def process_pdf(pdf_source, api_key: str, progress=None) -> dict:
+    """
+    Process a PDF file, page by page.
+    
+    Pages with a usable embedded text layer are extracted locally. Scanned,
+    image-heavy and equation-heavy pages are uploaded to Gemini as page ranges
+    that are OCRed concurrently; each range is retried independently (by
+    upstream.call). OCR text is cached per page by content fingerprint, so a
+    page OCRed before, in this or an earlier upload, is not OCRed again.
+    Pages repeating an earlier page of the document get that page's OCR text,
+    which is OCRed as a range of its own for this.
+    
+    Args:
+        pdf_source: Path to the PDF file, or its bytes
+        api_key: Gemini API key
+        progress: Optional callback(pages_done, page_total, partial_text)
+    
+    Returns:
+        Dictionary with extracted text, page count and the per-page method
+        ('text', 'ocr', 'cached' or 'duplicate' with 'same_as') in 'pages'
+    """
+    try:
+        page_count = get_pdf_page_count(pdf_source)
+        
+        # Classify pages: embedded text layer vs. Gemini OCR
+        page_texts = extract_text_layer(pdf_source) if PDF_TEXT_LAYER_ENABLED and page_count else None
+        if page_texts and len(page_texts) == page_count:
+            image_counts = get_page_image_counts(pdf_source) or [0] * page_count
+            methods = [classify_page(text, images) for text, images in zip(page_texts, image_counts)]
+        else:
+            methods = ['ocr'] * max(page_count, 1)
+        
+        ocr_pages = [n for n, method in enumerate(methods, 1) if method == 'ocr']
+        
+        # Without pypdf a subset of pages cannot be split out, so OCR everything
+        if ocr_pages and not PYPDF_AVAILABLE:
+            methods = ['ocr'] * len(methods)
+            ocr_pages = list(range(1, len(methods) + 1))
+        
+        fingerprints = {}
+        if PAGE_DEDUP_ENABLED and PYPDF_AVAILABLE and ocr_pages:
+            known_texts = page_texts if page_texts and len(page_texts) == len(methods) else None
+            fingerprints = pdf_page_fingerprints(pdf_source, ocr_pages, known_texts)
+        duplicates = {n: first for n, (_, first) in fingerprints.items() if first != n}
+        for n in duplicates:
+            methods[n - 1] = 'duplicate'
+        
+        # first page -> extracted text, assembled in page order at the end
+        segments = {}
+        for n, method in enumerate(methods, 1):
+            if method == 'text':
+                segments[n] = page_texts[n - 1].strip()
+        
+        # Pages OCRed before, in this or another document
+        for n in ocr_pages:
+            if n in fingerprints and n not in duplicates:
+                cached = cache_manager.get_cached(_page_ocr_cache_key(fingerprints[n][0]))
+                if cached is not None:
+                    methods[n - 1] = 'cached'
+                    segments[n] = cached
+        ocr_pages = [n for n in ocr_pages if methods[n - 1] == 'ocr']
+        
+        print(f"📑 {page_count} pages: {methods.count('text')} text layer, {len(ocr_pages)} OCR, "
+              f"{methods.count('cached')} cached, {len(duplicates)} duplicate")
+        
+        # first page -> later pages with the same content, copied once it is OCRed
+        copies = {}
+        for n, first in duplicates.items():
+            if first in segments:
+                segments[n] = segments[first]
+            else:
+                copies.setdefault(first, []).append(n)
+        
+        if ocr_pages:
+            if not GEMINI_AVAILABLE:
+                return {
+                    'success': False,
+                    'error': 'google-generativeai is not installed',
+                    'text': ''
+                }
             
-            # Delete the uploaded file from Gemini
-            try:
-                genai.delete_file(uploaded_file.name)
-            except:
-                pass
+            session = get_gemini_session(api_key)
             
-            print("✅ PDF processed successfully")
+            # Without pypdf the document cannot be split; it goes up as one upload
+            if not PYPDF_AVAILABLE or (len(ocr_pages) == len(methods) and len(methods) <= PDF_PAGES_PER_RANGE):
+                ranges = [(1, len(methods), pdf_source)]
+            else:
+                ranges = split_pdf_ranges(pdf_source, PDF_PAGES_PER_RANGE, ocr_pages, copies)
+            print(f"🧠 Processing {len(ocr_pages)} pages with Gemini in {len(ranges)} ranges...")
             
-            return {
-                'success': True,
-                'text': response.text,
-                'page_count': 0  # Page count not available with direct upload
-            }
+            def ocr_range(page_range):
+                try:
+                    return _ocr_pdf_range(page_range, session)
+                except Exception as e:
+                    print(f"❌ Pages {page_range[0]}-{page_range[1]} failed: {e}")
+                    return None
+            
+            known_pages = len(segments)
+            pages_done = known_pages
+            _report_progress(progress, pages_done, len(methods), segments)
+            
+            results = []
+            with ThreadPoolExecutor(max_workers=min(PDF_OCR_CONCURRENCY, len(ranges))) as pool:
+                futures = {pool.submit(ocr_range, page_range): page_range for page_range in ranges}
+                for future in as_completed(futures):
+                    first_page, last_page, _ = futures[future]
+                    text = future.result()
+                    results.append(text)
+                    page_results = split_page_text(text, last_page - first_page + 1) if text is not None else None
+                    if page_results is not None:
+                        for n, page_text in enumerate(page_results, first_page):
+                            segments[n] = page_text
+                            if n in fingerprints:
+                                cache_manager.set_cache(_page_ocr_cache_key(fingerprints[n][0]), page_text)
+                    elif text is None:
+                        segments[first_page] = f"[오류: {first_page}-{last_page}페이지 텍스트 추출 실패]"
+                    else:
+                        segments[first_page] = PAGE_MARKER.sub('', text).strip()
+                    for n in copies.get(first_page, ()):
+                        segments[n] = segments[first_page]
+                    pages_done += last_page - first_page + 1 + len(copies.get(first_page, ()))
+                    _report_progress(progress, pages_done, len(methods), segments)
             
-        finally:
-            # Clean up temp file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
+            if all(text is None for text in results) and not known_pages:
+                return {
+                    'success': False,
+                    'error': 'Gemini OCR failed for every page range',
+                    'text': ''
+                }
+        else:
+            results = []
+        
+        print("✅ PDF processed successfully")
+        
+        return {
+            'success': True,
+            'partial': any(text is None for text in results),
+            'text': '\n\n'.join(segments[n] for n in sorted(segments) if segments[n]),
+            'page_count': page_count,
+            'pages': [
+                {'page': n, 'method': method, 'same_as': duplicates[n]} if n in duplicates
+                else {'page': n, 'method': method}
+                for n, method in enumerate(methods, 1)
+            ] if page_count else []
+        }
         
     except Exception as e:
         print(f"❌ PDF processing error: {e}")
@@ -231,99 +922,173 @@ def process_pdf(pdf_bytes: bytes, api_key: str) -> dict:
 
 try:
     from pptx import Presentation
-    from pptx.util import Inches
+    from pptx.enum.shapes import MSO_SHAPE_TYPE
     PPTX_AVAILABLE = True
 except ImportError:
     PPTX_AVAILABLE = False
     print("WARNING: python-pptx not installed. PPTX processing will not work.")
 
 
-def pptx_to_images(pptx_bytes: bytes, dpi: int = 150) -> list:
+@contextmanager
+def pptx_as_pdf(pptx_source):
+    """
+    Convert a PPTX to PDF with LibreOffice for the duration of the block.
+    
+    Yields:
+        Path of the temporary PDF, or None if conversion failed
+    """
+    with source_path(pptx_source, '.pptx') as pptx_path, tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = office_converter.convert_to_pdf(pptx_path, tmp_dir)
+        if pdf_path:
+            print("✅ PPTX converted to PDF successfully")
+        else:
+            print("❌ PPTX to PDF conversion failed")
+        yield pdf_path
+
+
+def rendered_page_numbers(slides) -> dict:
+    """
+    Map slide numbers to pages of the deck's LibreOffice PDF export, which
+    leaves hidden slides out.
+    
+    Args:
+        slides: The presentation's slides (python-pptx), in order
+    
+    Returns:
+        Dictionary of 1-based slide number -> 1-based PDF page; hidden slides are absent
+    """
+    pages = {}
+    for slide_num, slide in enumerate(slides, 1):
+        if slide.element.get('show') in ('0', 'false'):
+            continue
+        pages[slide_num] = len(pages) + 1
+    return pages
+
+
+def pptx_to_images(pptx_source, dpi: int = None, slides: list = None) -> list:
     """
-    Convert PPTX slides to images using python-pptx and PIL.
+    Convert PPTX slides to images via LibreOffice (PPTX → PDF) and pdf2image.
     
     Args:
-        pptx_bytes: The PPTX file as bytes
-        dpi: Resolution for conversion
+        pptx_source: Path to the PPTX file, or its bytes
+        dpi: Resolution for conversion (default: adaptive per slide)
+        slides: Optional 1-based slide numbers to render (default: all slides)
         
     Returns:
-        List of PIL Image objects, one per slide
+        List of PIL Image objects, one per (requested) slide; hidden slides
+        are not exported, so they have no image
     """
     if not PPTX_AVAILABLE:
         return []
     
-    import io
-    import subprocess
-    import tempfile
-    import os
+    pages = None
+    if slides is not None:
+        page_numbers = rendered_page_numbers(Presentation(open_source(pptx_source)).slides)
+        pages = [page_numbers[n] for n in slides if n in page_numbers]
+    
+    with pptx_as_pdf(pptx_source) as pdf_path:
+        if not pdf_path:
+            return []
+        return pdf_to_images(pdf_path, dpi, pages=pages)
+
+
+def _picture_image(shape):
+    """Return the shape's embedded picture as (PIL Image, bytes hash), or None."""
+    try:
+        blob = shape.image.blob
+    except (AttributeError, ValueError):
+        return None  # not a picture, or an empty picture placeholder
+    try:
+        image = Image.open(io.BytesIO(blob))
+        image.load()
+        return image, image_hash.bytes_hash(blob)
+    except Exception:
+        return None  # formats PIL cannot read (EMF/WMF, ...)
+
+
+def _table_markdown(table) -> str:
+    rows = [[cell.text.strip().replace('\n', ' ').replace('|', '\\|') for cell in row.cells]
+            for row in table.rows]
+    if not rows:
+        return ''
+    lines = ['| ' + ' | '.join(rows[0]) + ' |', '|' + ' --- |' * len(rows[0])]
+    lines.extend('| ' + ' | '.join(row) + ' |' for row in rows[1:])
+    return '\n'.join(lines)
+
+
+def _collect_shapes(shapes, texts: list, pictures: list):
+    """Walk shapes (recursing into groups), collecting text blocks and (image, digest, area) pictures."""
+    for shape in shapes:
+        if shape.shape_type == MSO_SHAPE_TYPE.GROUP:
+            _collect_shapes(shape.shapes, texts, pictures)
+            continue
+        if getattr(shape, 'has_table', False) and shape.has_table:
+            table = _table_markdown(shape.table)
+            if table:
+                texts.append(table)
+            continue
+        if getattr(shape, 'has_text_frame', False) and shape.has_text_frame and shape.text_frame.text.strip():
+            texts.append(shape.text_frame.text.strip())
+            continue
+        picture = _picture_image(shape)
+        if picture is not None:
+            pictures.append((*picture, (shape.width or 0) * (shape.height or 0)))
+
+
+def analyze_slide(slide, slide_area: int) -> dict:
+    """
+    Read a slide's native content and decide how it should be extracted.
+    
+    Returns:
+        Dictionary with 'texts', 'notes', 'pictures' ((PIL Image, bytes hash)
+        pairs worth OCR) and 'method': 'text' (native text only), 'pictures' (native text plus
+        OCR of embedded pictures) or 'render' (OCR of the rendered slide)
+    """
+    texts, pictures = [], []
+    _collect_shapes(slide.shapes, texts, pictures)
     
-    # Save PPTX to temp file
-    with tempfile.NamedTemporaryFile(suffix='.pptx', delete=False) as tmp_pptx:
-        tmp_pptx.write(pptx_bytes)
-        tmp_pptx_path = tmp_pptx.name
+    notes = ''
+    if slide.has_notes_slide and slide.notes_slide.notes_text_frame is not None:
+        notes = slide.notes_slide.notes_text_frame.text.strip()
     
-    images = []
+    coverage = sum(area for _, _, area in pictures) / slide_area if slide_area else 0
+    ocr_pictures = [(image, digest) for image, digest, area in pictures
+                    if not slide_area or area / slide_area >= PPTX_MIN_PICTURE_AREA]
     
-    try:
-        # Try using LibreOffice to convert PPTX to PDF first
-        with tempfile.TemporaryDirectory() as tmp_dir:
-            # Convert PPTX to PDF using LibreOffice (if available)
-            try:
-                # Try common LibreOffice paths on Windows
-                soffice_paths = [
-                    r'C:\Program Files\LibreOffice\program\soffice.exe',
-                    r'C:\Program Files (x86)\LibreOffice\program\soffice.exe',
-                ]
-                
-                soffice_cmd = None
-                for path in soffice_paths:
-                    if os.path.exists(path):
-                        soffice_cmd = path
-                        print(f"✅ Found LibreOffice at: {path}")
-                        break
-                
-                if soffice_cmd:
-                    print(f"🔄 Converting PPTX to PDF with LibreOffice...")
-                    subprocess.run([
-                        soffice_cmd, '--headless', '--convert-to', 'pdf',
-                        '--outdir', tmp_dir, tmp_pptx_path
-                    ], check=True, capture_output=True, timeout=120)
-                    
-                    # Find the generated PDF
-                    pdf_path = os.path.join(tmp_dir, os.path.basename(tmp_pptx_path).replace('.pptx', '.pdf'))
-                    
-                    if os.path.exists(pdf_path):
-                        print(f"✅ PPTX converted to PDF successfully")
-                        with open(pdf_path, 'rb') as f:
-                            pdf_bytes = f.read()
-                        images = pdf_to_images(pdf_bytes, dpi)
-                    else:
-                        print(f"❌ PDF file not found after conversion")
-                else:
-                    print(f"❌ LibreOffice not found")
-            except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired) as e:
-                # LibreOffice not available or failed
-                print(f"❌ LibreOffice conversion failed: {e}")
-                pass
-    finally:
-        # Clean up temp file
-        if os.path.exists(tmp_pptx_path):
-            os.unlink(tmp_pptx_path)
+    if coverage >= PPTX_IMAGE_SLIDE_COVERAGE:
+        method = 'render'
+    elif ocr_pictures:
+        method = 'pictures'
+    else:
+        method = 'text'
     
-    return images
+    return {'texts': texts, 'notes': notes, 'pictures': ocr_pictures, 'method': method}
+
 
+def _slide_markdown(slide_num: int, body: list, notes: str) -> str:
+    parts = [f"## 슬라이드 {slide_num}"] + [part for part in body if part]
+    if notes:
+        parts.append(f"> 발표자 노트: {notes}")
+    return '\n\n'.join(parts)
 
-def process_pptx(pptx_bytes: bytes, api_key: str) -> dict:
+
+def process_pptx(pptx_source, api_key: str, progress=None) -> dict:
     """
-    Process a PPTX file and extract text using Gemini OCR.
-    Falls back to direct text extraction if image conversion fails.
+    Process a PPTX file, reading native text and OCRing only image content.
+    
+    Text frames, tables and speaker notes are read directly with python-pptx.
+    Embedded pictures are sent to Gemini OCR, and slides mostly covered by
+    images are rendered (LibreOffice → PDF → image) and OCRed as a whole.
+    Text-only decks are neither rendered nor sent to Gemini.
     
     Args:
-        pptx_bytes: The PPTX file as bytes
+        pptx_source: Path to the PPTX file, or its bytes
         api_key: Gemini API key
+        progress: Optional callback(slides_done, slide_total, partial_text)
         
     Returns:
-        Dictionary with success status, text content, and slide count
+        Dictionary with success status, text content, slide count and a
+        per-slide 'slides' list of {slide, method}
     """
     if not PPTX_AVAILABLE:
         return {
@@ -333,56 +1098,95 @@ def process_pptx(pptx_bytes: bytes, api_key: str) -> dict:
         }
     
     try:
-        # First try to convert to images and use Gemini OCR
-        images = pptx_to_images(pptx_bytes)
+        prs = Presentation(open_source(pptx_source))
+        slide_area = (prs.slide_width or 0) * (prs.slide_height or 0)
+        analyses = [analyze_slide(slide, slide_area) for slide in prs.slides]
+        total = len(analyses)
+        page_numbers = rendered_page_numbers(prs.slides)
         
-        if images:
-            # Use Gemini OCR like PDF
-            all_text = []
-            for i, image in enumerate(images):
-                slide_num = i + 1
-                
+        render_count = sum(1 for num, info in enumerate(analyses, 1)
+                           if info['method'] == 'render' and num in page_numbers)
+        rendered_pdf = None
+        duplicate_index = image_hash.DuplicateIndex()
+        reused = []
+        
+        def ocr_image(image, fingerprint: str = None) -> tuple:
+            """Returns (markdown, succeeded). Repeated fingerprints reuse earlier OCR."""
+            try:
+                if PAGE_DEDUP_ENABLED and fingerprint:
+                    text, was_reused = ocr_image_cached(image, api_key, fingerprint)
+                    if was_reused:
+                        reused.append(fingerprint)
+                    return text, True
+                result = extract_text_with_gemini(image, api_key, timeout=GEMINI_OCR_TIMEOUT)
+                if result['success']:
+                    return result['text'], True
+                return "[오류: 텍스트 추출 실패]", False
+            except Exception as e:
+                return f"[오류: {str(e)}]", False
+        
+        def extract_slide(slide_num: int) -> tuple:
+            """Returns (slide markdown, succeeded, method used)."""
+            info = analyses[slide_num - 1]
+            method = info['method']
+            body = list(info['texts'])
+            ok = True
+            
+            # Each worker rasterizes only its own slide, so one page per worker is in memory
+            image = None
+            if method == 'render' and rendered_pdf and slide_num in page_numbers:
                 try:
-                    result = extract_text_with_gemini(image, api_key)
-                    if result['success']:
-                        all_text.append(f"## 슬라이드 {slide_num}\n\n{result['text']}")
-                    else:
-                        all_text.append(f"## 슬라이드 {slide_num}\n\n[오류: 텍스트 추출 실패]")
+                    image = next(iter_pdf_pages(rendered_pdf, pages=[page_numbers[slide_num]]), (None, None))[1]
                 except Exception as e:
-                    all_text.append(f"## 슬라이드 {slide_num}\n\n[오류: {str(e)}]")
-            
-            combined_text = '\n\n---\n\n'.join(all_text)
+                    print(f"⚠️ Slide {slide_num} could not be rendered: {e}")
             
-            return {
-                'success': True,
-                'text': combined_text,
-                'slide_count': len(images)
-            }
-        else:
-            # Fallback: Direct text extraction (no OCR)
-            import io
-            pptx_file = io.BytesIO(pptx_bytes)
-            prs = Presentation(pptx_file)
-            
-            all_text = []
-            for slide_num, slide in enumerate(prs.slides, 1):
-                slide_text = [f"## 슬라이드 {slide_num}"]
-                
-                for shape in slide.shapes:
-                    if hasattr(shape, "text") and shape.text.strip():
-                        slide_text.append(shape.text.strip())
-                
-                if len(slide_text) > 1:
-                    all_text.append('\n\n'.join(slide_text))
+            if image is not None:
+                fingerprint, _ = duplicate_index.canonical(
+                    image_hash.text_hash('\n'.join(info['texts'])), image_hash.dhash(image)
+                )
+                text, ok = ocr_image(image, f"slide:{fingerprint}")
+                body = [text]
+            elif method != 'text':
+                # Rendering unavailable: fall back to OCRing the pictures themselves
+                method = 'pictures' if info['pictures'] else 'text'
+                for image, digest in info['pictures']:
+                    text, picture_ok = ocr_image(image, f"picture:{digest}")
+                    body.append(text)
+                    ok = ok and picture_ok
             
-            combined_text = '\n\n---\n\n'.join(all_text)
+            return _slide_markdown(slide_num, body, info['notes']), ok, method
+        
+        ocr_count = sum(1 for info in analyses if info['method'] != 'text')
+        print(f"📑 {total} slides: {total - ocr_count} text-only, {ocr_count} with OCR "
+              f"({PPTX_OCR_CONCURRENCY} concurrent)")
+        
+        slides = [None] * total
+        with ExitStack() as stack:
+            if render_count:
+                print(f"🖼️ Rendering {render_count} image-heavy slides for OCR...")
+                rendered_pdf = stack.enter_context(pptx_as_pdf(pptx_source))
             
-            return {
-                'success': True,
-                'text': combined_text,
-                'slide_count': len(prs.slides),
-                'fallback': True  # Indicates direct extraction was used
-            }
+            if total:
+                with ThreadPoolExecutor(max_workers=min(PPTX_OCR_CONCURRENCY, total)) as pool:
+                    futures = {pool.submit(extract_slide, num): num for num in range(1, total + 1)}
+                    for done, future in enumerate(as_completed(futures), 1):
+                        slides[futures[future] - 1] = future.result()
+                        if progress:
+                            progress(done, total, '\n\n---\n\n'.join(
+                                text for text, _, _ in filter(None, slides)
+                            ))
+        
+        if reused:
+            print(f"♻️ Reused OCR for {len(reused)} repeated slides/pictures")
+        
+        return {
+            'success': True,
+            'partial': not all(ok for _, ok, _ in slides),
+            'text': '\n\n---\n\n'.join(text for text, _, _ in slides),
+            'slide_count': total,
+            'slides': [{'slide': num, 'method': method}
+                       for num, (_, _, method) in enumerate(slides, 1)]
+        }
         
     except Exception as e:
         return {
@@ -402,12 +1206,12 @@ except ImportError:
     print("WARNING: python-docx not installed. DOCX processing will not work.")
 
 
-def extract_docx_text(docx_bytes: bytes) -> dict:
+def extract_docx_text(docx_source) -> dict:
     """
     Extract text from a DOCX file.
     
     Args:
-        docx_bytes: The DOCX file as bytes
+        docx_source: Path to the DOCX file, or its bytes
         
     Returns:
         Dictionary with success status and text content
@@ -420,9 +1224,7 @@ def extract_docx_text(docx_bytes: bytes) -> dict:
         }
     
     try:
-        import io
-        docx_file = io.BytesIO(docx_bytes)
-        doc = Document(docx_file)
+        doc = Document(open_source(docx_source))
         
         all_text = []
         for para in doc.paragraphs:
@@ -0,0 +1,338 @@
+"""
+Rate Limiter Module
+Client-side request and token budgets for DeepSeek and Gemini.
+
+Every LLM call is admitted by acquire() (or acquire_async()) before it is sent
+through upstream.call. Each provider has two token buckets, refilled
+continuously and holding up to one minute of budget: requests per minute and
+tokens per minute (<PROVIDER>_RPM / <PROVIDER>_TPM; 0 disables a limit).
+A call costs one request plus its estimated tokens: the prompt length (see
+estimate_tokens) plus max_tokens for the reply. When the reply's real usage is
+known, settle() gives back the unused part of the reservation.
+
+Waiting calls are served by priority: interactive work (subtitle formatting,
+question generation) ahead of bulk work (document OCR and organization).
+Within a priority, calls are served in arrival order, and a waiting call
+gains one priority level every PRIORITY_AGING seconds, so bulk work is
+delayed but never starved.
+
+Load shedding: a call that would wait longer than its priority allows
+(LLM_MAX_WAIT_INTERACTIVE / LLM_MAX_WAIT_BULK) fails at once with
+RateLimited; the routes answer 429 with Retry-After.
+
+Budgets are per process. Under gunicorn each worker gets 1/WEB_CONCURRENCY of
+the configured quota.
+"""
+import asyncio
+import itertools
+import math
+import os
+import threading
+import time
+
+import environment  # settings below are read at import time
+
+INTERACTIVE = 0
+BULK = 1
+
+# Endpoint names as in upstream.ENDPOINT_DEADLINES
+ENDPOINT_PRIORITIES = {
+    'deepseek.subtitle': INTERACTIVE,
+    'deepseek.questions': INTERACTIVE,
+    'deepseek.organize': BULK,
+    'gemini.ocr_image': BULK,
+    'gemini.ocr_pdf': BULK,
+}
+
+# Longest a call may queue before it is shed (seconds)
+MAX_WAIT = {
+    INTERACTIVE: float(os.getenv('LLM_MAX_WAIT_INTERACTIVE', 15)),
+    BULK: float(os.getenv('LLM_MAX_WAIT_BULK', 300)),
+}
+PRIORITY_AGING = 30  # seconds of waiting worth one priority level
+ASYNC_POLL_INTERVAL = 0.1  # seconds between checks while a coroutine waits
+
+# Prompt size estimate (DeepSeek's guidance: ~0.3 tokens per English
+# character, ~0.6 per CJK character; Hangul is counted like CJK)
+TOKENS_PER_ASCII_CHAR = 0.3
+TOKENS_PER_OTHER_CHAR = 0.6
+TOKENS_PER_MESSAGE = 4  # role and formatting overhead
+
+# Quotas are split evenly between the worker processes sharing them
+RATE_LIMIT_PROCESSES = max(1, int(os.getenv('WEB_CONCURRENCY') or 1))
+
+
+def _per_process(env_name: str, default: float) -> float:
+    return float(os.getenv(env_name, default)) / RATE_LIMIT_PROCESSES
+
+
+class RateLimited(Exception):
+    """A call was shed: the provider's budget will not allow it soon enough."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Bucket:
+    """Token bucket holding up to one minute of budget, refilled continuously."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def seconds_until(self, amount: float) -> float:
+        """Seconds until the bucket holds `amount` (0 if it already does)."""
+        return max(0.0, (amount - self.level) / self.rate)
+
+
+class _Ticket:
+    """A call waiting for (or granted) its budget."""
+
+    def __init__(self, scheduler, priority: int, tokens: int, seq: int):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.tokens = tokens
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.deadline = self.enqueued + MAX_WAIT[priority]
+        self.granted = False
+
+
+class Scheduler:
+    """Request and token buckets for one provider, with a priority queue of waiting calls."""
+
+    def __init__(self, name: str, requests_per_minute: float, tokens_per_minute: float):
+        self.name = name
+        self.requests = _Bucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.tokens = _Bucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self._waiting = []
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._stats = {'granted': 0, 'shed': 0, 'wait_seconds': 0.0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests is not None or self.tokens is not None
+
+    def reset_lock(self):
+        self._cond = threading.Condition()
+        self._waiting = []
+
+    def _buckets(self, requests: float, tokens: float):
+        return [(bucket, amount) for bucket, amount in ((self.requests, requests), (self.tokens, tokens))
+                if bucket is not None]
+
+    def _wait_for(self, requests: float, tokens: float) -> float:
+        """Seconds until the buckets hold this many requests and tokens. Caller holds the lock."""
+        return max((bucket.seconds_until(amount) for bucket, amount in self._buckets(requests, tokens)),
+                   default=0.0)
+
+    def _dispatch(self):
+        """
+        Grant waiting calls in priority order while the budget allows. Caller holds the lock.
+
+        Returns:
+            Seconds until the next waiting call can be granted, or None if none are waiting
+        """
+        now = time.monotonic()
+        for bucket, _ in self._buckets(0, 0):
+            bucket.refill(now)
+
+        granted = False
+        delay = None
+        while self._waiting:
+            # A call that has waited PRIORITY_AGING seconds ranks one level higher
+            ticket = min(self._waiting,
+                         key=lambda t: (t.priority - (now - t.enqueued) / PRIORITY_AGING, t.seq))
+            delay = self._wait_for(1, ticket.tokens)
+            if delay > 0:
+                break
+            for bucket, amount in self._buckets(1, ticket.tokens):
+                bucket.level -= amount
+            self._waiting.remove(ticket)
+            ticket.granted = True
+            granted = True
+            delay = None
+            self._stats['granted'] += 1
+            self._stats['wait_seconds'] += now - ticket.enqueued
+
+        if granted:
+            self._cond.notify_all()
+        return delay
+
+    def _enqueue(self, priority: int, tokens: int) -> _Ticket:
+        """Queue a call, or shed it if it would wait longer than its priority allows. Caller holds the lock."""
+        # A single call larger than the bucket waits for a full bucket instead of forever
+        if self.tokens is not None:
+            tokens = min(tokens, self.tokens.capacity)
+        self._dispatch()
+
+        expected = self._expected_wait(priority, tokens)
+        if expected > MAX_WAIT[priority]:
+            raise self._shed(expected)
+
+        ticket = _Ticket(self, priority, tokens, next(self._seq))
+        self._waiting.append(ticket)
+        return ticket
+
+    def _expected_wait(self, priority: int, tokens: int) -> float:
+        """Seconds until a new call could be granted behind the waiting calls of its priority or higher."""
+        ahead = [t for t in self._waiting if t.priority <= priority]
+        return self._wait_for(len(ahead) + 1, sum(t.tokens for t in ahead) + tokens)
+
+    def _shed(self, retry_after: float) -> RateLimited:
+        self._stats['shed'] += 1
+        print(f"🚦 {self.name} budget exhausted, shedding a call (~{retry_after:.0f}s backlog)")
+        return RateLimited(f"{self.name} rate limit: about {retry_after:.0f}s of queued work", retry_after)
+
+    def _poll(self, ticket: _Ticket):
+        """
+        Advance the queue for a waiting ticket. Caller holds the lock.
+
+        Returns:
+            None once granted, else seconds to wait before polling again
+
+        Raises:
+            RateLimited: the ticket waited past its priority's limit
+        """
+        delay = self._dispatch()
+        if ticket.granted:
+            return None
+        remaining = ticket.deadline - time.monotonic()
+        if remaining <= 0:
+            self._waiting.remove(ticket)
+            raise self._shed(self._expected_wait(ticket.priority, ticket.tokens))
+        return remaining if delay is None else min(delay, remaining)
+
+    def _abandon(self, ticket: _Ticket):
+        with self._cond:
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+                self._cond.notify_all()
+
+    def acquire(self, priority: int, tokens: int) -> _Ticket:
+        """Block until the call is granted its budget. Raises RateLimited if it is shed."""
+        with self._cond:
+            ticket = self._enqueue(priority, tokens)
+            try:
+                delay = self._poll(ticket)
+                while delay is not None:
+                    self._cond.wait(delay)
+                    delay = self._poll(ticket)
+                return ticket
+            finally:
+                if not ticket.granted and ticket in self._waiting:
+                    self._waiting.remove(ticket)
+
+    async def acquire_async(self, priority: int, tokens: int) -> _Ticket:
+        """acquire() for coroutines: waits by polling, without holding a thread."""
+        with self._cond:
+            ticket = self._enqueue(priority, tokens)
+        try:
+            while True:
+                with self._cond:
+                    delay = self._poll(ticket)
+                if delay is None:
+                    return ticket
+                await asyncio.sleep(min(delay, ASYNC_POLL_INTERVAL))
+        finally:
+            if not ticket.granted:
+                self._abandon(ticket)
+
+    def settle(self, ticket: _Ticket, used_tokens: int):
+        """Return the unused part of a ticket's token reservation (or charge an overrun)."""
+        if self.tokens is None:
+            return
+        with self._cond:
+            self.tokens.level = min(self.tokens.capacity, self.tokens.level + ticket.tokens - used_tokens)
+            self._dispatch()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            self._dispatch()
+            snapshot = {'waiting': len(self._waiting), **self._stats}
+            snapshot['wait_seconds'] = round(snapshot['wait_seconds'], 1)
+            if self.requests is not None:
+                snapshot['requests_per_minute'] = self.requests.capacity
+                snapshot['requests_available'] = math.floor(self.requests.level)
+            if self.tokens is not None:
+                snapshot['tokens_per_minute'] = self.tokens.capacity
+                snapshot['tokens_available'] = math.floor(self.tokens.level)
+            return snapshot
+
+
+_schedulers = {
+    'deepseek': Scheduler('deepseek', _per_process('DEEPSEEK_RPM', 120), _per_process('DEEPSEEK_TPM', 1000000)),
+    'gemini': Scheduler('gemini', _per_process('GEMINI_RPM', 60), _per_process('GEMINI_TPM', 1000000)),
+}
+
+
+def _after_fork_in_child():
+    for scheduler in _schedulers.values():
+        scheduler.reset_lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count of prompt text (see TOKENS_PER_ASCII_CHAR / TOKENS_PER_OTHER_CHAR)."""
+    ascii_chars = len(text.encode('ascii', 'ignore'))
+    return math.ceil(ascii_chars * TOKENS_PER_ASCII_CHAR + (len(text) - ascii_chars) * TOKENS_PER_OTHER_CHAR)
+
+
+def estimate_messages(messages: list, max_tokens: int) -> int:
+    """Token cost of a chat completion: its messages plus the reply's max_tokens."""
+    prompt = sum(estimate_tokens(message['content']) + TOKENS_PER_MESSAGE for message in messages)
+    return prompt + max_tokens
+
+
+def _scheduler(endpoint: str) -> Scheduler:
+    return _schedulers[endpoint.split('.', 1)[0]]
+
+
+def acquire(endpoint: str, tokens: int):
+    """
+    Wait for the budget of one call to an endpoint, at the endpoint's priority.
+
+    Args:
+        endpoint: '<provider>.<name>', a key of ENDPOINT_PRIORITIES
+        tokens: Estimated tokens (prompt plus max_tokens)
+
+    Returns:
+        Ticket to pass to settle(), or None if the provider is not limited
+
+    Raises:
+        RateLimited: the call was shed; retry_after says when to try again
+    """
+    scheduler = _scheduler(endpoint)
+    if not scheduler.enabled:
+        return None
+    return scheduler.acquire(ENDPOINT_PRIORITIES[endpoint], tokens)
+
+
+async def acquire_async(endpoint: str, tokens: int):
+    """acquire() for coroutines."""
+    scheduler = _scheduler(endpoint)
+    if not scheduler.enabled:
+        return None
+    return await scheduler.acquire_async(ENDPOINT_PRIORITIES[endpoint], tokens)
+
+
+def settle(ticket, used_tokens):
+    """Correct a granted call's token reservation with its actual usage (if known)."""
+    if ticket is not None and used_tokens is not None:
+        ticket.scheduler.settle(ticket, used_tokens)
+
+
+def get_stats() -> dict:
+    """Queue and budget state per provider."""
+    return {name: scheduler.snapshot() for name, scheduler in _schedulers.items()}
@@ -0,0 +1,319 @@
+"""
+Single-flight Module
+Coalesces concurrent identical upstream calls (same cache key) into one.
+
+Within a process, duplicate callers wait on the leader thread's result
+(or, for the asyncio front end, the leader task's future). Across worker
+processes, the leader holds a lease row in a small SQLite
+file; other processes wait for the lease to be released and then read the
+result from cache_manager.
+
+The leader renews its lease while it computes, however long the upstream
+call takes, so the lease only expires (after SINGLE_FLIGHT_LEASE_TTL seconds)
+when the leader's process died.
+"""
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import cache_manager
+
+LEASE_DB_PATH = Path(os.getenv('SINGLE_FLIGHT_DB_PATH',
+                               str(cache_manager.CACHE_DIR / "singleflight.sqlite3")))
+LEASE_TTL = int(os.getenv('SINGLE_FLIGHT_LEASE_TTL', 60))  # seconds; a crashed leader's lease expires after this
+LEASE_RENEW_INTERVAL = LEASE_TTL / 3  # seconds between renewals by a live leader
+POLL_INTERVAL = 0.25  # seconds between lease checks while waiting on another process
+
+
+class _Call:
+    """An in-flight computation that other threads can wait on."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_calls = {}
+_async_calls = {}  # (event loop, cache key) -> asyncio.Future of the leading task
+_lock = threading.Lock()
+_local = threading.local()
+
+_stats = {
+    'upstream_calls': 0,
+    'coalesced_local': 0,
+    'coalesced_remote': 0,
+}
+
+
+def _after_fork_in_child():
+    """Calls in flight in the parent belong to threads that did not survive the fork."""
+    global _local, _lock
+    _local = threading.local()
+    _lock = threading.Lock()
+    _calls.clear()
+    _async_calls.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def _count(stat: str):
+    with _lock:
+        _stats[stat] += 1
+
+
+def _connect():
+    """Return this thread's lease DB connection, or None if unavailable."""
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        try:
+            LEASE_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(LEASE_DB_PATH), timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS leases (
+                    key TEXT PRIMARY KEY,
+                    owner TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            ''')
+        except sqlite3.Error as e:
+            print(f"⚠️ Single-flight lease DB unavailable, coalescing in-process only: {e}")
+            return None
+        _local.conn = conn
+    return conn
+
+
+def _acquire_lease(cache_key: str, owner: str) -> bool:
+    """Take the lease for a key unless another live owner holds it."""
+    conn = _connect()
+    if conn is None:
+        return True
+
+    now = time.time()
+    try:
+        cursor = conn.execute('''
+            INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+            WHERE leases.expires_at < ?
+        ''', (cache_key, owner, now + LEASE_TTL, now))
+        return cursor.rowcount == 1
+    except sqlite3.Error as e:
+        print(f"⚠️ Lease acquire error: {e}")
+        return True
+
+
+def _renew_lease(cache_key: str, owner: str):
+    conn = _connect()
+    if conn is None:
+        return
+    try:
+        conn.execute(
+            'UPDATE leases SET expires_at = ? WHERE key = ? AND owner = ?',
+            (time.time() + LEASE_TTL, cache_key, owner)
+        )
+    except sqlite3.Error as e:
+        print(f"⚠️ Lease renew error: {e}")
+
+
+class _LeaseRenewal:
+    """Context manager renewing a lease from a background thread while the leader computes."""
+
+    def __init__(self, cache_key: str, owner: str):
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(cache_key, owner), name='lease-renewal', daemon=True
+        )
+
+    def _run(self, cache_key: str, owner: str):
+        while not self._stopped.wait(LEASE_RENEW_INTERVAL):
+            _renew_lease(cache_key, owner)
+        conn = getattr(_local, 'conn', None)
+        if conn is not None:
+            conn.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stopped.set()
+
+
+def _release_lease(cache_key: str, owner: str):
+    conn = _connect()
+    if conn is None:
+        return
+    try:
+        conn.execute('DELETE FROM leases WHERE key = ? AND owner = ?', (cache_key, owner))
+    except sqlite3.Error as e:
+        print(f"⚠️ Lease release error: {e}")
+
+
+def _lease_held(cache_key: str) -> bool:
+    conn = _connect()
+    if conn is None:
+        return False
+    try:
+        row = conn.execute(
+            'SELECT 1 FROM leases WHERE key = ? AND expires_at >= ?', (cache_key, time.time())
+        ).fetchone()
+        return row is not None
+    except sqlite3.Error:
+        return False
+
+
+def _lead(cache_key: str, compute):
+    """Run compute under the cross-process lease. Returns (data, coalesced)."""
+    owner = uuid.uuid4().hex
+
+    while True:
+        if _acquire_lease(cache_key, owner):
+            try:
+                # Another process may have finished between our cache miss and the lease
+                cached = cache_manager.get_cached(cache_key)
+                if cached is not None:
+                    _count('coalesced_remote')
+                    return cached, True
+
+                _count('upstream_calls')
+                with _LeaseRenewal(cache_key, owner):
+                    data = compute()
+                cache_manager.set_cache(cache_key, data)
+                return data, False
+            finally:
+                _release_lease(cache_key, owner)
+
+        print(f"⏳ Waiting on another worker for {cache_key[:8]}...")
+        while _lease_held(cache_key):
+            time.sleep(POLL_INTERVAL)
+
+        cached = cache_manager.get_cached(cache_key)
+        if cached is not None:
+            _count('coalesced_remote')
+            return cached, True
+        # The other worker failed without caching anything; try to lead ourselves
+
+
+def run(cache_key: str, compute):
+    """
+    Run compute() once per cache key across concurrent callers.
+
+    The leader's result is stored with cache_manager.set_cache. Concurrent
+    callers with the same key get that result instead of calling upstream;
+    if the leader raises, in-process waiters receive the same exception.
+
+    Args:
+        cache_key: Key identifying the request (the response cache key)
+        compute: Zero-argument callable returning JSON-serializable data
+
+    Returns:
+        Tuple of (data, coalesced) where coalesced is True if this caller
+        reused another caller's upstream call
+    """
+    with _lock:
+        call = _calls.get(cache_key)
+        is_leader = call is None
+        if is_leader:
+            call = _Call()
+            _calls[cache_key] = call
+
+    if not is_leader:
+        call.event.wait()
+        if call.error is not None:
+            raise call.error
+        _count('coalesced_local')
+        print(f"🔗 Coalesced duplicate request: {cache_key[:8]}...")
+        return call.result, True
+
+    try:
+        call.result, coalesced = _lead(cache_key, compute)
+        return call.result, coalesced
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _lock:
+            _calls.pop(cache_key, None)
+        call.event.set()
+
+
+async def _lead_async(cache_key: str, compute):
+    """_lead for coroutines: lease and cache I/O run in worker threads."""
+    owner = uuid.uuid4().hex
+
+    while True:
+        if await asyncio.to_thread(_acquire_lease, cache_key, owner):
+            try:
+                cached = await asyncio.to_thread(cache_manager.get_cached, cache_key)
+                if cached is not None:
+                    _count('coalesced_remote')
+                    return cached, True
+
+                _count('upstream_calls')
+                with _LeaseRenewal(cache_key, owner):
+                    data = await compute()
+                await asyncio.to_thread(cache_manager.set_cache, cache_key, data)
+                return data, False
+            finally:
+                await asyncio.to_thread(_release_lease, cache_key, owner)
+
+        print(f"⏳ Waiting on another worker for {cache_key[:8]}...")
+        while await asyncio.to_thread(_lease_held, cache_key):
+            await asyncio.sleep(POLL_INTERVAL)
+
+        cached = await asyncio.to_thread(cache_manager.get_cached, cache_key)
+        if cached is not None:
+            _count('coalesced_remote')
+            return cached, True
+
+
+async def run_async(cache_key: str, compute):
+    """
+    Coroutine counterpart of run() for event-loop callers.
+
+    Args:
+        cache_key: Key identifying the request (the response cache key)
+        compute: Zero-argument callable returning an awaitable of JSON-serializable data
+
+    Returns:
+        Tuple of (data, coalesced), as for run()
+    """
+    loop = asyncio.get_running_loop()
+    future = _async_calls.get((loop, cache_key))
+    if future is not None:
+        data = await asyncio.shield(future)
+        _count('coalesced_local')
+        print(f"🔗 Coalesced duplicate request: {cache_key[:8]}...")
+        return data, True
+
+    future = loop.create_future()
+    _async_calls[(loop, cache_key)] = future
+    try:
+        data, coalesced = await _lead_async(cache_key, compute)
+        future.set_result(data)
+        return data, coalesced
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        future.exception()  # waiters re-raise it; don't log it as never retrieved
+        raise
+    finally:
+        _async_calls.pop((loop, cache_key), None)
+
+
+def get_stats():
+    """Get single-flight statistics."""
+    with _lock:
+        stats = dict(_stats)
+        stats['in_flight'] = len(_calls) + len(_async_calls)
+    stats['coalesced'] = stats['coalesced_local'] + stats['coalesced_remote']
+    return stats
@@ -0,0 +1,19 @@
+"""
+Shared test setup: the server modules are imported from server/ and keep
+their cache, job and lease databases in a temporary directory.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVER_DIR))
+
+# Set before any server module reads its settings at import time
+_data_dir = Path(tempfile.mkdtemp(prefix='gengen-tests-'))
+os.environ['CACHE_BACKEND'] = 'sqlite'
+os.environ['CACHE_DB_PATH'] = str(_data_dir / 'cache.sqlite3')
+os.environ['JOBS_DB_PATH'] = str(_data_dir / 'jobs.sqlite3')
+os.environ['JOBS_DIR'] = str(_data_dir / 'jobs')
+os.environ['SINGLE_FLIGHT_DB_PATH'] = str(_data_dir / 'singleflight.sqlite3')
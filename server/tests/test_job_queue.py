@@ -0,0 +1,68 @@
+import io
+import time
+
+import app
+import job_queue
+
+
+def _wait_for_job(client, job_id, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        body = client.get(f'/api/jobs/{job_id}').get_json()
+        if body['status'] in ('done', 'failed'):
+            return body
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_submitted_job_runs_without_an_entry_point(monkeypatch):
+    # As under `flask run`: nothing called app.start_job_queue() beforehand
+    monkeypatch.setattr(app, 'GEMINI_API_KEY', 'test-key')
+    monkeypatch.setattr(app, '_extract_document', lambda path, file_hash, filename, progress=None: (
+        {'success': True, 'text': 'extracted'}, 'page_count', 'pages'
+    ))
+    monkeypatch.setattr(app, '_build_extract_response', lambda result, *args: (
+        {'success': True, 'text': result['text']}, 200
+    ))
+    client = app.app.test_client()
+
+    response = client.post(
+        '/api/jobs/extract',
+        data={'file': (io.BytesIO(b'%PDF-1.4 test'), 'doc.pdf')},
+        content_type='multipart/form-data'
+    )
+
+    assert response.status_code == 202
+    body = _wait_for_job(client, response.get_json()['jobId'])
+    assert body['status'] == 'done', body
+    assert body['result']['text'] == 'extracted'
+
+
+def _make_stale(job_id):
+    stale_at = time.time() - job_queue.JOB_STALE_AFTER - 1
+    job_queue._connect().execute('UPDATE jobs SET heartbeat_at = ? WHERE id = ?', (stale_at, job_id))
+    return stale_at
+
+
+def test_stale_jobs_of_unknown_kinds_are_left_alone():
+    job_id = job_queue.create_job('no-runner-here', {})
+    stale_at = _make_stale(job_id)
+
+    job_queue._claim_stale_jobs()
+
+    job = job_queue.get_job(job_id)
+    assert job['status'] == 'queued'
+    assert job['heartbeat_at'] == stale_at
+
+
+def test_stale_jobs_with_a_runner_are_resumed():
+    job_queue.start({'test-echo': lambda job: {'echo': job['params']['value']}})
+    job_id = job_queue.create_job('test-echo', {'value': 7})
+    _make_stale(job_id)
+
+    job_queue._claim_stale_jobs()
+
+    deadline = time.time() + 10
+    while job_queue.get_job(job_id)['status'] != 'done' and time.time() < deadline:
+        time.sleep(0.05)
+    assert job_queue.get_job(job_id)['result'] == {'echo': 7}
@@ -0,0 +1,42 @@
+import time
+
+import office_converter
+
+
+class RunningProcess:
+    def poll(self):
+        return None
+
+
+def make_pool(monkeypatch, convert):
+    pool = office_converter.OfficePool('/usr/bin/soffice', 2)
+    for instance in pool.instances:
+        instance.process = RunningProcess()
+        instance.available = True
+        monkeypatch.setattr(instance, 'convert', convert)
+    return pool
+
+
+def test_failed_instances_are_skipped_until_a_health_check_passes(monkeypatch, tmp_path):
+    calls = []
+
+    def refuse(input_path, output_path):
+        calls.append(input_path)
+        raise ConnectionRefusedError('connection refused')
+
+    pool = make_pool(monkeypatch, refuse)
+    monkeypatch.setattr(office_converter, 'get_pool', lambda: pool)
+    monkeypatch.setattr(office_converter, '_convert_cold', lambda input_path, output_dir: 'cold.pdf')
+
+    started = time.monotonic()
+    results = [office_converter.convert_to_pdf(str(tmp_path / f'deck{n}.pptx'), str(tmp_path)) for n in range(4)]
+
+    assert results == ['cold.pdf'] * 4
+    assert len(calls) == 2  # one attempt per instance, then straight to the cold path
+    assert time.monotonic() - started < 5
+    assert not any(instance.available for instance in pool.instances)
+
+    monkeypatch.setattr(office_converter.OfficeInstance, 'healthy', lambda self: True)
+    pool.instances[0].ensure_running()
+    office_converter.convert_to_pdf(str(tmp_path / 'deck.pptx'), str(tmp_path))
+    assert len(calls) == 3
@@ -0,0 +1,72 @@
+import pytest
+
+import pdf_processor
+
+# Far-apart dHashes, so no two test pages count as near-identical
+PAGE_HASHES = {
+    'A': '0000000000000000',
+    'B': 'ffffffffffffffff',
+    'C': '0f0f0f0f0f0f0f0f',
+    'X': 'f0f0f0f0f0f0f0f0',
+    'Y': '00ff00ff00ff00ff',
+}
+
+
+@pytest.fixture
+def ocr_calls(monkeypatch):
+    """
+    Run process_pdf on a fake PDF given as a tuple of page contents, with a
+    Gemini stub that echoes each page's content under its page marker.
+    """
+    calls = []
+
+    def ocr_pdf_with_gemini(range_pdf, session, pages):
+        calls.append(range_pdf)
+        return '\n'.join(f"<<<PAGE {n}>>>\ntext of {page}" for n, page in enumerate(range_pdf, 1))
+
+    def split_pdf_ranges(pdf_source, pages_per_range, pages=None, single_pages=()):
+        return [(n, n, pdf_source[n - 1:n]) for n in pages]
+
+    monkeypatch.setattr(pdf_processor, 'PYPDF_AVAILABLE', True)
+    monkeypatch.setattr(pdf_processor, 'GEMINI_AVAILABLE', True)
+    monkeypatch.setattr(pdf_processor, 'PAGE_DEDUP_ENABLED', True)
+    monkeypatch.setattr(pdf_processor, 'PDF_TEXT_LAYER_ENABLED', False)
+    monkeypatch.setattr(pdf_processor, 'get_pdf_page_count', len)
+    monkeypatch.setattr(pdf_processor, 'get_gemini_session', lambda api_key: None)
+    monkeypatch.setattr(pdf_processor, 'hash_pdf_pages',
+                        lambda pdf_source, pages: {n: PAGE_HASHES[pdf_source[n - 1]] for n in pages})
+    monkeypatch.setattr(pdf_processor, 'split_pdf_ranges', split_pdf_ranges)
+    monkeypatch.setattr(pdf_processor, 'ocr_pdf_with_gemini', ocr_pdf_with_gemini)
+    return calls
+
+
+def test_pages_ocred_in_one_upload_are_reused_by_the_next(ocr_calls):
+    first = pdf_processor.process_pdf(('A', 'B', 'C'), api_key='key')
+    assert first['success']
+    assert [page['method'] for page in first['pages']] == ['ocr', 'ocr', 'ocr']
+    # One upload for the whole document, split back into pages on its markers
+    assert ocr_calls == [('A', 'B', 'C')]
+
+    ocr_calls.clear()
+    second = pdf_processor.process_pdf(('X', 'B', 'A', 'Y', 'B'), api_key='key')
+
+    assert sorted(ocr_calls) == [('X',), ('Y',)]
+    assert second['pages'] == [
+        {'page': 1, 'method': 'ocr'},
+        {'page': 2, 'method': 'cached'},
+        {'page': 3, 'method': 'cached'},
+        {'page': 4, 'method': 'ocr'},
+        {'page': 5, 'method': 'duplicate', 'same_as': 2},
+    ]
+    assert second['text'] == '\n\n'.join(
+        f"text of {page}" for page in ('X', 'B', 'A', 'Y', 'B'))
+
+
+def test_split_page_text():
+    text = "<<<PAGE 1>>>\none\n<<<PAGE 2>>>\ntwo\n"
+    assert pdf_processor.split_page_text(text, 2) == ['one', 'two']
+    assert pdf_processor.split_page_text("one", 1) == ['one']
+    # Missing, out of order or preceded markers cannot be trusted page by page
+    assert pdf_processor.split_page_text("one two", 2) is None
+    assert pdf_processor.split_page_text("<<<PAGE 2>>>\ntwo\n<<<PAGE 1>>>\none", 2) is None
+    assert pdf_processor.split_page_text("intro\n<<<PAGE 1>>>\none\n<<<PAGE 2>>>\ntwo", 2) is None
@@ -0,0 +1,60 @@
+import io
+from contextlib import contextmanager
+
+from PIL import Image
+from pptx import Presentation
+
+import pdf_processor
+
+
+def make_deck(tmp_path, slide_count, hidden=()):
+    """A deck of image-covered slides (OCRed from the rendered PDF); returns its bytes."""
+    picture = tmp_path / 'picture.png'
+    Image.new('RGB', (64, 48), 'gray').save(picture)
+
+    prs = Presentation()
+    for slide_num in range(1, slide_count + 1):
+        slide = prs.slides.add_slide(prs.slide_layouts[6])
+        slide.shapes.add_picture(str(picture), 0, 0, prs.slide_width, prs.slide_height)
+        if slide_num in hidden:
+            slide.element.set('show', '0')
+    buffer = io.BytesIO()
+    prs.save(buffer)
+    return buffer.getvalue()
+
+
+def test_hidden_slides_have_no_rendered_page(tmp_path):
+    prs = Presentation(io.BytesIO(make_deck(tmp_path, 5, hidden={2, 4})))
+
+    assert pdf_processor.rendered_page_numbers(prs.slides) == {1: 1, 3: 2, 5: 3}
+
+
+def test_rendered_slides_are_read_from_their_own_page(tmp_path, monkeypatch):
+    @contextmanager
+    def pptx_as_pdf(pptx_source):
+        yield 'rendered.pdf'
+
+    def iter_pdf_pages(pdf_source, pages=None, dpi=None):
+        for page in pages:
+            # The page number is carried in the image width
+            yield page, Image.new('L', (100 + page, 100), 'white')
+
+    def extract_text_with_gemini(image, api_key, timeout=None):
+        if image.width > 100:
+            return {'success': True, 'text': f'page {image.width - 100}'}
+        return {'success': True, 'text': 'embedded picture'}
+
+    monkeypatch.setattr(pdf_processor, 'PAGE_DEDUP_ENABLED', False)
+    monkeypatch.setattr(pdf_processor, 'pptx_as_pdf', pptx_as_pdf)
+    monkeypatch.setattr(pdf_processor, 'iter_pdf_pages', iter_pdf_pages)
+    monkeypatch.setattr(pdf_processor, 'extract_text_with_gemini', extract_text_with_gemini)
+
+    result = pdf_processor.process_pptx(make_deck(tmp_path, 4, hidden={2}), 'test-key')
+
+    assert result['success'], result
+    slides = result['text'].split('\n\n---\n\n')
+    assert 'page 1' in slides[0]
+    assert 'embedded picture' in slides[1]  # hidden: OCRed from its picture instead
+    assert 'page 2' in slides[2]
+    assert 'page 3' in slides[3]
+    assert [slide['method'] for slide in result['slides']] == ['render', 'pictures', 'render', 'render']
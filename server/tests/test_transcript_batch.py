@@ -0,0 +1,77 @@
+import pytest
+from starlette.testclient import TestClient
+
+import app
+import asgi
+
+
+class FlaskClient:
+    def __init__(self):
+        self.client = app.app.test_client()
+
+    def post(self, path, json):
+        response = self.client.post(path, json=json)
+        return response.status_code, response.get_json()
+
+
+class AsgiClient:
+    def __init__(self):
+        self.client = TestClient(asgi.app)
+
+    def post(self, path, json):
+        response = self.client.post(path, json=json)
+        return response.status_code, response.json()
+
+
+@pytest.fixture(params=[FlaskClient, AsgiClient], ids=['flask', 'asgi'])
+def client(request):
+    return request.param()
+
+
+@pytest.fixture
+def fetched(monkeypatch):
+    """Stub the per-video fetch; returns the list of video IDs fetched."""
+    calls = []
+
+    def transcript_response(video_id, preferred_lang, format_type, fields):
+        calls.append(video_id)
+        if video_id == 'missing':
+            return {'success': False, 'error': 'no transcript'}, 404
+        return {'success': True, 'videoId': video_id, 'text': f'text of {video_id}'}, 200
+
+    monkeypatch.setattr(app, '_transcript_response', transcript_response)
+    return calls
+
+
+@pytest.mark.parametrize('body', [[], ['abc'], 'abc', 3])
+def test_non_object_body_is_rejected(client, body):
+    status, response = client.post('/api/transcripts', body)
+
+    assert status == 400
+    assert response['success'] is False
+
+
+@pytest.mark.parametrize('video_ids', [[], 'abc', ['abc', 3], ['abc', {'id': 'x'}], [None]])
+def test_invalid_video_ids_are_rejected(client, video_ids):
+    status, response = client.post('/api/transcripts', {'videoIds': video_ids})
+
+    assert status == 400
+    assert response['success'] is False
+
+
+def test_too_many_video_ids_are_rejected(client):
+    video_ids = [f'v{n}' for n in range(app.TRANSCRIPT_BATCH_MAX + 1)]
+
+    status, _ = client.post('/api/transcripts', {'videoIds': video_ids})
+
+    assert status == 400
+
+
+def test_results_follow_request_order_and_duplicates_are_fetched_once(client, fetched):
+    status, response = client.post('/api/transcripts', {'videoIds': ['a', 'missing', 'b', 'a']})
+
+    assert status == 200
+    assert [result['videoId'] for result in response['results']] == ['a', 'missing', 'b', 'a']
+    assert [result['status'] for result in response['results']] == [200, 404, 200, 200]
+    assert (response['succeeded'], response['failed']) == (3, 1)
+    assert sorted(fetched) == ['a', 'b', 'missing']
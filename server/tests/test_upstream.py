@@ -0,0 +1,109 @@
+import time
+
+import pytest
+
+import cache_manager
+import pdf_processor
+import upstream
+
+
+class StatusError(Exception):
+    """An SDK error carrying an HTTP status, as OpenAI's APIStatusError does."""
+
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    breaker = upstream.CircuitBreaker('deepseek', threshold=3, cooldown=60)
+    monkeypatch.setitem(upstream._breakers, 'deepseek', breaker)
+    monkeypatch.setattr(upstream, 'UPSTREAM_MAX_ATTEMPTS', 3)
+    monkeypatch.setattr(upstream, '_backoff', lambda attempt, error: 0)
+    return breaker
+
+
+def failing(*errors, result='ok'):
+    """A request function raising the given errors in turn, then returning result."""
+    calls = []
+
+    def request(timeout):
+        calls.append(timeout)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+
+    request.calls = calls
+    return request
+
+
+def test_transient_failures_are_retried(breaker):
+    request = failing(StatusError(503), TimeoutError())
+
+    assert upstream.call('deepseek.questions', request) == 'ok'
+    assert len(request.calls) == 3
+    assert breaker.state == 'closed'
+
+
+def test_non_retryable_errors_are_raised_unchanged(breaker):
+    error = StatusError(400)
+    request = failing(error)
+
+    with pytest.raises(StatusError) as raised:
+        upstream.call('deepseek.questions', request)
+
+    assert raised.value is error
+    assert len(request.calls) == 1
+    assert breaker.failures == 0
+
+
+def test_breaker_opens_fails_fast_then_closes_after_a_successful_trial(breaker):
+    with pytest.raises(upstream.UpstreamError):
+        upstream.call('deepseek.questions', failing(StatusError(503), StatusError(503), StatusError(503)))
+    assert breaker.state == 'open'
+
+    request = failing()
+    with pytest.raises(upstream.CircuitOpenError):
+        upstream.call('deepseek.questions', request)
+    assert request.calls == []
+
+    breaker.opened_at -= breaker.cooldown
+    assert upstream.call('deepseek.questions', request) == 'ok'
+    assert breaker.state == 'closed'
+
+
+def test_failed_trial_reopens_the_breaker(breaker):
+    breaker.state = 'open'
+    breaker.opened_at = time.time() - breaker.cooldown
+
+    with pytest.raises(upstream.UpstreamError):
+        upstream.call('deepseek.questions', failing(StatusError(503), StatusError(503), StatusError(503)))
+
+    assert breaker.state == 'open'
+
+
+def test_pdf_ranges_are_not_retried_outside_upstream(monkeypatch):
+    calls = []
+
+    def ocr_pdf_with_gemini(range_pdf, session, pages):
+        calls.append(pages)
+        raise StatusError(400)
+
+    monkeypatch.setattr(pdf_processor, 'ocr_pdf_with_gemini', ocr_pdf_with_gemini)
+
+    with pytest.raises(StatusError):
+        pdf_processor._ocr_pdf_range((1, 3, b'%PDF'), session=None)
+    assert calls == [3]
+
+
+def test_expired_entries_are_served_stale_within_the_grace_period(monkeypatch):
+    monkeypatch.setattr(cache_manager, 'CACHE_STALE_GRACE', 3600)
+    cache_manager.set_cache('stale-test', {'value': 1}, ttl=-60)
+    cache_manager.clear_memory_cache()
+
+    assert cache_manager.get_cached('stale-test') is None
+    assert cache_manager.get_stale('stale-test') == {'value': 1}
+
+    monkeypatch.setattr(cache_manager, 'CACHE_STALE_GRACE', 30)
+    assert cache_manager.get_stale('stale-test') is None
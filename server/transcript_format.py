@@ -0,0 +1,105 @@
+"""
+Transcript Formatting Module
+Builds the text views of a YouTube transcript in a single pass.
+
+Segments are kept as parallel arrays (texts, starts, durations) rather than
+one dict per snippet, which is also the shape they are cached in.
+
+Views:
+- 'raw': all text on one line, whitespace collapsed
+- 'readable': paragraphs split on pauses of PAUSE_THRESHOLD seconds or more
+- 'timestamps': one "[m:ss] text" line per segment
+"""
+import re
+
+PAUSE_THRESHOLD = 2.0  # seconds of silence that start a new paragraph
+ALL_VIEWS = ('raw', 'readable', 'timestamps')
+
+_SPACES = re.compile(r' {2,}')
+_BLANK_LINES = re.compile(r'\n{3,}')
+
+
+class Segments:
+    """Transcript segments as parallel arrays."""
+
+    __slots__ = ('texts', 'starts', 'durations')
+
+    def __init__(self, texts: list, starts: list, durations: list):
+        self.texts = texts
+        self.starts = starts
+        self.durations = durations
+
+    def __len__(self):
+        return len(self.texts)
+
+    @classmethod
+    def from_snippets(cls, snippets):
+        """Build from youtube-transcript-api snippets (objects with text/start/duration)."""
+        texts, starts, durations = [], [], []
+        for snippet in snippets:
+            texts.append(snippet.text)
+            starts.append(snippet.start)
+            durations.append(snippet.duration)
+        return cls(texts, starts, durations)
+
+
+def format_views(segments: Segments, views=ALL_VIEWS, pause_threshold: float = PAUSE_THRESHOLD) -> dict:
+    """
+    Produce the requested text views of a transcript in one pass over its segments.
+
+    Args:
+        segments: The transcript segments
+        views: Names of the views to build (see module docstring)
+        pause_threshold: Pause in seconds that ends a readable paragraph
+
+    Returns:
+        Dictionary of view name -> text, for the requested views only
+    """
+    want_raw = 'raw' in views
+    want_readable = 'readable' in views
+    want_timestamps = 'timestamps' in views
+
+    texts = segments.texts
+    starts = segments.starts
+    durations = segments.durations
+    last = len(texts) - 1
+
+    raw_parts = []
+    paragraphs = []
+    paragraph = []
+    timestamp_lines = []
+
+    for i, text in enumerate(texts):
+        if want_timestamps:
+            start = starts[i]
+            timestamp_lines.append(f"[{int(start // 60)}:{int(start % 60):02d}] {text}")
+
+        if want_raw:
+            words = ' '.join(text.split())
+            if words:
+                raw_parts.append(words)
+
+        if want_readable:
+            stripped = text.strip()
+            if not stripped:
+                continue
+            if '  ' in stripped:
+                stripped = _SPACES.sub(' ', stripped)
+            if '\n\n\n' in stripped:
+                stripped = _BLANK_LINES.sub('\n\n', stripped)
+            paragraph.append(stripped)
+
+            if i < last and starts[i + 1] - (starts[i] + durations[i]) >= pause_threshold:
+                paragraphs.append(' '.join(paragraph))
+                paragraph = []
+
+    result = {}
+    if want_raw:
+        result['raw'] = ' '.join(raw_parts)
+    if want_readable:
+        if paragraph:
+            paragraphs.append(' '.join(paragraph))
+        result['readable'] = '\n\n'.join(paragraphs)
+    if want_timestamps:
+        result['timestamps'] = '\n'.join(timestamp_lines)
+    return result
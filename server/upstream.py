@@ -0,0 +1,304 @@
+"""
+Upstream Call Module
+Deadlines, retries and circuit breakers for DeepSeek and Gemini calls.
+
+Every LLM/OCR request goes through call() (or call_async() on the event loop),
+named by its endpoint, e.g. call('deepseek.questions', request):
+- Deadline: each endpoint has a total time budget (ENDPOINT_DEADLINES,
+  overridable with UPSTREAM_DEADLINE_<PROVIDER>_<NAME>). The request function
+  is given the remaining seconds as its timeout, and no retry starts once the
+  budget is spent.
+- Retries: transient failures (HTTP 408/409/429/5xx, timeouts, dropped
+  connections) are retried with full-jitter exponential backoff, up to
+  UPSTREAM_MAX_ATTEMPTS attempts. A Retry-After from the provider is
+  honoured. Other errors (bad request, auth) are raised unchanged at once.
+- Circuit breaker, per provider: after UPSTREAM_BREAKER_THRESHOLD consecutive
+  failed attempts, calls fail fast for UPSTREAM_BREAKER_COOLDOWN seconds. Then a
+  single trial call is let through; its outcome closes or re-opens the breaker.
+
+Failures surface as UpstreamError (CircuitOpenError when failing fast), with
+a retry_after hint. Callers fall back to stale cache entries
+(cache_manager.get_stale) or answer 503 with Retry-After.
+
+Breaker state is per process; get_stats() reports it for /api/health.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+
+import environment  # settings below are read at import time
+
+UPSTREAM_MAX_ATTEMPTS = int(os.getenv('UPSTREAM_MAX_ATTEMPTS', 3))
+UPSTREAM_BACKOFF_BASE = 0.5  # seconds; backoff before retry n is random(0, base * 2**n)
+UPSTREAM_BACKOFF_MAX = 8  # seconds
+UPSTREAM_BREAKER_THRESHOLD = int(os.getenv('UPSTREAM_BREAKER_THRESHOLD', 5))  # consecutive failed attempts
+UPSTREAM_BREAKER_COOLDOWN = float(os.getenv('UPSTREAM_BREAKER_COOLDOWN', 30))  # seconds open before a trial call
+
+
+def _deadline(endpoint: str, default: float) -> float:
+    env_name = 'UPSTREAM_DEADLINE_' + endpoint.upper().replace('.', '_')
+    return float(os.getenv(env_name, default))
+
+
+# Total seconds per call, across all attempts
+ENDPOINT_DEADLINES = {
+    'deepseek.subtitle': _deadline('deepseek.subtitle', 120),
+    'deepseek.questions': _deadline('deepseek.questions', 180),
+    'deepseek.organize': _deadline('deepseek.organize', 300),
+    'gemini.ocr_image': _deadline('gemini.ocr_image', 120),
+    'gemini.ocr_pdf': _deadline('gemini.ocr_pdf', 300),
+    'gemini.upload': _deadline('gemini.upload', 120),
+}
+
+RETRYABLE_STATUS = {408, 409, 429}  # plus every 5xx
+# Exception classes (matched by name, so neither SDK has to be imported here)
+# raised for timeouts and broken connections by the OpenAI, Google and HTTP libraries
+RETRYABLE_ERROR_NAMES = {
+    'TimeoutError', 'ConnectionError', 'APIConnectionError', 'APITimeoutError',
+    'Timeout', 'TimeoutException', 'TransportError', 'RetryError',
+}
+
+
+class UpstreamError(Exception):
+    """An upstream call failed after its retries (or was not attempted)."""
+
+    def __init__(self, message: str, retry_after: float = None):
+        super().__init__(message)
+        self.retry_after = retry_after if retry_after is not None else UPSTREAM_BREAKER_COOLDOWN
+
+
+class CircuitOpenError(UpstreamError):
+    """The provider's circuit breaker is open; the call was not attempted."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed → open → half-open (one trial) → closed."""
+
+    def __init__(self, name: str, threshold: int = UPSTREAM_BREAKER_THRESHOLD,
+                 cooldown: float = UPSTREAM_BREAKER_COOLDOWN):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trial_running = False
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'retries': 0, 'failures': 0, 'rejected': 0, 'opened': 0}
+
+    def reset_lock(self):
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Admit a call or raise CircuitOpenError. Returns True if it is the half-open trial."""
+        with self._lock:
+            if self.state == 'open':
+                remaining = self.opened_at + self.cooldown - time.time()
+                if remaining > 0:
+                    self._stats['rejected'] += 1
+                    raise CircuitOpenError(
+                        f"{self.name} circuit open after {self.failures} failures", remaining
+                    )
+                self.state = 'half_open'
+                self.trial_running = False
+
+            if self.state == 'half_open':
+                if self.trial_running:
+                    self._stats['rejected'] += 1
+                    raise CircuitOpenError(f"{self.name} circuit half-open, trial call in flight", 1)
+                self.trial_running = True
+
+            self._stats['calls'] += 1
+            return self.state == 'half_open'
+
+    def record_success(self):
+        with self._lock:
+            if self.state != 'closed':
+                print(f"✅ {self.name} circuit closed")
+            self.state = 'closed'
+            self.failures = 0
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._stats['failures'] += 1
+            self.trial_running = False
+            if self.state == 'half_open' or self.failures >= self.threshold:
+                if self.state != 'open':
+                    self._stats['opened'] += 1
+                    print(f"⛔ {self.name} circuit open for {self.cooldown:.0f}s "
+                          f"({self.failures} consecutive failures)")
+                self.state = 'open'
+                self.opened_at = time.time()
+
+    def cancel_trial(self):
+        """The half-open trial call was cancelled before it finished; allow another."""
+        with self._lock:
+            self.trial_running = False
+
+    def record_retry(self):
+        with self._lock:
+            self._stats['retries'] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            snapshot = {'state': self.state, 'consecutive_failures': self.failures, **self._stats}
+            if self.state == 'open':
+                snapshot['retry_after'] = round(max(0.0, self.opened_at + self.cooldown - time.time()), 1)
+            return snapshot
+
+
+_breakers = {
+    'deepseek': CircuitBreaker('deepseek'),
+    'gemini': CircuitBreaker('gemini'),
+}
+
+
+def _after_fork_in_child():
+    for breaker in _breakers.values():
+        breaker.reset_lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    return _breakers[provider]
+
+
+def _status_code(error):
+    """HTTP status of an SDK error (OpenAI: status_code, google.api_core: code), or None."""
+    status = getattr(error, 'status_code', None)
+    if status is None and type(error).__module__.startswith('google.'):
+        status = getattr(error, 'code', None)
+    return status if isinstance(status, int) else None
+
+
+def is_retryable(error: Exception) -> bool:
+    """True for failures worth retrying: throttling, server errors, timeouts, dropped connections."""
+    status = _status_code(error)
+    if status is not None:
+        return status in RETRYABLE_STATUS or status >= 500
+    return any(cls.__name__ in RETRYABLE_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def _retry_after(error: Exception):
+    """Seconds from the provider's Retry-After header, if the error carries one."""
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if headers is None:
+        return None
+    try:
+        return max(0.0, float(headers.get('retry-after')))
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff(attempt: int, error: Exception) -> float:
+    """Full-jitter exponential backoff before retry number `attempt` (1-based)."""
+    hinted = _retry_after(error)
+    if hinted is not None:
+        return hinted
+    return random.uniform(0, min(UPSTREAM_BACKOFF_MAX, UPSTREAM_BACKOFF_BASE * 2 ** attempt))
+
+
+class _Attempts:
+    """Retry bookkeeping shared by call() and call_async()."""
+
+    def __init__(self, endpoint: str, deadline: float = None):
+        self.endpoint = endpoint
+        self.breaker = _breakers[endpoint.split('.', 1)[0]]
+        self.started = time.monotonic()
+        self.deadline = deadline or ENDPOINT_DEADLINES[endpoint]
+        self.attempt = 0
+        self.is_trial = False
+
+    def remaining(self) -> float:
+        return self.deadline - (time.monotonic() - self.started)
+
+    def next_timeout(self) -> float:
+        """Admit the next attempt through the breaker; returns its timeout in seconds."""
+        self.is_trial = self.breaker.before_call()
+        self.attempt += 1
+        return max(1.0, self.remaining())
+
+    def cancelled(self):
+        if self.is_trial:
+            self.breaker.cancel_trial()
+
+    def delay_before_retry(self, error: Exception):
+        """
+        Record a failed attempt. Returns seconds to wait before retrying, or
+        raises (the error itself if not retryable, else UpstreamError).
+        """
+        if not is_retryable(error):
+            # The provider answered; a bad request says nothing about its health
+            self.breaker.record_success()
+            raise error
+
+        self.breaker.record_failure()
+        delay = _backoff(self.attempt, error)
+        if self.attempt >= UPSTREAM_MAX_ATTEMPTS or delay >= self.remaining():
+            raise UpstreamError(
+                f"{self.endpoint} failed after {self.attempt} attempt(s): {error}",
+                _retry_after(error)
+            ) from error
+
+        self.breaker.record_retry()
+        print(f"⚠️ {self.endpoint} attempt {self.attempt} failed ({error}), retrying in {delay:.1f}s...")
+        return delay
+
+
+def call(endpoint: str, request, deadline: float = None):
+    """
+    Run request(timeout) against an upstream endpoint with retries and the circuit breaker.
+
+    Args:
+        endpoint: '<provider>.<name>', a key of ENDPOINT_DEADLINES
+        request: Callable taking the per-attempt timeout in seconds
+        deadline: Total seconds across attempts (default ENDPOINT_DEADLINES[endpoint])
+
+    Returns:
+        The request's return value
+
+    Raises:
+        UpstreamError: retryable failures persisted, or the circuit is open
+    """
+    attempts = _Attempts(endpoint, deadline)
+    while True:
+        timeout = attempts.next_timeout()
+        try:
+            result = request(timeout)
+        except Exception as e:
+            time.sleep(attempts.delay_before_retry(e))
+            continue
+        except BaseException:
+            attempts.cancelled()
+            raise
+        attempts.breaker.record_success()
+        return result
+
+
+async def call_async(endpoint: str, request, deadline: float = None):
+    """call() for coroutines: request(timeout) returns an awaitable."""
+    attempts = _Attempts(endpoint, deadline)
+    while True:
+        timeout = attempts.next_timeout()
+        try:
+            result = await request(timeout)
+        except Exception as e:
+            await asyncio.sleep(attempts.delay_before_retry(e))
+            continue
+        except BaseException:
+            attempts.cancelled()
+            raise
+        attempts.breaker.record_success()
+        return result
+
+
+def get_stats() -> dict:
+    """Circuit breaker state and counters per provider."""
+    return {name: breaker.snapshot() for name, breaker in _breakers.items()}
@@ -0,0 +1,156 @@
+"""
+Warm-up Module
+Moves cold-start work out of the first requests.
+
+app.py imports its heavy dependencies on first use, so a worker that only
+serves transcripts never loads the document stack. With WARMUP=1 a worker
+does all of it before it takes traffic instead:
+- import_modules(): the OpenAI SDK, youtube-transcript-api and the document
+  processors with the libraries they load (Gemini, pdf2image, pypdf, PIL,
+  python-pptx, python-docx). gunicorn.conf.py runs this once in the master
+  so the workers share the imported code.
+- warm_up(): the above, plus the API clients, the SQLite cache and job
+  databases and the warm LibreOffice pool. With WARMUP_CONNECT=1 it also
+  opens the HTTPS connection to DeepSeek.
+
+Import-time report for this environment:
+    python warmup.py [--threshold-ms 50]
+Each module is imported in a fresh interpreter; importing app starts no job
+threads (the entry points start the job queue), so the report never runs jobs.
+"""
+import argparse
+import importlib
+import os
+import subprocess
+import sys
+import time
+
+import environment  # settings below are read at import time
+
+WARMUP_ENABLED = os.getenv('WARMUP') == '1'
+WARMUP_CONNECT = os.getenv('WARMUP_CONNECT') == '1'
+
+# Imported lazily by app.py; warmed up front
+HEAVY_MODULES = ['openai', 'youtube_transcript_api', 'pdf_processor', 'pptx', 'docx']
+
+_warm = False
+
+
+def _timed(label: str, func, timings: dict):
+    """Run one warm-up step, recording its duration; failures are logged, not raised."""
+    started = time.perf_counter()
+    try:
+        func()
+    except Exception as e:
+        print(f"⚠️ Warm-up step '{label}' failed: {e}")
+    timings[label] = time.perf_counter() - started
+
+
+def import_modules() -> dict:
+    """
+    Import HEAVY_MODULES.
+
+    Returns:
+        Dictionary of module name -> seconds taken (missing modules are skipped)
+    """
+    timings = {}
+    for name in HEAVY_MODULES:
+        _timed(name, lambda: importlib.import_module(name), timings)
+    return timings
+
+
+def _open_databases():
+    import cache_manager
+    import job_queue
+    cache_manager.get_cache_stats()
+    job_queue.get_job('')
+
+
+def _create_clients():
+    import app
+    app.get_ytt_api()
+    if app.get_deepseek_client() is not None and WARMUP_CONNECT:
+        app.get_deepseek_client().models.list(timeout=10)
+
+    if app.GEMINI_API_KEY and app.GEMINI_API_KEY != 'your_gemini_api_key_here':
+        import pdf_processor
+        pdf_processor.get_gemini_session(app.GEMINI_API_KEY)
+
+
+def _start_office_pool():
+    import office_converter
+    office_converter.get_pool()
+
+
+def warm_up() -> dict:
+    """
+    Prepare this process to serve every route without first-request stalls.
+    Safe to call more than once; later calls return immediately.
+
+    Returns:
+        Dictionary of step name -> seconds taken
+    """
+    global _warm
+    if _warm:
+        return {}
+
+    started = time.perf_counter()
+    timings = import_modules()
+    _timed('databases', _open_databases, timings)
+    _timed('clients', _create_clients, timings)
+    _timed('office pool', _start_office_pool, timings)
+    _warm = True
+
+    steps = ', '.join(f"{label} {seconds:.2f}s" for label, seconds in timings.items())
+    print(f"🔥 Warm-up done in {time.perf_counter() - started:.2f}s ({steps})")
+    return timings
+
+
+# ---- Import-time report ----
+
+def _import_times(module: str) -> list:
+    """
+    Import a module in a fresh interpreter with -X importtime.
+
+    Returns:
+        List of (cumulative microseconds, depth, module name), in import order
+    """
+    completed = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    entries = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((int(cumulative), depth, name.strip()))
+    if completed.returncode != 0:
+        raise ImportError(completed.stderr.strip().splitlines()[-1])
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report cold import times of the API server')
+    parser.add_argument('--threshold-ms', type=float, default=50,
+                        help='Also list nested imports slower than this')
+    args = parser.parse_args()
+
+    print("⏱️ Cold import times (fresh interpreter each)")
+    for module in ['app', 'asgi', *HEAVY_MODULES]:
+        try:
+            entries = _import_times(module)
+        except ImportError as e:
+            print(f"  {module:<24} unavailable ({e})")
+            continue
+
+        total = next(cumulative for cumulative, _, name in reversed(entries) if name == module)
+        print(f"  {module:<24} {total / 1000:8.1f} ms")
+        for cumulative, depth, name in entries:
+            if depth == 1 and cumulative >= args.threshold_ms * 1000:
+                print(f"    {name:<22} {cumulative / 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -82,9 +82,10 @@ export const getVideoDetails = async (videoId) => {
 // Fetch transcript from backend server
 export const fetchTranscript = async (videoId, lang = null) => {
     try {
-        const url = lang
-            ? `${BACKEND_API_URL}/api/transcript/${videoId}?lang=${lang}`
-            : `${BACKEND_API_URL}/api/transcript/${videoId}`;
+        // Only request the views used below
+        const params = new URLSearchParams({ fields: 'text,textWithTimestamps' });
+        if (lang) params.set('lang', lang);
+        const url = `${BACKEND_API_URL}/api/transcript/${videoId}?${params}`;
 
         const response = await fetch(url);
         const data = await response.json();